@@ -7,6 +7,10 @@
 
 import math
 
+import numpy as np
+
+import dinero
+
 class CicloArbitraje:
     """
     Clase que encapsula los parametros, tasas y la logica de calculo.
@@ -86,18 +90,15 @@ class CicloArbitraje:
         """
         Calcula el volumen total de USDT comprado/vendido en un dia.
         Suma todas las ventas con reinversion del dia.
-        """
-        usdt_total = 0
-        capital_temporal = capital_inicial_dia
         
-        for _ in range(ventas_completadas):
-            usdt_comprado_venta = capital_temporal / self.COSTO_COMPRA_TARJETA
-            usdt_total += usdt_comprado_venta
-            
-            ganancia_venta = capital_temporal * self.tasa_rentabilidad_por_venta
-            capital_temporal += ganancia_venta
-        
-        return usdt_total
+        Cada venta opera el capital de la anterior multiplicado por (1 + r),
+        por lo que el total es una serie geometrica:
+            USDT = (C / costo) * ((1 + r)^n - 1) / r
+        """
+        return float(_usdt_operado_serie(
+            capital_inicial_dia, self.COSTO_COMPRA_TARJETA,
+            self.tasa_rentabilidad_por_venta, ventas_completadas
+        ))
 
     def get_rentabilidad_porcentual_por_venta(self) -> float:
         """Retorna la rentabilidad por venta como porcentaje."""
@@ -153,32 +154,212 @@ class CicloArbitraje:
         Retorna el desglose de CADA venta individual del dia
         Util para ver el interes compuesto en accion
         """
-        ventas_detalle = []
+        return [
+            {
+                'venta_num': venta.venta_numero,
+                'capital_entrada': venta.monto_operado,
+                'usdt_operado': venta.usdt_operado,
+                'ingreso_bruto': venta.ingreso_bruto,
+                'comision': venta.comision_monto,
+                'ingreso_neto': venta.ingreso_neto,
+                'ganancia_venta': venta.ganancia_venta,
+                'capital_salida': venta.ingreso_neto
+            }
+            for venta in self.iterar_venta_por_venta(capital_usd, ventas)
+        ]
+    
+    def iterar_venta_por_venta(self, capital_usd: float, ventas: int, totales=None):
+        """
+        Version en streaming de breakdown_venta_por_venta.
+        
+        Genera un VentaDetalle por venta (cada una reinvierte el ingreso neto
+        de la anterior) sin construir listas ni diccionarios. Si se pasa un
+        TotalesVentas, se acumula en la misma pasada.
+        """
         capital_temporal = capital_usd
         
         for num_venta in range(1, ventas + 1):
-            usdt_venta = capital_temporal / self.COSTO_COMPRA_TARJETA
-            ingreso_bruto = usdt_venta * self.tasa_venta_p2p_publicada
-            comision = ingreso_bruto * self.COMISION_BINANCE_P2P
-            ingreso_neto = ingreso_bruto - comision
-            ganancia = ingreso_neto - capital_temporal
-            
-            ventas_detalle.append({
-                'venta_num': num_venta,
-                'capital_entrada': capital_temporal,
-                'usdt_operado': usdt_venta,
-                'ingreso_bruto': ingreso_bruto,
-                'comision': comision,
-                'ingreso_neto': ingreso_neto,
-                'ganancia_venta': ganancia,
-                'capital_salida': ingreso_neto
-            })
-            
-            capital_temporal = ingreso_neto
-        
-        return ventas_detalle
+            venta = VentaDetalle(num_venta, capital_temporal, self.tasa_venta_p2p_publicada,
+                                 self.COSTO_COMPRA_TARJETA, self.COMISION_BINANCE_P2P)
+            if totales is not None:
+                totales.acumular(venta)
+            yield venta
+            capital_temporal = venta.ingreso_neto
     
     def calcular_comision_total(self, capital_usd: float, ventas: int) -> float:
         """Calcula el total de comisiones pagadas en la operacion del dia"""
         usdt_total = self.calcular_usdt_comprado(capital_usd, ventas)
         return usdt_total * self.tasa_venta_p2p_publicada * self.COMISION_BINANCE_P2P
+
+
+# ========== DESGLOSE DE VENTAS EN STREAMING ==========
+
+class VentaDetalle:
+    """
+    Resultado de UNA venta individual. Registro ligero (con __slots__)
+    pensado para generarse en streaming en dias con muchas ventas.
+    """
+    
+    __slots__ = ('venta_numero', 'monto_operado', 'usdt_operado', 'ingreso_bruto',
+                 'comision_monto', 'ingreso_neto', 'ganancia_venta')
+    
+    def __init__(self, venta_numero: int, monto_operado: float,
+                 tasa_venta_p2p: float, tasa_compra: float, comision: float):
+        # monto_operado es el costo en USD de los USDT operados en esta venta.
+        # El calculo se hace en micro-unidades enteras (ver dinero.py) y los
+        # valores quedan exactos a 6 decimales.
+        monto = dinero.a_micro(monto_operado)
+        usdt, bruto, comision_monto, neto, ganancia = dinero.calcular_venta(
+            monto, dinero.a_micro(tasa_venta_p2p), dinero.a_micro(tasa_compra), dinero.a_micro(comision)
+        )
+        self.venta_numero = venta_numero
+        self.monto_operado = dinero.desde_micro(monto)
+        self.usdt_operado = dinero.desde_micro(usdt)
+        self.ingreso_bruto = dinero.desde_micro(bruto)
+        self.comision_monto = dinero.desde_micro(comision_monto)
+        self.ingreso_neto = dinero.desde_micro(neto)
+        self.ganancia_venta = dinero.desde_micro(ganancia)
+
+class TotalesVentas:
+    """Acumulador de totales que se actualiza mientras se recorren las ventas."""
+    
+    __slots__ = ('ventas', 'monto_operado', 'usdt_operado', 'ingreso_bruto',
+                 'comision_monto', 'ingreso_neto', 'ganancia_venta')
+    
+    def __init__(self):
+        self.ventas = 0
+        self.monto_operado = 0.0
+        self.usdt_operado = 0.0
+        self.ingreso_bruto = 0.0
+        self.comision_monto = 0.0
+        self.ingreso_neto = 0.0
+        self.ganancia_venta = 0.0
+    
+    def acumular(self, venta: VentaDetalle):
+        self.ventas += 1
+        self.monto_operado += venta.monto_operado
+        self.usdt_operado += venta.usdt_operado
+        self.ingreso_bruto += venta.ingreso_bruto
+        self.comision_monto += venta.comision_monto
+        self.ingreso_neto += venta.ingreso_neto
+        self.ganancia_venta += venta.ganancia_venta
+
+def iterar_ventas(montos, tasa_venta_p2p: float, tasa_compra: float, comision: float, totales=None):
+    """
+    Genera un VentaDetalle por cada monto (ventas independientes del dia,
+    como las registra el operador). Si se pasa un TotalesVentas, los totales
+    se acumulan en la misma pasada.
+    """
+    for num_venta, monto in enumerate(montos, 1):
+        venta = VentaDetalle(num_venta, monto, tasa_venta_p2p, tasa_compra, comision)
+        if totales is not None:
+            totales.acumular(venta)
+        yield venta
+
+# ========== MOTOR VECTORIZADO DE ESCENARIOS ==========
+
+def _usdt_operado_serie(capital, costo_compra, tasa_rentabilidad, ventas):
+    """
+    Suma cerrada de la serie geometrica de USDT operados en `ventas` ventas
+    con reinversion. Acepta escalares o arrays de NumPy (con broadcasting).
+    Cuando la rentabilidad es 0 la serie degenera en capital * ventas / costo.
+    """
+    capital = np.asarray(capital, dtype=np.float64)
+    costo_compra = np.asarray(costo_compra, dtype=np.float64)
+    r = np.asarray(tasa_rentabilidad, dtype=np.float64)
+    n = np.asarray(ventas, dtype=np.float64)
+    
+    r_cero = np.abs(r) < 1e-12
+    r_seguro = np.where(r_cero, 1.0, r)
+    suma_factores = np.where(r_cero, n, np.expm1(n * np.log1p(r_seguro)) / r_seguro)
+    return capital / costo_compra * suma_factores
+
+def evaluar_escenarios(capital_inicial_usd,
+                       tasa_venta_p2p_publicada,
+                       costo_compra_usdt,
+                       comision_p2p_maker,
+                       ventas_diarias,
+                       dias_ciclo,
+                       limite_final_usd=None) -> dict:
+    """
+    Evalua en lote muchas combinaciones de parametros de CicloArbitraje.
+    
+    Todos los argumentos aceptan escalares o arrays y se combinan con las
+    reglas de broadcasting de NumPy, de modo que un barrido de 10^6 puntos
+    se resuelve en una sola pasada sin bucles por venta: se usan las formas
+    cerradas de las series geometricas en lugar de iterar.
+    
+    A diferencia de CicloArbitraje, los escenarios no rentables no lanzan
+    ValueError: se marcan con False en 'rentable' y sus resultados se
+    calculan igual (ganancias negativas).
+    
+    Args:
+        capital_inicial_usd: Capital con el que inicia cada dia
+        tasa_venta_p2p_publicada: Tasa a la que publicas en P2P
+        costo_compra_usdt: Costo de compra del USDT
+        comision_p2p_maker: Comision de Binance P2P
+        ventas_diarias: Ventas completadas por dia
+        dias_ciclo: Total de dias del ciclo (reinvirtiendo todo cada dia)
+        limite_final_usd: Tope del capital al final del ciclo (None = sin tope)
+    
+    Returns:
+        dict de arrays con la forma del broadcasting de las entradas:
+        tasa_rentabilidad_por_venta, rentable, ganancia_neta, usdt_operado,
+        comisiones, capital_final_dia y capital_proyectado.
+    """
+    capital, tasa_venta, costo, comision, ventas, dias = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in (
+            capital_inicial_usd, tasa_venta_p2p_publicada, costo_compra_usdt,
+            comision_p2p_maker, ventas_diarias, dias_ciclo
+        ))
+    )
+    
+    tasa_venta_neta = tasa_venta * (1 - comision)
+    r = tasa_venta_neta / costo - 1
+    
+    # (1 + r)^ventas y (1 + r)^(ventas * dias) via log1p para mayor precision
+    log_factor_venta = np.log1p(r)
+    factor_dia = np.exp(ventas * log_factor_venta)
+    
+    ganancia_neta = capital * (factor_dia - 1)
+    usdt_operado = _usdt_operado_serie(capital, costo, r, ventas)
+    comisiones = usdt_operado * tasa_venta * comision
+    
+    capital_proyectado = capital * np.exp(ventas * dias * log_factor_venta)
+    if limite_final_usd is not None:
+        capital_proyectado = np.minimum(capital_proyectado, limite_final_usd)
+    
+    return {
+        'tasa_rentabilidad_por_venta': r,
+        'rentable': r >= 0,
+        'ganancia_neta': ganancia_neta,
+        'usdt_operado': usdt_operado,
+        'comisiones': comisiones,
+        'capital_final_dia': capital + ganancia_neta,
+        'capital_proyectado': capital_proyectado
+    }
+
+def malla_escenarios(capital_inicial_usd: float,
+                     tasas_venta,
+                     costos_compra,
+                     ventas_diarias,
+                     dias_ciclo,
+                     comision_p2p_maker: float,
+                     limite_final_usd=None) -> dict:
+    """
+    Evalua el producto cartesiano de tasas de venta x costos de compra x
+    ventas por dia x duraciones de ciclo.
+    
+    Los arrays resultantes tienen forma
+    (len(tasas_venta), len(costos_compra), len(ventas_diarias), len(dias_ciclo)).
+    Ejemplo: ventas_diarias=range(1, MAX_VENTAS_DIARIAS + 1)
+    """
+    ejes = np.ix_(
+        np.atleast_1d(np.asarray(tasas_venta, dtype=np.float64)),
+        np.atleast_1d(np.asarray(costos_compra, dtype=np.float64)),
+        np.atleast_1d(np.asarray(ventas_diarias, dtype=np.float64)),
+        np.atleast_1d(np.asarray(dias_ciclo, dtype=np.float64))
+    )
+    tasas, costos, ventas, dias = ejes
+    return evaluar_escenarios(capital_inicial_usd, tasas, costos,
+                              comision_p2p_maker, ventas, dias, limite_final_usd)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: archivador.py
+# DESCRIPCION: Traslado de ciclos finalizados a bases de datos anuales
+# ==========================================================
+#
+# La base operativa solo necesita el ciclo activo y el historial reciente.
+# Los ciclos FINALIZADO con mas de `dias_retencion` dias de cerrados se
+# mueven (con ciclo_stats, dias y ventas) a data/archivo/arbitraje_AAAA.db
+# segun el anio de inicio del ciclo; los logs_sistema anteriores al corte,
+# segun su propio anio. Asi la base operativa queda chica y sus paginas en
+# cache aunque se acumulen anios de ciclos.
+#
+# El libro contable (movimientos_contables) y la auditoria quedan en la base
+# operativa: los saldos por fecha dependen de la cadena completa.
+#
+# Para consultar lo archivado: ArbitrajeDB.adjuntar_archivos() (solo lectura).
+# Los archivos de una base van en el directorio 'archivo' junto a ella
+# (data/archivo para data/arbitraje.db).
+#
+#   python archivador.py archivar [--dias-retencion 90] [--compactar]
+#   python archivador.py listar
+
+import os
+import sys
+import shutil
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+
+from database import ArbitrajeDB, DIRECTORIO_ARCHIVO, archivos_anuales, directorio_archivos
+
+# Tablas que se copian al archivo (en orden de dependencia)
+TABLAS_ARCHIVADAS = ('ciclos', 'ciclo_stats', 'dias', 'ventas', 'logs_sistema')
+
+
+def ruta_archivo(anio, directorio=DIRECTORIO_ARCHIVO) -> str:
+    return os.path.join(directorio, f"arbitraje_{anio}.db")
+
+
+def _preparar_archivo(conn_origen, ruta):
+    """
+    Crea el archivo con las tablas e indices de la base operativa, o le
+    agrega las columnas que migraciones posteriores sumaron al origen.
+    """
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    destino = sqlite3.connect(ruta)
+    try:
+        # Archivo de un solo archivo, sin -wal: se adjunta en solo lectura
+        destino.execute("PRAGMA journal_mode = DELETE")
+        existentes = {fila[0] for fila in destino.execute("SELECT name FROM sqlite_master")}
+
+        for tabla in TABLAS_ARCHIVADAS:
+            if tabla not in existentes:
+                sql = conn_origen.execute(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)
+                ).fetchone()[0]
+                destino.execute(sql)
+            else:
+                columnas = {fila[1] for fila in destino.execute(f"PRAGMA table_info({tabla})")}
+                for _, nombre, tipo, _, defecto, _ in conn_origen.execute(f"PRAGMA main.table_info({tabla})"):
+                    if nombre not in columnas:
+                        destino.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}"
+                                        + (f" DEFAULT {defecto}" if defecto is not None else ""))
+
+            for nombre, sql in conn_origen.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (tabla,)
+            ):
+                if nombre not in existentes:
+                    destino.execute(sql)
+        destino.commit()
+    finally:
+        destino.close()
+
+
+def _copiar(conn, tabla, condicion, parametros=()):
+    """INSERT OR REPLACE en el archivo adjunto: repetir un traslado interrumpido no duplica filas."""
+    columnas = ', '.join(fila[1] for fila in conn.execute(f"PRAGMA main.table_info({tabla})"))
+    return conn.execute(
+        f"INSERT OR REPLACE INTO destino.{tabla} ({columnas}) SELECT {columnas} FROM main.{tabla} WHERE {condicion}",
+        parametros
+    ).rowcount
+
+
+def archivar_ciclos(db_path='data/arbitraje.db', directorio=None, dias_retencion=90,
+                    compactar=False) -> dict:
+    """
+    Mueve los ciclos finalizados hace mas de `dias_retencion` dias y los logs
+    anteriores al corte a los archivos anuales.
+
+    Cada anio se copia primero al archivo (transaccion propia) y solo despues
+    se borra de la base operativa; si el proceso se corta entre ambos pasos,
+    volver a ejecutarlo termina el traslado sin duplicar.
+
+    Args:
+        directorio: por defecto el de la base (directorio_archivos)
+        compactar: VACUUM de la base operativa al terminar
+
+    Returns:
+        dict con ciclos, dias, ventas y logs trasladados y los archivos usados
+    """
+    directorio = directorio or directorio_archivos(db_path)
+    corte = date.today() - timedelta(days=dias_retencion)
+    db = ArbitrajeDB(db_path)
+    conn = db.conn
+    totales = {'ciclos': 0, 'dias': 0, 'ventas': 0, 'logs': 0, 'archivos': []}
+
+    try:
+        por_anio = {}
+        for ciclo_id, fecha_inicio in conn.execute("""
+            SELECT id, fecha_inicio FROM ciclos
+            WHERE estado = 'FINALIZADO' AND fecha_fin <= ? ORDER BY id
+        """, (str(corte),)):
+            por_anio.setdefault(str(fecha_inicio)[:4], []).append(ciclo_id)
+
+        anios_logs = [fila[0] for fila in conn.execute(
+            "SELECT DISTINCT strftime('%Y', timestamp) FROM logs_sistema WHERE timestamp < ?", (str(corte),)
+        )]
+
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ciclos_a_archivar (id INTEGER PRIMARY KEY)")
+        dias_de_ciclos = "dia_id IN (SELECT id FROM main.dias WHERE ciclo_id IN (SELECT id FROM temp.ciclos_a_archivar))"
+        de_ciclos = "IN (SELECT id FROM temp.ciclos_a_archivar)"
+        logs_del_anio = "timestamp < ? AND strftime('%Y', timestamp) = ?"
+
+        for anio in sorted(set(por_anio) | set(anios_logs)):
+            ruta = ruta_archivo(anio, directorio)
+            _preparar_archivo(conn, ruta)
+            conn.execute("DELETE FROM temp.ciclos_a_archivar")
+            conn.executemany("INSERT INTO temp.ciclos_a_archivar (id) VALUES (?)",
+                             ((ciclo_id,) for ciclo_id in por_anio.get(anio, ())))
+            conn.commit()
+
+            # 1) Copia al archivo
+            conn.execute("ATTACH DATABASE ? AS destino", (ruta,))
+            try:
+                with db.transaccion():
+                    totales['ciclos'] += _copiar(conn, 'ciclos', f"id {de_ciclos}")
+                    _copiar(conn, 'ciclo_stats', f"ciclo_id {de_ciclos}")
+                    totales['dias'] += _copiar(conn, 'dias', f"ciclo_id {de_ciclos}")
+                    totales['ventas'] += _copiar(conn, 'ventas', dias_de_ciclos)
+                    totales['logs'] += _copiar(conn, 'logs_sistema', logs_del_anio, (str(corte), anio))
+            finally:
+                conn.execute("DETACH DATABASE destino")
+
+            # 2) Borrado de la base operativa (sin filas de auditoria por el traslado)
+            with db.sin_auditoria():
+                conn.execute(f"DELETE FROM ventas WHERE {dias_de_ciclos}")
+                conn.execute(f"DELETE FROM dias WHERE ciclo_id {de_ciclos}")
+                conn.execute(f"DELETE FROM ciclo_stats WHERE ciclo_id {de_ciclos}")
+                conn.execute(f"DELETE FROM ciclos WHERE id {de_ciclos}")
+                conn.execute(f"DELETE FROM logs_sistema WHERE {logs_del_anio}", (str(corte), anio))
+            totales['archivos'].append(ruta)
+
+        conn.execute("DROP TABLE IF EXISTS temp.ciclos_a_archivar")
+        if totales['ciclos'] or totales['logs']:
+            db.log_sistema('INFO', 'archivador', 'archivar_ciclos',
+                           f"{totales['ciclos']} ciclos y {totales['logs']} logs archivados (corte {corte})")
+        if compactar:
+            conn.execute("VACUUM")
+    finally:
+        db.cerrar()
+
+    return totales
+
+
+def apartar_archivos(directorio=DIRECTORIO_ARCHIVO, destino='data/backups', prefijo='BEFORE_RESET'):
+    """
+    Mueve los archivos anuales a `destino` antes de borrar la base: una
+    base nueva no debe heredar los ciclos archivados de la anterior.
+
+    Returns:
+        Directorio donde quedaron, o None si no habia archivos
+    """
+    if not archivos_anuales(directorio):
+        return None
+    os.makedirs(destino, exist_ok=True)
+    apartado = os.path.join(destino, f"{prefijo}_archivo_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    shutil.move(directorio, apartado)
+    return apartado
+
+
+def listar_archivos(directorio=DIRECTORIO_ARCHIVO) -> list:
+    """Un dict por archivo anual: ruta, tamano_bytes, ciclos, ventas y logs."""
+    if not os.path.isdir(directorio):
+        return []
+    archivos = []
+    for nombre in sorted(os.listdir(directorio)):
+        if not (nombre.startswith('arbitraje_') and nombre.endswith('.db')):
+            continue
+        ruta = os.path.join(directorio, nombre)
+        conn = sqlite3.connect(f"file:{os.path.abspath(ruta)}?mode=ro", uri=True)
+        try:
+            conteo = {tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                      for tabla in ('ciclos', 'ventas', 'logs_sistema')}
+        finally:
+            conn.close()
+        archivos.append({'ruta': ruta, 'tamano_bytes': os.path.getsize(ruta), **conteo})
+    return archivos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archivo de ciclos finalizados en bases anuales")
+    parser.add_argument('--db', default='data/arbitraje.db')
+    parser.add_argument('--directorio', default=None, help="Por defecto 'archivo' junto a la base")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_archivar = sub.add_parser('archivar', help="Mover ciclos finalizados a los archivos anuales")
+    p_archivar.add_argument('--dias-retencion', type=int, default=90)
+    p_archivar.add_argument('--compactar', action='store_true', help="VACUUM de la base operativa")
+
+    sub.add_parser('listar', help="Listar archivos anuales")
+    args = parser.parse_args()
+    args.directorio = args.directorio or directorio_archivos(args.db)
+
+    if args.comando == 'archivar':
+        antes = os.path.getsize(args.db) if os.path.exists(args.db) else 0
+        r = archivar_ciclos(args.db, args.directorio, args.dias_retencion, args.compactar)
+        print(f"[OK] Archivados: {r['ciclos']} ciclos, {r['dias']} dias, {r['ventas']} ventas, {r['logs']} logs")
+        for ruta in r['archivos']:
+            print(f"   {ruta}")
+        print(f"   Base operativa: {antes / 1024:.0f} KB -> {os.path.getsize(args.db) / 1024:.0f} KB")
+
+    elif args.comando == 'listar':
+        archivos = listar_archivos(args.directorio)
+        if not archivos:
+            print("[AVISO] No hay archivos anuales")
+        for a in archivos:
+            print(f"{a['ruta']}  {a['tamano_bytes'] / 1024:>10.0f} KB  "
+                  f"{a['ciclos']} ciclos  {a['ventas']} ventas  {a['logs_sistema']} logs")
+        sys.exit(0)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: benchmark.py
+# DESCRIPCION: Generador de historiales sinteticos y medicion de rutas criticas
+# ==========================================================
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import sqlite3
+import subprocess
+import contextlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from database import ArbitrajeDB
+from arbitraje_core import CicloArbitraje, VentaDetalle, evaluar_escenarios
+
+COMISION = 0.0035
+
+
+def generar_historial(db_path: str, usuarios: int = 1, ciclos: int = 4, dias: int = 30,
+                      ventas: int = 3, semilla: int = 42) -> dict:
+    """
+    Genera un historial sintetico y determinista directamente en un archivo
+    de ArbitrajeDB: usuarios x ciclos x dias x ventas.
+
+    El ultimo ciclo de cada usuario queda ACTIVO y el resto FINALIZADO.
+    Las filas se insertan con executemany dentro de una sola transaccion,
+    asi que millones de ventas se generan en segundos.
+
+    Returns:
+        dict con el numero de filas creadas por tabla.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    db = ArbitrajeDB(db_path)
+    rng = random.Random(semilla)
+    cursor = db.conn.cursor()
+    cursor.execute("PRAGMA synchronous = OFF")
+
+    inicio = date(2024, 1, 1)
+    totales = {'usuarios': 0, 'ciclos': 0, 'dias': 0, 'ventas': 0}
+
+    # Historial sintetico: sin filas de auditoria
+    with db.sin_auditoria():
+        for u in range(usuarios):
+            if u == 0:
+                usuario_id = 1
+            else:
+                cursor.execute(
+                    "INSERT INTO usuarios (nombre, email, rol, activo) VALUES (?, ?, 'OPERADOR', 1)",
+                    (f"Operador {u + 1}", f"operador{u + 1}@arbitraje.local")
+                )
+                usuario_id = cursor.lastrowid
+            totales['usuarios'] += 1
+
+            for c in range(ciclos):
+                fecha_inicio = inicio + timedelta(days=c * dias)
+                activo = c == ciclos - 1
+                capital_inicial = round(rng.uniform(200, 1000), 2)
+                cursor.execute("""
+                    INSERT INTO ciclos (usuario_id, nombre_ciclo, fecha_inicio, fecha_fin, dias_totales,
+                                        capital_inicial, tasa_compra_inicial, tipo_capital_inicial, estado)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'USD_FRESCO', ?)
+                """, (usuario_id, f"Ciclo sintetico {u + 1}-{c + 1}", fecha_inicio,
+                      None if activo else fecha_inicio + timedelta(days=dias - 1),
+                      dias, capital_inicial, 1.04424, 'ACTIVO' if activo else 'FINALIZADO'))
+                ciclo_id = cursor.lastrowid
+                totales['ciclos'] += 1
+
+                # Como el inicio con la opcion A de main.py: la compra en USD
+                # fresco es la del ciclo y el dia 1 opera ese saldo
+                capital = capital_inicial
+                for d in range(1, dias + 1):
+                    tasa_compra = rng.uniform(1.03, 1.06)
+                    tasa_venta = tasa_compra * rng.uniform(1.01, 1.08)
+                    montos = [capital / ventas] * ventas
+                    detalle = [VentaDetalle(i, m, tasa_venta, tasa_compra, COMISION)
+                               for i, m in enumerate(montos, 1)]
+                    ganancia = sum(v.ganancia_venta for v in detalle)
+
+                    cursor.execute("""
+                        INSERT INTO dias (
+                            ciclo_id, usuario_id, dia_numero, fecha, capital_disponible_inicio,
+                            capital_operado, capital_no_operado, capital_fresco_inyectado,
+                            saldo_boveda_final, ganancia_bruta_dia, ganancia_retenida,
+                            ganancia_retirada, roi_dia, tipo_operacion, tasa_costo_final
+                        ) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, 0, ?, ?, ?)
+                    """, (ciclo_id, usuario_id, d, fecha_inicio + timedelta(days=d - 1),
+                          capital / tasa_compra, capital, 0.0,
+                          (capital + ganancia) / tasa_compra, ganancia, ganancia,
+                          ganancia / capital * 100, 'SALDO_ANTERIOR' if d == 1 else 'REINVERSION_TOTAL',
+                          tasa_compra))
+                    dia_id = cursor.lastrowid
+
+                    cursor.executemany("""
+                        INSERT INTO ventas (
+                            dia_id, venta_numero, monto_operado, usdt_operado,
+                            tasa_venta_p2p, tasa_compra, comision_monto, comision_porcentaje,
+                            ingreso_bruto, ingreso_neto, ganancia_venta
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, ((dia_id, v.venta_numero, v.monto_operado, v.usdt_operado, tasa_venta,
+                           tasa_compra, v.comision_monto, COMISION, v.ingreso_bruto,
+                           v.ingreso_neto, v.ganancia_venta) for v in detalle))
+
+                    capital += ganancia
+                    totales['dias'] += 1
+                    totales['ventas'] += ventas
+
+    # Los asientos contables se generan desde las filas insertadas, ya
+    # confirmadas (fuera de la transaccion se adjuntan los archivos anuales)
+    totales['movimientos'] = db.reconstruir_libro_contable()
+
+    db.cerrar()
+    return totales
+
+
+def medir(funcion, repeticiones: int, preparar=None) -> dict:
+    """
+    Ejecuta `funcion` `repeticiones` veces y retorna estadisticas en ms.
+    `preparar`, si se indica, se ejecuta antes de cada repeticion fuera del cronometro.
+    """
+    tiempos = []
+    for i in range(repeticiones):
+        argumentos = (preparar(i),) if preparar else ()
+        t0 = time.perf_counter()
+        funcion(*argumentos)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+
+    tiempos.sort()
+    return {
+        'n': len(tiempos),
+        'p50_ms': _percentil(tiempos, 0.50),
+        'p95_ms': _percentil(tiempos, 0.95),
+        'media_ms': sum(tiempos) / len(tiempos),
+        'min_ms': tiempos[0],
+        'max_ms': tiempos[-1]
+    }
+
+
+def _percentil(ordenados: list, q: float) -> float:
+    """Percentil con interpolacion lineal sobre una lista ya ordenada."""
+    if len(ordenados) == 1:
+        return ordenados[0]
+    pos = (len(ordenados) - 1) * q
+    base = int(pos)
+    siguiente = min(base + 1, len(ordenados) - 1)
+    return ordenados[base] + (ordenados[siguiente] - ordenados[base]) * (pos - base)
+
+
+def _silencioso(funcion):
+    """Envuelve una funcion que imprime en consola para medirla sin salida."""
+    def envuelta(*args, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return funcion(*args, **kwargs)
+    return envuelta
+
+
+def ejecutar_benchmarks(db_path: str, repeticiones: int = 50) -> dict:
+    """Mide las rutas criticas sobre un historial ya generado."""
+    import main
+    import reportes
+    import columnar
+
+    resultados = {}
+    db = ArbitrajeDB(db_path)
+    ciclo = db.obtener_ciclo_activo(usuario_id=1)
+    ciclo_id = ciclo['id']
+    ultimo = db.obtener_ultimo_dia(ciclo_id)
+
+    dia_data = {
+        'dia_numero': ultimo['dia_numero'] + 1, 'fecha': date.today(),
+        'capital_disponible_inicio': 500.0, 'capital_operado': 500.0,
+        'capital_no_operado': 0.0, 'capital_fresco_inyectado': 0.0,
+        'saldo_boveda_final': 510.0, 'ganancia_bruta_dia': 10.0,
+        'ganancia_retenida': 10.0, 'ganancia_retirada': 0.0, 'roi_dia': 2.0,
+        'tipo_operacion': 'BENCHMARK', 'tasa_costo_final': 1.0
+    }
+    venta_data = {
+        'venta_numero': 1, 'monto_operado': 100.0, 'usdt_operado': 95.76,
+        'tasa_venta_p2p': 1.12, 'tasa_compra': 1.04424, 'comision_monto': 0.37,
+        'comision_porcentaje': COMISION, 'ingreso_bruto': 107.25,
+        'ingreso_neto': 106.88, 'ganancia_venta': 6.88
+    }
+
+    # Las escrituras se hacen en un ciclo aparte para no alterar el ciclo medido
+    ciclo_escritura = db.iniciar_ciclo(1, 10 ** 6, 500.0, nombre_ciclo='Benchmark escritura')
+    dia_escritura = db.registrar_dia(ciclo_escritura, 1, dict(dia_data, dia_numero=1))
+
+    resultados['registrar_dia'] = medir(
+        lambda numero: db.registrar_dia(ciclo_escritura, 1, dict(dia_data, dia_numero=numero)),
+        repeticiones, preparar=lambda i: i + 2
+    )
+    resultados['registrar_venta'] = medir(
+        lambda: db.registrar_venta(dia_escritura, venta_data), repeticiones
+    )
+    resultados['obtener_ultimo_dia'] = medir(lambda: db.obtener_ultimo_dia(ciclo_id), repeticiones)
+    resultados['get_estadisticas_ciclo'] = medir(lambda: db.get_estadisticas_ciclo(ciclo_id), repeticiones)
+    resultados['resumen_final_ciclo'] = medir(
+        _silencioso(lambda: main.resumen_final_ciclo(db, ciclo_id)), repeticiones
+    )
+
+    # Primera lectura (conexion nueva, cache vacia) y repeticiones servidas desde la cache
+    resultados['reportes.generar_reporte_ciclo_sin_cache'] = medir(
+        _silencioso(lambda _: reportes.generar_reporte_ciclo(db_path, ciclo_id)), repeticiones,
+        preparar=lambda i: reportes.cerrar_conexiones()
+    )
+    resultados['reportes.generar_reporte_ciclo'] = medir(
+        _silencioso(lambda: reportes.generar_reporte_ciclo(db_path, ciclo_id)), repeticiones
+    )
+    resultados['reportes.mostrar_ultimos_dias'] = medir(
+        _silencioso(lambda: reportes.mostrar_ultimos_dias(db_path, 30, ciclo_id)), repeticiones
+    )
+    reporte_txt = os.path.join(os.path.dirname(db_path) or '.', 'reporte_benchmark.txt')
+    resultados['reportes.exportar_reporte_txt'] = medir(
+        _silencioso(lambda: reportes.exportar_reporte_txt(db_path, reporte_txt, ciclo_id)), repeticiones
+    )
+    reportes.cerrar_conexiones()
+
+    directorio_columnar = os.path.join(os.path.dirname(db_path) or '.', 'columnar')
+    resultados['columnar.actualizar_columnar'] = medir(
+        lambda: columnar.actualizar_columnar(db_path, directorio_columnar, reconstruir=True),
+        max(1, repeticiones // 10)
+    )
+    resultados['reportes.reporte_columnar'] = medir(
+        _silencioso(lambda: reportes.reporte_columnar(directorio_columnar)), repeticiones
+    )
+
+    arbitraje = CicloArbitraje(500.0, 1.12, 1.04424, COMISION, 30, 1000.0, 3)
+    resultados['CicloArbitraje.breakdown_operacion'] = medir(
+        lambda: arbitraje.breakdown_operacion(500.0, 3), repeticiones
+    )
+    resultados['CicloArbitraje.breakdown_venta_por_venta'] = medir(
+        lambda: arbitraje.breakdown_venta_por_venta(500.0, 100), repeticiones
+    )
+    tasas_barrido = np.linspace(1.05, 1.20, 10 ** 6)
+    resultados['evaluar_escenarios_1e6'] = medir(
+        lambda: evaluar_escenarios(500.0, tasas_barrido, 1.04424, COMISION, 3, 30, 1000.0),
+        max(1, repeticiones // 10)
+    )
+
+    db.cerrar()
+    if os.path.exists(reporte_txt):
+        os.remove(reporte_txt)
+    return resultados
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de Control de Arbitraje P2P")
+    parser.add_argument('--usuarios', type=int, default=1)
+    parser.add_argument('--ciclos', type=int, default=4)
+    parser.add_argument('--dias', type=int, default=30)
+    parser.add_argument('--ventas', type=int, default=3)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--directorio', default='data/benchmark')
+    parser.add_argument('--salida', default=None, help="Archivo JSON de resultados (por defecto stdout)")
+    args = parser.parse_args()
+
+    os.makedirs(args.directorio, exist_ok=True)
+    db_path = os.path.join(args.directorio, 'benchmark.db')
+
+    t0 = time.perf_counter()
+    filas = generar_historial(db_path, args.usuarios, args.ciclos, args.dias, args.ventas, args.semilla)
+    tiempo_generacion = time.perf_counter() - t0
+
+    informe = {
+        'commit': _commit_actual(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'parametros': vars(args),
+        'filas': filas,
+        'generacion_s': tiempo_generacion,
+        'resultados': ejecutar_benchmarks(db_path, args.repeticiones)
+    }
+
+    salida = json.dumps(informe, indent=2, default=str)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(salida)
+    else:
+        sys.stdout.write(salida + "\n")
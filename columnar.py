@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: columnar.py
+# DESCRIPCION: Instantanea columnar (.npy) de dias y ventas para analisis
+# ==========================================================
+#
+# Cada columna de dias y ventas se guarda en su propio archivo .npy dentro
+# de data/columnar/<tabla>/, mas un manifiesto.json con la cantidad de filas
+# y el ultimo id exportado de cada tabla. Los reportes abren los archivos con
+# np.load(mmap_mode='r'): no se parsea nada y solo se leen del disco las
+# paginas de las columnas que se usan.
+#
+# Representacion:
+#   - importes, tasas y comisiones: int64 en micro-unidades (como dinero.py)
+#   - ids y contadores: int64 (NULL -> 0)
+#   - fecha: datetime64[D]; timestamp de la venta: datetime64[s]
+#   - ventas lleva ademas ciclo_id, usuario_id y fecha de su dia, para
+#     agrupar sin cruzar con dias
+#
+# Cada actualizacion agrega al final de cada archivo las filas con id mayor
+# al ultimo exportado. La cabecera .npy tiene largo fijo: agregar filas solo
+# reescribe la forma. Los dias ya exportados se pueden editar despues
+# (actualizar_dia sube dias.version): el manifiesto guarda la version vista
+# de cada dia editado y los que cambiaron se reescriben en su lugar.
+# Si la base se recreo (RESET) la instantanea se reconstruye completa.
+#
+#   python columnar.py actualizar [--reconstruir]
+#   python columnar.py info
+
+import os
+import sys
+import json
+import shutil
+import struct
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from database import ArbitrajeDB, COLUMNAS_MONETARIAS_DIA, COLUMNAS_MONETARIAS_VENTA
+from dinero import a_micro_np
+
+DIRECTORIO_COLUMNAR = 'data/columnar'
+VERSION_FORMATO = 2
+FILAS_POR_BLOQUE = 50_000
+
+# Cabecera .npy de largo fijo (magic + version + largo + dict con relleno)
+TAMANO_CABECERA = 128
+
+_ENTERO = 'i8'
+_MICRO = 'micro'
+_REAL = 'f8'
+_FECHA = 'M8[D]'
+_MOMENTO = 'M8[s]'
+
+# tabla -> ((columna, tipo, expresion SQL), ...); la primera columna es siempre el id
+COLUMNAS = {
+    'dias': (
+        ('id', _ENTERO, 'd.id'),
+        ('ciclo_id', _ENTERO, 'd.ciclo_id'),
+        ('usuario_id', _ENTERO, 'd.usuario_id'),
+        ('dia_numero', _ENTERO, 'd.dia_numero'),
+        ('fecha', _FECHA, 'd.fecha'),
+        ('metodo_pago_id', _ENTERO, 'd.metodo_pago_id'),
+        *((columna, _MICRO, f'd.{columna}') for columna in COLUMNAS_MONETARIAS_DIA),
+        ('roi_dia', _REAL, 'd.roi_dia'),
+    ),
+    'ventas': (
+        ('id', _ENTERO, 'v.id'),
+        ('dia_id', _ENTERO, 'v.dia_id'),
+        ('ciclo_id', _ENTERO, 'd.ciclo_id'),
+        ('usuario_id', _ENTERO, 'd.usuario_id'),
+        ('venta_numero', _ENTERO, 'v.venta_numero'),
+        ('fecha', _FECHA, 'd.fecha'),
+        *((columna, _MICRO, f'v.{columna}') for columna in COLUMNAS_MONETARIAS_VENTA),
+        ('timestamp', _MOMENTO, 'v.timestamp'),
+    ),
+}
+
+_ORIGEN = {
+    'dias': "FROM {esquema}.dias d WHERE d.id > ?",
+    'ventas': "FROM {esquema}.ventas v JOIN {esquema}.dias d ON v.dia_id = d.id WHERE v.id > ?",
+}
+
+# Tablas con filas editables: (version, origen de las filas ya exportadas que se editaron).
+# Solo se edita la base operativa; los archivos anuales se adjuntan en solo lectura.
+_EDITABLES = {
+    'dias': ('d.version', "FROM main.dias d WHERE d.version > 0 AND d.id <= ?"),
+}
+
+
+def _dtype(tipo) -> np.dtype:
+    return np.dtype(_ENTERO if tipo == _MICRO else tipo)
+
+
+def _ruta_columna(directorio, tabla, columna) -> str:
+    return os.path.join(directorio, tabla, f"{columna}.npy")
+
+
+def _ruta_manifiesto(directorio) -> str:
+    return os.path.join(directorio, 'manifiesto.json')
+
+
+# ---------- Archivos .npy que crecen ----------
+
+def _cabecera(dtype, filas) -> bytes:
+    texto = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (filas,)})
+    texto = texto.ljust(TAMANO_CABECERA - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(texto)) + texto.encode('latin1')
+
+
+def _agregar(ruta, dtype, filas_previas, valores):
+    """
+    Agrega `valores` al final del .npy. Primero descarta lo que haya despues
+    de `filas_previas` (restos de una actualizacion cortada antes del
+    manifiesto) y al final reescribe la cabecera con la nueva forma.
+    """
+    with open(ruta, 'r+b' if os.path.exists(ruta) else 'wb') as f:
+        f.truncate(TAMANO_CABECERA + filas_previas * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(np.ascontiguousarray(valores, dtype=dtype).tobytes())
+        f.seek(0)
+        f.write(_cabecera(dtype, filas_previas + len(valores)))
+
+
+def _convertir(valores, tipo) -> np.ndarray:
+    """Una columna de filas de sqlite3 -> array del tipo de la instantanea."""
+    n = len(valores)
+    if tipo == _ENTERO:
+        return np.fromiter((0 if v is None else v for v in valores), dtype=np.int64, count=n)
+    if tipo == _MICRO:
+        return a_micro_np(np.fromiter((0.0 if v is None else v for v in valores), dtype=np.float64, count=n))
+    if tipo == _REAL:
+        return np.fromiter((np.nan if v is None else v for v in valores), dtype=np.float64, count=n)
+    if tipo == _FECHA:
+        return np.array(['NaT' if v is None else str(v)[:10] for v in valores], dtype=tipo)
+    return np.array(['NaT' if v is None else str(v)[:19] for v in valores], dtype=tipo)
+
+
+# ---------- Manifiesto ----------
+
+def leer_manifiesto(directorio=DIRECTORIO_COLUMNAR):
+    ruta = _ruta_manifiesto(directorio)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    ruta = _ruta_manifiesto(directorio)
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+def _manifiesto_vacio(db_path) -> dict:
+    return {
+        'version': VERSION_FORMATO,
+        'db_path': db_path,
+        'actualizado': None,
+        'tablas': {
+            tabla: {
+                'filas': 0,
+                'ultimo_id': 0,
+                'columnas': {columna: _dtype(tipo).str for columna, tipo, _ in columnas},
+                'micro': [columna for columna, tipo, _ in columnas if tipo == _MICRO],
+                **({'versiones': {}} if tabla in _EDITABLES else {})
+            }
+            for tabla, columnas in COLUMNAS.items()
+        }
+    }
+
+
+def _vigente(conn, manifiesto, directorio) -> bool:
+    """
+    La instantanea sirve si tiene el formato y las columnas actuales, estan
+    todos sus archivos y la base no se recreo: con AUTOINCREMENT,
+    sqlite_sequence nunca baja de un id ya usado (ni al archivar ciclos).
+    """
+    if manifiesto.get('version') != VERSION_FORMATO:
+        return False
+    for tabla, columnas in COLUMNAS.items():
+        estado = manifiesto['tablas'].get(tabla)
+        if estado is None or list(estado['columnas']) != [columna for columna, _, _ in columnas]:
+            return False
+        if not all(os.path.exists(_ruta_columna(directorio, tabla, c)) for c in estado['columnas']):
+            return False
+        secuencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabla,)).fetchone()
+        if (secuencia[0] if secuencia else 0) < estado['ultimo_id']:
+            return False
+    return True
+
+
+# ---------- Exportacion ----------
+
+def _reescribir_editadas(cursor, directorio, tabla, columnas, estado) -> int:
+    """
+    Reescribe en su lugar las filas ya exportadas de `tabla` cuya version
+    cambio desde la ultima actualizacion y anota la version nueva.
+
+    Returns:
+        Cantidad de filas reescritas
+    """
+    version, origen = _EDITABLES[tabla]
+    vistas = estado['versiones']
+    seleccion = ', '.join(expresion for _, _, expresion in columnas)
+    filas = [fila for fila in cursor.execute(f"SELECT {seleccion}, {version} {origen} ORDER BY 1",
+                                             (estado['ultimo_id'],))
+             if vistas.get(str(fila[0])) != fila[-1]]
+    if not filas:
+        return 0
+
+    # Los ids de la instantanea estan ordenados (se agregan con ORDER BY id)
+    ids = np.load(_ruta_columna(directorio, tabla, 'id'), mmap_mode='r')[:estado['filas']]
+    posiciones = np.searchsorted(ids, [fila[0] for fila in filas])
+    for (columna, tipo, _), valores in zip(columnas, zip(*filas)):
+        destino = np.load(_ruta_columna(directorio, tabla, columna), mmap_mode='r+')
+        destino[posiciones] = _convertir(valores, tipo)
+        destino.flush()
+        del destino
+    vistas.update((str(fila[0]), fila[-1]) for fila in filas)
+    return len(filas)
+
+
+def actualizar_columnar(db_path='data/arbitraje.db', directorio=DIRECTORIO_COLUMNAR,
+                        reconstruir=False) -> dict:
+    """
+    Agrega a la instantanea los dias y ventas registrados desde la ultima
+    actualizacion (incluye los de archivos anuales adjuntos, si los hay) y
+    reescribe los dias editados desde entonces. Todo se lee dentro de una
+    misma transaccion de lectura.
+
+    Args:
+        reconstruir: Descartar la instantanea y exportar todo de nuevo
+
+    Returns:
+        dict tabla -> filas agregadas, mas 'reescritas' (dias editados
+        actualizados) y 'reconstruida' (bool)
+    """
+    db = ArbitrajeDB(db_path)
+    try:
+        esquemas = ['main'] + db.adjuntar_archivos()
+        manifiesto = leer_manifiesto(directorio)
+        reconstruida = reconstruir or manifiesto is None or not _vigente(db.conn, manifiesto, directorio)
+        if reconstruida:
+            descartar_columnar(directorio)
+            manifiesto = _manifiesto_vacio(db_path)
+
+        cursor = db.conn.cursor()
+        cursor.row_factory = None
+        agregadas = {}
+        reescritas = 0
+        with db.transaccion(inmediata=False):
+            for tabla, columnas in COLUMNAS.items():
+                estado = manifiesto['tablas'][tabla]
+                os.makedirs(os.path.join(directorio, tabla), exist_ok=True)
+                for columna, tipo, _ in columnas:
+                    if not os.path.exists(_ruta_columna(directorio, tabla, columna)):
+                        _agregar(_ruta_columna(directorio, tabla, columna), _dtype(tipo), 0, [])
+                if tabla in _EDITABLES and estado['filas']:
+                    reescritas += _reescribir_editadas(cursor, directorio, tabla, columnas, estado)
+
+                seleccion = ', '.join(expresion for _, _, expresion in columnas)
+                cursor.execute(
+                    ' UNION ALL '.join(f"SELECT {seleccion} " + _ORIGEN[tabla].format(esquema=esquema)
+                                       for esquema in esquemas) + " ORDER BY 1",
+                    [estado['ultimo_id']] * len(esquemas)
+                )
+
+                agregadas[tabla] = 0
+                while True:
+                    filas = cursor.fetchmany(FILAS_POR_BLOQUE)
+                    if not filas:
+                        break
+                    for (columna, tipo, _), valores in zip(columnas, zip(*filas)):
+                        _agregar(_ruta_columna(directorio, tabla, columna), _dtype(tipo),
+                                 estado['filas'], _convertir(valores, tipo))
+                    estado['filas'] += len(filas)
+                    estado['ultimo_id'] = filas[-1][0]
+                    agregadas[tabla] += len(filas)
+
+        manifiesto['actualizado'] = datetime.now().isoformat(timespec='seconds')
+        _guardar_manifiesto(directorio, manifiesto)
+    finally:
+        db.cerrar()
+
+    return {**agregadas, 'reescritas': reescritas, 'reconstruida': reconstruida}
+
+
+def descartar_columnar(directorio=DIRECTORIO_COLUMNAR):
+    """Borra la instantanea (es un derivado: se reconstruye desde la base)."""
+    for tabla in COLUMNAS:
+        shutil.rmtree(os.path.join(directorio, tabla), ignore_errors=True)
+    if os.path.exists(_ruta_manifiesto(directorio)):
+        os.remove(_ruta_manifiesto(directorio))
+
+
+# ---------- Lectura ----------
+
+def abrir_columnar(directorio=DIRECTORIO_COLUMNAR):
+    """
+    Abre la instantanea en solo lectura, sin copiar datos a memoria.
+
+    Returns:
+        {'dias': {columna: array}, 'ventas': {...}} con arrays mapeados en
+        memoria (las columnas 'micro' del manifiesto en micro-unidades), o
+        None si no hay instantanea
+    """
+    manifiesto = leer_manifiesto(directorio)
+    if manifiesto is None:
+        return None
+
+    instantanea = {}
+    for tabla, estado in manifiesto['tablas'].items():
+        instantanea[tabla] = {}
+        for columna, descr in estado['columnas'].items():
+            if estado['filas'] == 0:
+                # mmap no admite regiones vacias
+                instantanea[tabla][columna] = np.empty(0, dtype=np.dtype(descr))
+            else:
+                # Lo que siga a las filas del manifiesto es una actualizacion en curso
+                instantanea[tabla][columna] = np.load(
+                    _ruta_columna(directorio, tabla, columna), mmap_mode='r'
+                )[:estado['filas']]
+    return instantanea
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Instantanea columnar de dias y ventas")
+    parser.add_argument('--db', default='data/arbitraje.db')
+    parser.add_argument('--directorio', default=DIRECTORIO_COLUMNAR)
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_actualizar = sub.add_parser('actualizar', help="Agregar los dias y ventas nuevos")
+    p_actualizar.add_argument('--reconstruir', action='store_true', help="Exportar todo de nuevo")
+
+    sub.add_parser('info', help="Filas y tamano de la instantanea")
+    args = parser.parse_args()
+
+    if args.comando == 'actualizar':
+        r = actualizar_columnar(args.db, args.directorio, args.reconstruir)
+        print(f"[OK] Instantanea {'reconstruida' if r['reconstruida'] else 'actualizada'}: "
+              f"+{r['dias']} dias, +{r['ventas']} ventas, {r['reescritas']} dias editados")
+
+    elif args.comando == 'info':
+        manifiesto = leer_manifiesto(args.directorio)
+        if manifiesto is None:
+            print("[AVISO] No hay instantanea columnar")
+            sys.exit(1)
+        print(f"Actualizada: {manifiesto['actualizado']}")
+        for tabla, estado in manifiesto['tablas'].items():
+            tamano = sum(os.path.getsize(_ruta_columna(args.directorio, tabla, c)) for c in estado['columnas'])
+            print(f"   {tabla:<8} {estado['filas']:>12,} filas  {len(estado['columnas'])} columnas  "
+                  f"{tamano / 1024:,.0f} KB  (ultimo id {estado['ultimo_id']})")
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: conciliacion.py
+# DESCRIPCION: Conciliacion masiva contra Binance P2P y extractos bancarios
+# ==========================================================
+#
+# Cruza las ventas y las compras con capital fresco de un periodo contra:
+#   - el historial de ordenes P2P exportado de Binance (ordenes SELL completadas)
+#   - el extracto bancario en CSV (creditos = cobros de ventas,
+#     debitos = compras de USDT con capital fresco)
+#
+# Los movimientos del sistema del periodo (mas `ventana_dias` a cada lado)
+# van a tablas hash: por id de orden P2P y por (tramo de monto, dia), con
+# tramos del ancho de la tolerancia. Los CSV se leen por bloques y cada fila
+# busca su pareja en los tramos vecinos dentro de la ventana, asi que la
+# memoria no depende del tamano de los archivos.
+#
+# El resultado es una fila de conciliaciones por ciclo y dia (origen
+# IMPORTACION) y la lista de excepciones en excepciones_conciliacion.
+# Volver a conciliar un periodo reemplaza lo importado antes.
+#
+#   python conciliacion.py --desde 2024-01-01 --hasta 2024-12-31 \
+#       --binance ordenes_p2p.csv --banco extracto.csv [--tolerancia 0.05] [--ventana 1]
+
+import sys
+import argparse
+from datetime import date, timedelta
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from database import ArbitrajeDB
+from dinero import a_micro, a_micro_np, desde_micro
+
+TOLERANCIA = 0.05       # USD de diferencia admitida entre ambos lados
+VENTANA_DIAS = 1        # dias de diferencia admitidos (zonas horarias, acreditaciones)
+FILAS_POR_BLOQUE = 50_000
+
+# Columnas del export de ordenes P2P de Binance
+COLUMNAS_BINANCE = {
+    'orden': 'Order Number',
+    'tipo': 'Order Type',
+    'monto': 'Total Price',
+    'estado': 'Status',
+    'fecha': 'Created Time',
+}
+
+# Columnas del extracto bancario (monto positivo = credito, negativo = debito)
+COLUMNAS_BANCO = {
+    'fecha': 'Fecha',
+    'monto': 'Monto',
+    'referencia': 'Referencia',
+}
+
+ESTADO_CONCILIADO = 'CONCILIADO'
+ESTADO_CON_DIFERENCIAS = 'CON_DIFERENCIAS'
+
+
+def _dia(fecha) -> int:
+    """Fecha -> numero de dia (el mismo que datetime64[D] de los CSV)."""
+    return int(np.datetime64(str(fecha)[:10], 'D').astype(np.int64))
+
+
+def _fecha(dia: int) -> str:
+    return str(np.datetime64(dia, 'D'))
+
+
+class IndiceConciliacion:
+    """
+    Tabla hash de movimientos del sistema. Los que tienen id de orden P2P
+    solo se concilian por ese id; el resto por (tramo de monto, dia), y
+    dentro de cada tramo por monto exacto (muchas ventas de un dia suelen
+    tener el mismo importe).
+    """
+
+    def __init__(self, movimientos, tolerancia_micro, ventana_dias):
+        """
+        Args:
+            movimientos: Lista de dicts con 'monto' (micro), 'dia' y 'orden' (o None)
+        """
+        self.movimientos = movimientos
+        self.tolerancia = tolerancia_micro
+        self.ancho = max(tolerancia_micro, 1)
+        self.ventana = ventana_dias
+        self.conciliado = [False] * len(movimientos)
+        self.por_orden = {}
+        self.por_tramo = defaultdict(dict)
+        # Se recorre al reves para que pop() devuelva primero el movimiento mas antiguo
+        for i in range(len(movimientos) - 1, -1, -1):
+            m = movimientos[i]
+            if m['orden']:
+                self.por_orden[m['orden']] = i
+            else:
+                self.por_tramo[(m['monto'] // self.ancho, m['dia'])].setdefault(m['monto'], []).append(i)
+
+    def buscar(self, monto, dia, orden=None):
+        """
+        Concilia y retorna el indice del movimiento que corresponde, o None.
+        Entre varios candidatos gana el de menor diferencia de monto y de dia.
+        """
+        if orden:
+            i = self.por_orden.get(orden)
+            if i is not None and not self.conciliado[i]:
+                self.conciliado[i] = True
+                return i
+
+        tramo = monto // self.ancho
+        mejor = None
+        for t in (tramo - 1, tramo, tramo + 1):
+            for d in range(dia - self.ventana, dia + self.ventana + 1):
+                for candidato_monto, pendientes in self.por_tramo.get((t, d), {}).items():
+                    diferencia = abs(candidato_monto - monto)
+                    if diferencia > self.tolerancia:
+                        continue
+                    candidato = (diferencia, abs(d - dia), pendientes[-1], (t, d), candidato_monto)
+                    if mejor is None or candidato < mejor:
+                        mejor = candidato
+        if mejor is None:
+            return None
+
+        # Los conciliados salen de la tabla: las busquedas siguientes no los recorren
+        _, _, i, clave, candidato_monto = mejor
+        tramo_candidato = self.por_tramo[clave]
+        tramo_candidato[candidato_monto].pop()
+        if not tramo_candidato[candidato_monto]:
+            del tramo_candidato[candidato_monto]
+        self.conciliado[i] = True
+        return i
+
+
+def _leer_bloques(ruta, columnas, formato_fecha=None):
+    """
+    Lee el CSV por bloques. Cada bloque es un dict con 'dia' (int64),
+    'monto' (micro-unidades int64) y el resto de las columnas como texto;
+    las filas con fecha o monto ilegibles se cuentan en 'invalidas'.
+    """
+    nombres = {nombre: clave for clave, nombre in columnas.items()}
+    lector = pd.read_csv(ruta, dtype=str, chunksize=FILAS_POR_BLOQUE, skipinitialspace=True,
+                         usecols=lambda c: c.strip() in nombres)
+    for bloque in lector:
+        bloque = bloque.rename(columns=lambda c: nombres[c.strip()])
+        faltantes = {'fecha', 'monto'} - set(bloque.columns)
+        if faltantes:
+            raise ValueError(f"{ruta}: faltan las columnas {[columnas[c] for c in faltantes]}")
+
+        fechas = pd.to_datetime(bloque['fecha'], format=formato_fecha, errors='coerce')
+        montos = pd.to_numeric(bloque['monto'].str.replace(',', '', regex=False), errors='coerce')
+        validas = (fechas.notna() & montos.notna()).to_numpy()
+
+        resultado = {
+            'dia': fechas.to_numpy()[validas].astype('datetime64[D]').astype(np.int64),
+            'monto': a_micro_np(montos.to_numpy()[validas]),
+            'invalidas': int((~validas).sum())
+        }
+        for clave in set(bloque.columns) - {'fecha', 'monto'}:
+            resultado[clave] = bloque[clave].fillna('').str.strip().to_numpy()[validas]
+        yield resultado
+
+
+def _excepcion(fecha, origen, tipo, referencia, monto, detalle, ciclo_id=None, diferencia=None) -> dict:
+    return {
+        'fecha': fecha, 'origen': origen, 'tipo': tipo, 'referencia': referencia,
+        'monto': desde_micro(monto), 'diferencia': desde_micro(diferencia) if diferencia is not None else None,
+        'detalle': detalle, 'ciclo_id': ciclo_id
+    }
+
+
+def conciliar(usuario_id, desde, hasta, archivo_binance=None, archivo_banco=None,
+              db_path='data/arbitraje.db', tolerancia=TOLERANCIA, ventana_dias=VENTANA_DIAS,
+              formato_fecha_banco=None) -> dict:
+    """
+    Concilia las ventas y compras del periodo [desde, hasta] contra los
+    archivos dados (al menos uno) y guarda conciliaciones y excepciones.
+
+    Por ciclo y dia:
+        saldo_sistema: ingreso bruto de las ventas menos compras con capital fresco
+        saldo_binance: ordenes P2P conciliadas con esas ventas (None sin export)
+        saldo_banco: creditos menos debitos conciliados (None sin extracto)
+        diferencia: la mayor entre |ventas - binance| y |sistema - banco|
+
+    Returns:
+        dict con contadores de lectura y conciliacion, excepciones por tipo
+        y cantidad de conciliaciones registradas
+    """
+    if archivo_binance is None and archivo_banco is None:
+        raise ValueError("Se necesita el export de Binance, el extracto bancario o ambos.")
+
+    desde, hasta = date.fromisoformat(str(desde)), date.fromisoformat(str(hasta))
+    dia_desde, dia_hasta = _dia(desde), _dia(hasta)
+    tolerancia_micro = a_micro(tolerancia)
+    margen = timedelta(days=ventana_dias)
+
+    db = ArbitrajeDB(db_path)
+    try:
+        # Los ciclos ya archivados tambien se concilian (y se reemplazan al reimportar)
+        db.adjuntar_archivos()
+        ventas = [
+            {'id': v['id'], 'orden': (v['orden_p2p_id'] or '').strip() or None, 'ciclo_id': v['ciclo_id'],
+             'fecha': str(v['fecha'])[:10], 'dia': _dia(v['fecha']), 'monto': a_micro(v['ingreso_bruto'] or 0)}
+            for v in db.obtener_ventas_conciliacion(usuario_id, desde - margen, hasta + margen)
+        ]
+        compras = [
+            {'id': f"{c['origen']}-{c['id']}", 'orden': None, 'ciclo_id': c['ciclo_id'],
+             'fecha': str(c['fecha'])[:10], 'dia': _dia(c['fecha']), 'monto': a_micro(c['monto'] or 0)}
+            for c in db.obtener_compras_conciliacion(usuario_id, desde - margen, hasta + margen)
+        ]
+
+        excepciones = []
+        resumen = {'ventas': 0, 'compras': 0, 'ordenes_leidas': 0, 'ordenes_conciliadas': 0,
+                   'movimientos_banco_leidos': 0, 'movimientos_banco_conciliados': 0, 'filas_invalidas': 0}
+        cobrado_binance = {}
+        cobrado_banco = {}
+        pagado_banco = {}
+
+        # ---------- Binance: ordenes de venta completadas ----------
+        if archivo_binance is not None:
+            indice = IndiceConciliacion(ventas, tolerancia_micro, ventana_dias)
+            for bloque in _leer_bloques(archivo_binance, COLUMNAS_BINANCE):
+                resumen['filas_invalidas'] += bloque['invalidas']
+                seleccion = (bloque['dia'] >= dia_desde) & (bloque['dia'] <= dia_hasta)
+                if 'tipo' in bloque:
+                    seleccion &= np.char.upper(bloque['tipo'].astype(str)) == 'SELL'
+                if 'estado' in bloque:
+                    seleccion &= np.char.upper(bloque['estado'].astype(str)) == 'COMPLETED'
+                ordenes = bloque['orden'] if 'orden' in bloque else np.full(len(bloque['dia']), '')
+
+                for dia, monto, orden in zip(bloque['dia'][seleccion].tolist(), bloque['monto'][seleccion].tolist(),
+                                             ordenes[seleccion].tolist()):
+                    resumen['ordenes_leidas'] += 1
+                    i = indice.buscar(monto, dia, orden or None)
+                    if i is None:
+                        excepciones.append(_excepcion(_fecha(dia), 'BINANCE', 'ORDEN_SIN_VENTA', orden, monto,
+                                                      "Orden P2P sin venta registrada"))
+                        continue
+                    resumen['ordenes_conciliadas'] += 1
+                    cobrado_binance[i] = monto
+                    venta = ventas[i]
+                    if abs(venta['monto'] - monto) > tolerancia_micro:
+                        excepciones.append(_excepcion(
+                            venta['fecha'], 'BINANCE', 'DIFERENCIA_MONTO', orden, monto,
+                            f"Venta {venta['id']}: el sistema registra {desde_micro(venta['monto']):.2f}",
+                            venta['ciclo_id'], monto - venta['monto']
+                        ))
+
+        # ---------- Banco: creditos (ventas) y debitos (compras) ----------
+        if archivo_banco is not None:
+            creditos = IndiceConciliacion([dict(v, orden=None) for v in ventas], tolerancia_micro, ventana_dias)
+            debitos = IndiceConciliacion(compras, tolerancia_micro, ventana_dias)
+            for bloque in _leer_bloques(archivo_banco, COLUMNAS_BANCO, formato_fecha_banco):
+                resumen['filas_invalidas'] += bloque['invalidas']
+                seleccion = (bloque['dia'] >= dia_desde) & (bloque['dia'] <= dia_hasta) & (bloque['monto'] != 0)
+                referencias = (bloque['referencia'] if 'referencia' in bloque
+                               else np.full(len(bloque['dia']), ''))
+
+                for dia, monto, referencia in zip(bloque['dia'][seleccion].tolist(), bloque['monto'][seleccion].tolist(),
+                                                  referencias[seleccion].tolist()):
+                    resumen['movimientos_banco_leidos'] += 1
+                    if monto > 0:
+                        i = creditos.buscar(monto, dia)
+                        if i is not None:
+                            cobrado_banco[i] = monto
+                    else:
+                        i = debitos.buscar(-monto, dia)
+                        if i is not None:
+                            pagado_banco[i] = -monto
+                    if i is not None:
+                        resumen['movimientos_banco_conciliados'] += 1
+                    else:
+                        excepciones.append(_excepcion(
+                            _fecha(dia), 'BANCO', 'CREDITO_SIN_VENTA' if monto > 0 else 'DEBITO_SIN_COMPRA',
+                            referencia, abs(monto), "Movimiento bancario sin contrapartida en el sistema"
+                        ))
+
+        # ---------- Movimientos del sistema sin pareja y saldos por ciclo y dia ----------
+        saldos = defaultdict(lambda: {'ventas': 0, 'compras': 0, 'binance': 0, 'banco': 0, 'excepciones': 0})
+        for i, venta in enumerate(ventas):
+            if not dia_desde <= venta['dia'] <= dia_hasta:
+                continue
+            resumen['ventas'] += 1
+            saldo = saldos[(venta['ciclo_id'], venta['fecha'])]
+            saldo['ventas'] += venta['monto']
+            saldo['binance'] += cobrado_binance.get(i, 0)
+            saldo['banco'] += cobrado_banco.get(i, 0)
+            faltantes = []
+            if archivo_binance is not None and i not in cobrado_binance:
+                faltantes.append(('VENTA_SIN_ORDEN', "Venta sin orden P2P en Binance"))
+            if archivo_banco is not None and i not in cobrado_banco:
+                faltantes.append(('VENTA_SIN_CREDITO', "Venta sin credito en el banco"))
+            for tipo, detalle in faltantes:
+                saldo['excepciones'] += 1
+                excepciones.append(_excepcion(venta['fecha'], 'SISTEMA', tipo, f"venta {venta['id']}",
+                                              venta['monto'], detalle, venta['ciclo_id']))
+
+        for i, compra in enumerate(compras):
+            if not dia_desde <= compra['dia'] <= dia_hasta:
+                continue
+            resumen['compras'] += 1
+            saldo = saldos[(compra['ciclo_id'], compra['fecha'])]
+            saldo['compras'] += compra['monto']
+            saldo['banco'] -= pagado_banco.get(i, 0)
+            if archivo_banco is not None and i not in pagado_banco:
+                saldo['excepciones'] += 1
+                excepciones.append(_excepcion(compra['fecha'], 'SISTEMA', 'COMPRA_SIN_DEBITO',
+                                              f"compra {compra['id']}", compra['monto'],
+                                              "Compra con capital fresco sin debito en el banco",
+                                              compra['ciclo_id']))
+
+        conciliaciones = []
+        for (ciclo_id, fecha), saldo in sorted(saldos.items(), key=lambda s: (s[0][1], s[0][0])):
+            sistema = saldo['ventas'] - saldo['compras']
+            diferencias = []
+            if archivo_binance is not None:
+                diferencias.append(abs(saldo['ventas'] - saldo['binance']))
+            if archivo_banco is not None:
+                diferencias.append(abs(sistema - saldo['banco']))
+            diferencia = max(diferencias)
+            conciliado = diferencia <= tolerancia_micro and saldo['excepciones'] == 0
+            conciliaciones.append({
+                'ciclo_id': ciclo_id, 'fecha': fecha,
+                'saldo_sistema': desde_micro(sistema),
+                'saldo_binance': desde_micro(saldo['binance']) if archivo_binance is not None else None,
+                'saldo_banco': desde_micro(saldo['banco']) if archivo_banco is not None else None,
+                'diferencia': desde_micro(diferencia),
+                'estado': ESTADO_CONCILIADO if conciliado else ESTADO_CON_DIFERENCIAS,
+                'observaciones': (f"{saldo['excepciones']} excepcion(es)" if saldo['excepciones']
+                                  else "Conciliacion automatica")
+            })
+
+        resumen['conciliaciones'] = db.registrar_conciliacion(usuario_id, desde, hasta, conciliaciones, excepciones)
+        resumen['conciliaciones_con_diferencias'] = sum(
+            c['estado'] == ESTADO_CON_DIFERENCIAS for c in conciliaciones
+        )
+        resumen['excepciones'] = dict(sorted(Counter(e['tipo'] for e in excepciones).items()))
+        db.log_sistema('INFO', 'conciliacion', 'conciliar',
+                       f"{desde} a {hasta}: {resumen['conciliaciones']} conciliaciones, "
+                       f"{len(excepciones)} excepciones", usuario_id)
+    finally:
+        db.cerrar()
+
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conciliacion contra Binance P2P y el extracto bancario")
+    parser.add_argument('--db', default='data/arbitraje.db')
+    parser.add_argument('--usuario', type=int, default=1)
+    parser.add_argument('--desde', required=True, help="YYYY-MM-DD")
+    parser.add_argument('--hasta', required=True, help="YYYY-MM-DD")
+    parser.add_argument('--binance', help="CSV de ordenes P2P exportado de Binance")
+    parser.add_argument('--banco', help="CSV del extracto bancario")
+    parser.add_argument('--formato-fecha-banco', default=None, help="p. ej. %%d/%%m/%%Y")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help="USD")
+    parser.add_argument('--ventana', type=int, default=VENTANA_DIAS, help="Dias")
+    args = parser.parse_args()
+
+    try:
+        r = conciliar(args.usuario, args.desde, args.hasta, args.binance, args.banco, args.db,
+                      args.tolerancia, args.ventana, args.formato_fecha_banco)
+    except (ValueError, OSError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+    print(f"[OK] {r['conciliaciones']} conciliaciones ({r['conciliaciones_con_diferencias']} con diferencias)")
+    print(f"   Ventas: {r['ventas']}   Compras con capital fresco: {r['compras']}")
+    if args.binance:
+        print(f"   Ordenes P2P: {r['ordenes_conciliadas']}/{r['ordenes_leidas']} conciliadas")
+    if args.banco:
+        print(f"   Movimientos bancarios: {r['movimientos_banco_conciliados']}/{r['movimientos_banco_leidos']} conciliados")
+    if r['filas_invalidas']:
+        print(f"   Filas con fecha o monto ilegible: {r['filas_invalidas']}")
+    for tipo, cantidad in r['excepciones'].items():
+        print(f"   [EXCEPCION] {tipo}: {cantidad}")
+    sys.exit(0)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: contabilidad.py
+# DESCRIPCION: Reglas de la partida doble para movimientos_contables
+# ==========================================================
+#
+# Cada operacion se traduce a un asiento: una lista de lineas (cuenta,
+# importe) en micro-unidades de USD que suma exactamente cero. Importe
+# positivo = DEBE, negativo = HABER. Los saldos se expresan como
+# DEBE - HABER, asi que las cuentas de naturaleza acreedora (aportes,
+# ganancia) tienen saldo negativo.
+#
+# La boveda se valua al costo en USD de los USDT que contiene. Flujo de un dia:
+#
+#   COMPRA_FRESCO      BOVEDA_USDT       / APORTES_CAPITAL   capital fresco
+#   VENTA              BANCO             / BOVEDA_USDT       costo vendido
+#                                        / GANANCIA_VENTAS   bruto - costo
+#   COMISION           COMISIONES_P2P    / BANCO             comision P2P
+#   REPOSICION         BOVEDA_USDT       / BANCO             capital que vuelve
+#   GANANCIA_RETENIDA  BOVEDA_USDT       / BANCO             ganancia reinvertida
+#   RETIRO             RETIROS           / BANCO             el resto de la ganancia
+#
+# BANCO es una cuenta puente: al cerrar cada dia vuelve a cero.
+# Este modulo solo arma los asientos; database.py los registra.
+
+import dinero
+
+CUENTA_BOVEDA = 'BOVEDA_USDT'
+CUENTA_BANCO = 'BANCO'
+CUENTA_APORTES = 'APORTES_CAPITAL'
+CUENTA_GANANCIA = 'GANANCIA_VENTAS'
+CUENTA_COMISIONES = 'COMISIONES_P2P'
+CUENTA_RETIROS = 'RETIROS'
+
+CUENTAS = {
+    CUENTA_BOVEDA: 'ACTIVO',
+    CUENTA_BANCO: 'ACTIVO',
+    CUENTA_APORTES: 'PATRIMONIO',
+    CUENTA_RETIROS: 'PATRIMONIO',
+    CUENTA_GANANCIA: 'INGRESO',
+    CUENTA_COMISIONES: 'GASTO'
+}
+
+# Lineas de una cuenta entre dos checkpoints de saldo
+INTERVALO_CHECKPOINT = 256
+
+
+def asiento(tipo, concepto, lineas, fecha, ciclo_id=None, dia_id=None, venta_id=None,
+            referencia=None) -> dict:
+    """
+    Arma un asiento descartando las lineas en cero.
+
+    Raises:
+        ValueError: si DEBE y HABER no suman lo mismo
+    """
+    lineas = [(cuenta, importe) for cuenta, importe in lineas if importe != 0]
+    if sum(importe for _, importe in lineas) != 0:
+        raise ValueError(f"Asiento {tipo} descuadrado: {lineas}")
+    return {
+        'tipo': tipo, 'concepto': concepto, 'lineas': lineas, 'fecha': str(fecha),
+        'ciclo_id': ciclo_id, 'dia_id': dia_id, 'venta_id': venta_id, 'referencia': referencia
+    }
+
+
+def asientos_inicio_ciclo(ciclo: dict) -> list:
+    """Aporte del capital inicial (USD comprados o USDT existentes a 1:1)."""
+    capital = dinero.a_micro(ciclo['capital_inicial'] or 0)
+    concepto = ('Compra inicial de USDT' if ciclo['tipo_capital_inicial'] == 'USD_FRESCO'
+                else 'USDT existentes al iniciar el ciclo')
+    return [asiento('APORTE_INICIAL', concepto,
+                    [(CUENTA_BOVEDA, capital), (CUENTA_APORTES, -capital)],
+                    ciclo['fecha_inicio'], ciclo_id=ciclo['id'])]
+
+
+def asientos_dia(dia: dict, ventas: list) -> list:
+    """
+    Asientos de un dia registrado: compra con capital fresco, cada venta con
+    su comision, reposicion del capital, ganancia retenida y retiro.
+
+    Args:
+        dia: Fila de dias (con id, ciclo_id, fecha, capital_fresco_inyectado,
+            ganancia_retenida)
+        ventas: Filas de ventas del dia
+    """
+    referencias = {'ciclo_id': dia['ciclo_id'], 'dia_id': dia['id']}
+    fecha = dia['fecha']
+    asientos = []
+
+    fresco = dinero.a_micro(dia['capital_fresco_inyectado'] or 0)
+    asientos.append(asiento('COMPRA_FRESCO', 'Compra de USDT con capital fresco',
+                            [(CUENTA_BOVEDA, fresco), (CUENTA_APORTES, -fresco)],
+                            fecha, **referencias))
+
+    costo_total = neto_total = 0
+    for venta in ventas:
+        costo = dinero.a_micro(venta['monto_operado'])
+        bruto = dinero.a_micro(venta['ingreso_bruto'])
+        comision = dinero.a_micro(venta['comision_monto'])
+        costo_total += costo
+        neto_total += bruto - comision
+        asientos.append(asiento(
+            'VENTA', f"Venta {venta['venta_numero']} P2P",
+            [(CUENTA_BANCO, bruto), (CUENTA_BOVEDA, -costo), (CUENTA_GANANCIA, costo - bruto)],
+            fecha, venta_id=venta['id'], **referencias
+        ))
+        asientos.append(asiento(
+            'COMISION', f"Comision P2P venta {venta['venta_numero']}",
+            [(CUENTA_COMISIONES, comision), (CUENTA_BANCO, -comision)],
+            fecha, venta_id=venta['id'], **referencias
+        ))
+
+    retenida = dinero.a_micro(dia['ganancia_retenida'] or 0)
+    retiro = neto_total - costo_total - retenida
+    asientos.append(asiento('REPOSICION', 'Capital operado de vuelta a la boveda',
+                            [(CUENTA_BOVEDA, costo_total), (CUENTA_BANCO, -costo_total)],
+                            fecha, **referencias))
+    asientos.append(asiento('GANANCIA_RETENIDA', 'Ganancia reinvertida en la boveda',
+                            [(CUENTA_BOVEDA, retenida), (CUENTA_BANCO, -retenida)],
+                            fecha, **referencias))
+    asientos.append(asiento('RETIRO', 'Ganancia retirada',
+                            [(CUENTA_RETIROS, retiro), (CUENTA_BANCO, -retiro)],
+                            fecha, **referencias))
+
+    return [a for a in asientos if a['lineas']]
+
+
+def asientos_cierre_ciclo(ciclo: dict, saldo_boveda_micro: int, fecha) -> list:
+    """Al finalizar el ciclo el saldo de la boveda pasa al dueno."""
+    return [a for a in [asiento(
+        'CIERRE_CICLO', 'Saldo de la boveda al cerrar el ciclo',
+        [(CUENTA_RETIROS, saldo_boveda_micro), (CUENTA_BOVEDA, -saldo_boveda_micro)],
+        fecha, ciclo_id=ciclo['id']
+    )] if a['lineas']]
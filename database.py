@@ -6,20 +6,232 @@
 # ==========================================================
 
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timezone
 import os
+import re
+import time
+import random
+import json
 import hashlib
+from itertools import chain
+
+import numpy as np
+
+from dinero import cuantizar, a_micro, desde_micro, a_micro_np
+import contabilidad
+import registro
+
+# Columnas monetarias que se guardan cuantizadas a micro-unidades (ver dinero.py)
+COLUMNAS_MONETARIAS_DIA = (
+    'capital_disponible_inicio', 'capital_operado', 'capital_no_operado',
+    'capital_fresco_inyectado', 'saldo_boveda_final', 'ganancia_bruta_dia',
+    'ganancia_retenida', 'ganancia_retirada', 'tasa_costo_final'
+)
+COLUMNAS_MONETARIAS_VENTA = (
+    'monto_operado', 'usdt_operado', 'tasa_venta_p2p', 'tasa_compra',
+    'comision_monto', 'comision_porcentaje', 'ingreso_bruto', 'ingreso_neto',
+    'ganancia_venta'
+)
+
+# Archivos anuales con los ciclos finalizados (ver archivador.py); cada base
+# usa el directorio 'archivo' junto a ella (ver directorio_archivos)
+DIRECTORIO_ARCHIVO = 'data/archivo'
+
+# Tablas archivadas con id AUTOINCREMENT: una base nueva junto a archivos de
+# una anterior sigue sus secuencias para no repetir ids ya archivados
+TABLAS_ARCHIVADAS_CON_ID = ('ciclos', 'dias', 'ventas', 'logs_sistema')
+
+# Tablas con triggers de auditoria: columnas que no se auditan en los UPDATE
+# (dias_completados lo mantienen los triggers de ciclo_stats en cada dia)
+TABLAS_AUDITADAS = {
+    'ciclos': ('dias_completados', 'version'),
+    'dias': ('version',),
+    'ventas': (),
+    'metodos_pago': (),
+    'parametros_sistema': ()
+}
+
+# Respaldos incrementales (ver respaldos.py). Las tablas que solo reciben
+# INSERT se respaldan por marca de agua; en las demas, triggers anotan en
+# cambios_bloques cada bloque de FILAS_POR_BLOQUE_CAMBIOS rowids que recibe
+# un UPDATE o un DELETE
+TABLAS_SOLO_INSERCION = ('movimientos_contables', 'auditoria', 'logs_sistema')
+FILAS_POR_BLOQUE_CAMBIOS = 1000
+
+# PRAGMAs de cada conexion. WAL permite que los lectores (reportes) y el
+# escritor (consola) trabajen a la vez sin bloquearse; con WAL, synchronous
+# NORMAL solo arriesga la ultima transaccion ante un corte de energia.
+PRAGMAS_DEFAULT = {
+    'busy_timeout': 5000,       # ms de espera ante un bloqueo (primero: cambiar a WAL lo necesita)
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # KiB (negativo) -> ~16 MB por conexion
+    'mmap_size': 268435456,     # 256 MB
+    'temp_store': 'MEMORY'
+}
+
+# PRAGMAs que solo tienen sentido (o solo se pueden fijar) en el escritor
+PRAGMAS_SOLO_ESCRITOR = ('journal_mode', 'synchronous')
+
+# BEGIN bloqueado por otro escritor: cada intento espera a lo sumo
+# ESPERA_BEGIN_MS en SQLite y entre intentos se duerme una espera exponencial
+# con jitter (desde ESPERA_INICIAL_BLOQUEO, tope ESPERA_MAXIMA_BLOQUEO). Se
+# deja de reintentar cuando se cumple el busy_timeout de la conexion: la espera
+# total no pasa de busy_timeout.
+ESPERA_BEGIN_MS = 100
+ESPERA_INICIAL_BLOQUEO = 0.05
+ESPERA_MAXIMA_BLOQUEO = 1.0
+
+
+class ConflictoConcurrencia(RuntimeError):
+    """Otro operador modifico el registro desde que se leyo (version distinta)."""
+
+
+def aplicar_pragmas(conn, pragmas, solo_lectura=False):
+    """Aplica un diccionario de PRAGMAs a una conexion."""
+    for nombre, valor in pragmas.items():
+        if solo_lectura and nombre in PRAGMAS_SOLO_ESCRITOR:
+            continue
+        conn.execute(f"PRAGMA {nombre} = {valor}")
+    if solo_lectura:
+        conn.execute("PRAGMA query_only = ON")
+
 
 class ArbitrajeDB:
-    def __init__(self, db_path='data/arbitraje.db'):
+    # Migraciones del esquema: (version, descripcion, metodo). Se aplican en
+    # orden, cada una en su propia transaccion, y PRAGMA user_version guarda la
+    # ultima aplicada; abrir una base al dia solo cuesta leer ese PRAGMA.
+    # Los cambios de esquema se agregan SIEMPRE como una migracion nueva al final.
+    MIGRACIONES = (
+        (1, 'Esquema base, usuario y parametros por defecto', 'crear_tablas'),
+        (2, 'Tabla ciclo_stats mantenida por triggers', '_migracion_ciclo_stats'),
+        (3, 'Indices compuestos para las consultas frecuentes', '_migracion_indices_compuestos'),
+        (4, 'Indice de dias por usuario y fecha (historial paginado)', '_migracion_indice_usuario_fecha'),
+        (5, 'Libro contable por cuenta con checkpoints de saldo', '_migracion_libro_contable'),
+        (6, 'Triggers de auditoria con diferencias en JSON', '_migracion_auditoria'),
+        (7, 'Conciliacion automatica: origen y tabla de excepciones', '_migracion_conciliacion'),
+        (8, 'Columnas version en ciclos y dias (concurrencia optimista)', '_migracion_versiones'),
+        (9, 'Registro de bloques modificados para respaldos incrementales', '_migracion_cambios_bloques'),
+        (10, 'Reparto de cada compra con capital fresco entre metodos de pago', '_migracion_compras_metodos_pago'),
+    )
+    
+    def __init__(self, db_path='data/arbitraje.db', pragmas=None, check_same_thread=True):
+        """
+        Args:
+            pragmas: Cambios sobre PRAGMAS_DEFAULT, p. ej. {'synchronous': 'FULL'}
+            check_same_thread: False para compartir la conexion entre hilos
+                (solo a traves de GestorConexiones, que serializa las escrituras)
+        """
         self.db_path = db_path
+        self.directorio_archivo = directorio_archivos(db_path)
+        self.pragmas = {**PRAGMAS_DEFAULT, **(pragmas or {})}
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.conn = sqlite3.connect(db_path)
+        # uri=True para poder adjuntar los archivos anuales en solo lectura
+        self.conn = sqlite3.connect(db_path, check_same_thread=check_same_thread, uri=True)
         self.conn.row_factory = sqlite3.Row
-        self.crear_tablas()
+        aplicar_pragmas(self.conn, self.pragmas)
+        self._nivel_transaccion = 0
+        self._archivos = []
+        self.migrar()
+    
+    def version_esquema(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrar(self):
+        """
+        Aplica las migraciones pendientes. Las bases creadas antes de este
+        sistema tienen user_version 0; la migracion 1 usa IF NOT EXISTS y OR IGNORE,
+        por lo que tambien sirve para ellas sin tocar sus datos.
+        
+        Returns:
+            Lista de versiones aplicadas
+        """
+        version = self.version_esquema()
+        ultima = self.MIGRACIONES[-1][0]
+        if version > ultima:
+            raise RuntimeError(
+                f"La base de datos tiene el esquema v{version}, "
+                f"posterior al soportado por este programa (v{ultima})."
+            )
+        
+        aplicadas = []
+        for numero, descripcion, metodo in self.MIGRACIONES:
+            if numero <= version:
+                continue
+            # Otra conexion pudo migrar mientras tanto: se vuelve a leer con el bloqueo tomado
+            with self.transaccion(inmediata=True):
+                version = self.version_esquema()
+                if numero <= version:
+                    continue
+                getattr(self, metodo)()
+                self.conn.execute(f"PRAGMA user_version = {numero}")
+            aplicadas.append(numero)
+        return aplicadas
+    
+    @contextmanager
+    def transaccion(self, inmediata=True):
+        """
+        Unidad de trabajo: todas las escrituras dentro del bloque se
+        confirman con un solo COMMIT al salir, o se deshacen si hay una
+        excepcion. Los bloques anidados se unen a la transaccion exterior.
+        
+            with db.transaccion():
+                dia_id = db.registrar_dia(...)
+                db.registrar_ventas(dia_id, ...)
+        
+        Por defecto toma el bloqueo de escritura al empezar (BEGIN IMMEDIATE):
+        lo que se lee dentro del bloque no puede cambiar antes del COMMIT y
+        la espera por otro escritor ocurre al inicio (reintentos hasta
+        busy_timeout), nunca a mitad de la unidad. inmediata=False usa BEGIN
+        (diferido) para bloques de solo lectura.
+        """
+        if self._nivel_transaccion == 0 and not self.conn.in_transaction:
+            self._comenzar("BEGIN IMMEDIATE" if inmediata else "BEGIN")
+        self._nivel_transaccion += 1
+        try:
+            yield self
+        except BaseException:
+            self._nivel_transaccion -= 1
+            if self._nivel_transaccion == 0:
+                self.conn.rollback()
+            raise
+        else:
+            self._nivel_transaccion -= 1
+            if self._nivel_transaccion == 0:
+                self.conn.commit()
+    
+    def _comenzar(self, sentencia):
+        """
+        BEGIN con reintentos mientras la base este bloqueada, hasta cumplir
+        el busy_timeout de la conexion (ver ESPERA_BEGIN_MS).
+        """
+        busy_timeout = int(self.pragmas['busy_timeout'])
+        limite = time.monotonic() + busy_timeout / 1000
+        espera = ESPERA_INICIAL_BLOQUEO
+        self.conn.execute(f"PRAGMA busy_timeout = {min(ESPERA_BEGIN_MS, busy_timeout)}")
+        try:
+            while True:
+                try:
+                    self.conn.execute(sentencia)
+                    return
+                except sqlite3.OperationalError as e:
+                    restante = limite - time.monotonic()
+                    if 'locked' not in str(e) or restante <= 0:
+                        raise
+                    time.sleep(min(espera * random.uniform(0.5, 1.5), restante))
+                    espera = min(espera * 2, ESPERA_MAXIMA_BLOQUEO)
+        finally:
+            self.conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+    
+    def _commit(self):
+        """Confirma la escritura salvo que haya una transaccion() abierta."""
+        if self._nivel_transaccion == 0:
+            self.conn.commit()
     
     def crear_tablas(self):
-        """Crea todas las tablas del sistema"""
+        """Crea todas las tablas del sistema (migracion 1)"""
         cursor = self.conn.cursor()
         
         # TABLAS DE USUARIOS
@@ -296,10 +508,34 @@ class ArbitrajeDB:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_auditoria_usuario ON auditoria(usuario_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_nivel ON logs_sistema(nivel)')
         
-        self.conn.commit()
+        self._continuar_secuencias()
+        self._commit()
         self.crear_usuario_default()
         self.insertar_parametros_default()
     
+    def _continuar_secuencias(self):
+        """
+        Si junto a la base hay archivos anuales (la base se borro o se
+        recreo), las secuencias AUTOINCREMENT siguen despues del mayor id
+        archivado: un ciclo nuevo nunca reutiliza el id de uno archivado.
+        """
+        for _, ruta in archivos_anuales(self.directorio_archivo):
+            archivo = sqlite3.connect(f"file:{os.path.abspath(ruta)}?mode=ro", uri=True)
+            try:
+                maximos = [(tabla, archivo.execute(f"SELECT MAX(id) FROM {tabla}").fetchone()[0])
+                           for tabla in TABLAS_ARCHIVADAS_CON_ID]
+            finally:
+                archivo.close()
+            for tabla, maximo in maximos:
+                if maximo is None:
+                    continue
+                self.conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?",
+                                  (maximo, tabla, maximo))
+                self.conn.execute("""
+                    INSERT INTO sqlite_sequence (name, seq)
+                    SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+                """, (tabla, maximo, tabla))
+    
     def crear_usuario_default(self):
         cursor = self.conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM usuarios")
@@ -308,7 +544,7 @@ class ArbitrajeDB:
                 INSERT INTO usuarios (nombre, email, rol, activo)
                 VALUES ('Operador Principal', 'admin@arbitraje.local', 'ADMIN', 1)
             """)
-            self.conn.commit()
+            self._commit()
     
     def insertar_parametros_default(self):
         parametros = [
@@ -324,18 +560,295 @@ class ArbitrajeDB:
                 (nombre, valor, tipo, categoria, descripcion)
                 VALUES (?, ?, ?, ?, ?)
             """, param)
-        self.conn.commit()
+        self._commit()
+    
+    def _migracion_ciclo_stats(self):
+        """
+        Agregados por ciclo (dias, ventas, USDT, comisiones, ganancia, capital
+        fresco y ultimo dia) que los triggers actualizan en cada INSERT/UPDATE/
+        DELETE de dias y ventas. Tambien mantienen ciclos.dias_completados.
+        Las sumas se redondean a 6 decimales, la malla de dinero.py.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ciclo_stats (
+                ciclo_id INTEGER PRIMARY KEY,
+                total_dias INTEGER NOT NULL DEFAULT 0,
+                total_ventas INTEGER NOT NULL DEFAULT 0,
+                total_usdt REAL NOT NULL DEFAULT 0,
+                total_comisiones REAL NOT NULL DEFAULT 0,
+                ganancia_total REAL NOT NULL DEFAULT 0,
+                total_inyectado REAL NOT NULL DEFAULT 0,
+                ultimo_dia_id INTEGER,
+                FOREIGN KEY (ciclo_id) REFERENCES ciclos(id),
+                FOREIGN KEY (ultimo_dia_id) REFERENCES dias(id)
+            )
+        """)
+        
+        # Datos existentes
+        cursor.execute("""
+            INSERT OR REPLACE INTO ciclo_stats (
+                ciclo_id, total_dias, total_ventas, total_usdt, total_comisiones,
+                ganancia_total, total_inyectado, ultimo_dia_id
+            )
+            SELECT c.id,
+                   (SELECT COUNT(*) FROM dias d WHERE d.ciclo_id = c.id),
+                   (SELECT COUNT(*) FROM ventas v JOIN dias d ON v.dia_id = d.id WHERE d.ciclo_id = c.id),
+                   (SELECT ROUND(COALESCE(SUM(v.usdt_operado), 0), 6) FROM ventas v JOIN dias d ON v.dia_id = d.id WHERE d.ciclo_id = c.id),
+                   (SELECT ROUND(COALESCE(SUM(v.comision_monto), 0), 6) FROM ventas v JOIN dias d ON v.dia_id = d.id WHERE d.ciclo_id = c.id),
+                   (SELECT ROUND(COALESCE(SUM(d.ganancia_bruta_dia), 0), 6) FROM dias d WHERE d.ciclo_id = c.id),
+                   (SELECT ROUND(COALESCE(SUM(d.capital_fresco_inyectado), 0), 6) FROM dias d WHERE d.ciclo_id = c.id),
+                   (SELECT d.id FROM dias d WHERE d.ciclo_id = c.id ORDER BY d.dia_numero DESC, d.id DESC LIMIT 1)
+            FROM ciclos c
+        """)
+        cursor.execute("""
+            UPDATE ciclos SET dias_completados = (
+                SELECT total_dias FROM ciclo_stats WHERE ciclo_id = ciclos.id
+            )
+        """)
+        
+        for trigger in _TRIGGERS_CICLO_STATS:
+            cursor.execute(trigger)
+    
+    def _migracion_indices_compuestos(self):
+        """
+        Indices con las columnas de filtro seguidas de las de orden, para que
+        las consultas frecuentes no recorran tablas ni ordenen en B-trees
+        temporales. Reemplazan a los indices de una sola columna que son su
+        prefijo. Ver tests/test_planes_consulta.py para verificar los planes.
+        """
+        cursor = self.conn.cursor()
+        # obtener_ciclo_activo (con y sin usuario)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ciclos_usuario_estado_inicio ON ciclos(usuario_id, estado, fecha_inicio)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ciclos_estado_inicio ON ciclos(estado, fecha_inicio)')
+        # obtener_ultimo_dia, historial de ventas, ultimo_dia_id de ciclo_stats
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dias_ciclo_numero ON dias(ciclo_id, dia_numero)')
+        # consumo_metodos_pago (cubriente)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dias_usuario_metodo_fecha ON dias(usuario_id, metodo_pago_id, fecha, capital_fresco_inyectado)')
+        # ventas de un dia en orden
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ventas_dia_numero ON ventas(dia_id, venta_numero)')
+        # obtener_metodos_pago (el orden por id sale del rowid del indice)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_metodos_pago_usuario ON metodos_pago(usuario_id)')
+        
+        for indice in ('idx_ciclos_usuario', 'idx_ciclos_estado', 'idx_dias_ciclo', 'idx_ventas_dia'):
+            cursor.execute(f'DROP INDEX IF EXISTS {indice}')
+    
+    def _migracion_indice_usuario_fecha(self):
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_dias_usuario_fecha ON dias(usuario_id, fecha)')
+    
+    def _migracion_libro_contable(self):
+        """
+        Cuenta y numero de asiento en movimientos_contables, tabla de
+        checkpoints de saldo por cuenta y asientos del historial existente.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("ALTER TABLE movimientos_contables ADD COLUMN cuenta TEXT")
+        cursor.execute("ALTER TABLE movimientos_contables ADD COLUMN asiento_id INTEGER")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS saldos_contables (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usuario_id INTEGER,
+                cuenta TEXT NOT NULL,
+                movimiento_id INTEGER NOT NULL,
+                fecha DATE,
+                saldo REAL NOT NULL,
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+                FOREIGN KEY (movimiento_id) REFERENCES movimientos_contables(id)
+            )
+        """)
+        # Ultimo saldo de una cuenta y tramos entre checkpoints (el rowid va al final del indice)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_usuario_cuenta ON movimientos_contables(usuario_id, cuenta)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_asiento ON movimientos_contables(asiento_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_saldos_usuario_cuenta_fecha ON saldos_contables(usuario_id, cuenta, fecha, movimiento_id)')
+        # Una base nueva no tiene historial que asentar (y dentro de la
+        # migracion no se pueden adjuntar los archivos de una base anterior)
+        if cursor.execute("SELECT 1 FROM ciclos LIMIT 1").fetchone():
+            self.reconstruir_libro_contable()
+    
+    def _migracion_auditoria(self):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT OR IGNORE INTO configuracion (clave, valor, tipo_dato, descripcion)
+            VALUES ('auditoria_activa', '1', 'BOOL', 'Los triggers de auditoria registran cambios')
+        """)
+        # historial_registro (el orden por id sale del rowid del indice)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_auditoria_tabla_registro ON auditoria(tabla_afectada, registro_id)')
+        self.crear_triggers_auditoria()
+    
+    def _migracion_conciliacion(self):
+        """
+        Origen de cada conciliacion (MANUAL o IMPORTACION de conciliacion.py)
+        y excepciones de la conciliacion automatica.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("ALTER TABLE conciliaciones ADD COLUMN origen TEXT DEFAULT 'MANUAL'")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS excepciones_conciliacion (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usuario_id INTEGER,
+                conciliacion_id INTEGER,
+                fecha DATE,
+                origen TEXT,
+                tipo TEXT,
+                referencia TEXT,
+                monto REAL,
+                diferencia REAL,
+                detalle TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+                FOREIGN KEY (conciliacion_id) REFERENCES conciliaciones(id)
+            )
+        """)
+        # Reemplazo de un periodo ya importado y listado de excepciones
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conciliaciones_ciclo_fecha ON conciliaciones(ciclo_id, fecha_conciliacion)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_excepciones_usuario_fecha ON excepciones_conciliacion(usuario_id, fecha)')
     
-    def iniciar_ciclo(self, usuario_id, dias_totales, capital_inicial, nombre_ciclo=None, tasa_compra_inicial=1.0, tipo_capital='USDT'):
+    def _migracion_versiones(self):
+        """
+        Cada cambio a un ciclo o a un dia incrementa su version. Quien
+        escribe pasa la version que leyo y la escritura se rechaza
+        (ConflictoConcurrencia) si otro operador la cambio mientras tanto.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("ALTER TABLE ciclos ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE dias ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self.crear_triggers_auditoria()
+    
+    def _migracion_cambios_bloques(self):
+        """
+        cambios_bloques guarda, por tabla y bloque de rowids, el numero del
+        ultimo UPDATE o DELETE que lo toco: el respaldo incremental vuelve a
+        exportar solo los bloques con un cambio posterior a su manifiesto
+        anterior. Los INSERT no se anotan: caen al final de la tabla, que el
+        respaldo exporta siempre.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cambios_bloques (
+                cambio INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabla TEXT NOT NULL,
+                bloque INTEGER NOT NULL,
+                UNIQUE (tabla, bloque)
+            )
+        """)
+        # Una base recreada (RESET) o restaurada no continua la numeracion de otra
+        cursor.execute("""
+            INSERT OR IGNORE INTO configuracion (clave, valor, tipo_dato, descripcion)
+            VALUES ('id_registro_cambios', lower(hex(randomblob(16))), 'TEXT',
+                    'Identifica el registro de cambios_bloques de esta base')
+        """)
+        self.crear_triggers_cambios()
+    
+    def crear_triggers_cambios(self):
+        """
+        (Re)genera los triggers de cambios_bloques de todas las tablas con
+        INTEGER PRIMARY KEY, salvo las de TABLAS_SOLO_INSERCION. Toda migracion
+        que cree una tabla debe volver a llamarlo.
+        """
+        cursor = self.conn.cursor()
+        tablas = [fila[0] for fila in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()]
+        for tabla in tablas:
+            if tabla in TABLAS_SOLO_INSERCION or tabla == 'cambios_bloques':
+                continue
+            # Sin INTEGER PRIMARY KEY, VACUUM puede renumerar los rowid: esas
+            # tablas (configuracion) el respaldo las exporta completas
+            claves = [fila for fila in cursor.execute(f"PRAGMA table_info({tabla})").fetchall() if fila[5]]
+            if len(claves) != 1 or claves[0][2].upper() != 'INTEGER':
+                continue
+            for sql in _sql_triggers_cambios(tabla):
+                cursor.execute(sql)
+    
+    def _migracion_compras_metodos_pago(self):
+        """
+        Una fila por metodo de pago en cada compra con capital fresco (inicio
+        de ciclo o dia): los limites de cada metodo se descuentan con lo que
+        realmente se le cargo, aunque la compra se reparta entre varios.
+        Las compras anteriores se cargan enteras a dias.metodo_pago_id.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS compras_metodos_pago (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usuario_id INTEGER,
+                ciclo_id INTEGER,
+                dia_id INTEGER,
+                metodo_pago_id INTEGER,
+                fecha DATE,
+                monto_usd REAL,
+                FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+                FOREIGN KEY (metodo_pago_id) REFERENCES metodos_pago(id)
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO compras_metodos_pago (usuario_id, ciclo_id, dia_id, metodo_pago_id, fecha, monto_usd)
+            SELECT usuario_id, ciclo_id, id, metodo_pago_id, fecha, capital_fresco_inyectado
+            FROM dias
+            WHERE metodo_pago_id IS NOT NULL AND capital_fresco_inyectado > 0
+        """)
+        # consumo_metodos_pago (cubriente); el indice de dias que usaba queda sin uso
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_compras_metodos_usuario_metodo_fecha ON compras_metodos_pago(usuario_id, metodo_pago_id, fecha, monto_usd)')
+        cursor.execute('DROP INDEX IF EXISTS idx_dias_usuario_metodo_fecha')
+        self.crear_triggers_cambios()
+    
+    def crear_triggers_auditoria(self):
+        """
+        (Re)genera los triggers de auditoria de TABLAS_AUDITADAS con las
+        columnas actuales de cada tabla. Toda migracion que agregue columnas
+        a esas tablas debe volver a llamarlo.
+        """
+        cursor = self.conn.cursor()
+        for tabla, excluidas in TABLAS_AUDITADAS.items():
+            columnas = [fila[1] for fila in cursor.execute(f"PRAGMA table_info({tabla})")]
+            for sql in _sql_triggers_auditoria(tabla, columnas, excluidas):
+                cursor.execute(sql)
+    
+    @contextmanager
+    def sin_auditoria(self):
+        """
+        Suspende los triggers de auditoria dentro de una transaccion (cargas
+        masivas, reconstrucciones). Otras conexiones nunca ven el cambio.
+        """
+        with self.transaccion():
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT valor FROM configuracion WHERE clave = 'auditoria_activa'")
+            previo = cursor.fetchone()
+            cursor.execute("UPDATE configuracion SET valor = '0' WHERE clave = 'auditoria_activa'")
+            try:
+                yield self
+            finally:
+                if previo is not None:
+                    cursor.execute("UPDATE configuracion SET valor = ? WHERE clave = 'auditoria_activa'", (previo[0],))
+    
+    def iniciar_ciclo(self, usuario_id, dias_totales, capital_inicial, nombre_ciclo=None, tasa_compra_inicial=1.0, tipo_capital='USDT',
+                      unico_activo=False, compras=()):
+        """
+        Con unico_activo=True falla (ConflictoConcurrencia) si el usuario ya
+        tiene un ciclo ACTIVO, por ejemplo abierto por otro operador despues
+        de que este consulto obtener_ciclo_activo.
+        
+        Args:
+            compras: Tuplas (metodo_pago_id, monto_usd) de la compra inicial
+                (ver registrar_compras_metodos_pago)
+        """
         cursor = self.conn.cursor()
         if not nombre_ciclo:
             nombre_ciclo = f"Ciclo {datetime.now().strftime('%Y-%m-%d')}"
-        cursor.execute("""
-            INSERT INTO ciclos (usuario_id, nombre_ciclo, fecha_inicio, dias_totales, capital_inicial, tasa_compra_inicial, tipo_capital_inicial, estado)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 'ACTIVO')
-        """, (usuario_id, nombre_ciclo, datetime.now().date(), dias_totales, capital_inicial, tasa_compra_inicial, tipo_capital))
-        self.conn.commit()
-        return cursor.lastrowid
+        with self.transaccion():
+            if unico_activo and self.obtener_ciclo_activo(usuario_id=usuario_id):
+                raise ConflictoConcurrencia(f"El usuario {usuario_id} ya tiene un ciclo activo")
+            cursor.execute("""
+                INSERT INTO ciclos (usuario_id, nombre_ciclo, fecha_inicio, dias_totales, capital_inicial, tasa_compra_inicial, tipo_capital_inicial, estado)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'ACTIVO')
+            """, (usuario_id, nombre_ciclo, datetime.now().date(), dias_totales, capital_inicial, tasa_compra_inicial, tipo_capital))
+            ciclo_id = cursor.lastrowid
+            self.registrar_asientos(usuario_id, contabilidad.asientos_inicio_ciclo({
+                'id': ciclo_id, 'capital_inicial': capital_inicial,
+                'tipo_capital_inicial': tipo_capital, 'fecha_inicio': datetime.now().date()
+            }))
+            self.registrar_compras_metodos_pago(usuario_id, datetime.now().date(), compras, ciclo_id=ciclo_id)
+        return ciclo_id
     
     def obtener_ciclo_activo(self, usuario_id=None):
         cursor = self.conn.cursor()
@@ -354,6 +867,51 @@ class ArbitrajeDB:
         row = cursor.fetchone()
         return dict(row) if row else None
     
+    def _reclamar_ciclo(self, ciclo_id, version=None):
+        """
+        Incrementa la version del ciclo activo dentro de la transaccion en
+        curso. Si se pasa `version` (la leida por el llamador) y el ciclo ya
+        no la tiene, u otro operador lo finalizo, lanza ConflictoConcurrencia.
+        """
+        cursor = self.conn.cursor()
+        if version is None:
+            cursor.execute("UPDATE ciclos SET version = version + 1 WHERE id = ?", (ciclo_id,))
+            return
+        cursor.execute("""
+            UPDATE ciclos SET version = version + 1
+            WHERE id = ? AND version = ? AND estado = 'ACTIVO'
+        """, (ciclo_id, version))
+        if cursor.rowcount == 0:
+            raise ConflictoConcurrencia(
+                f"El ciclo {ciclo_id} fue modificado por otro operador (version {version})"
+            )
+    
+    def actualizar_dia(self, dia_id, version, cambios):
+        """
+        Actualiza notas, tipo_operacion o metodo_pago_id de un dia si sigue
+        en la `version` leida; si no, lanza ConflictoConcurrencia.
+        
+        Returns:
+            nueva version del dia
+        """
+        permitidos = ['notas', 'tipo_operacion', 'metodo_pago_id']
+        campos = [campo for campo in permitidos if campo in cambios]
+        if not campos:
+            return version
+        cursor = self.conn.cursor()
+        with self.transaccion():
+            cursor.execute(f"""
+                UPDATE dias SET {', '.join(f'{campo} = ?' for campo in campos)}, version = version + 1
+                WHERE id = ? AND version = ?
+            """, [cambios[campo] for campo in campos] + [dia_id, version])
+            if cursor.rowcount == 0:
+                raise ConflictoConcurrencia(
+                    f"El dia {dia_id} fue modificado por otro operador (version {version})"
+                )
+            cursor.execute("SELECT ciclo_id FROM dias WHERE id = ?", (dia_id,))
+            self._reclamar_ciclo(cursor.fetchone()[0])
+        return version + 1
+    
     def obtener_ultimo_dia(self, ciclo_id):
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -366,14 +924,16 @@ class ArbitrajeDB:
     
     # MTODO registrar_dia CORREGIDO PARA INCLUIR tasa_costo_final
     def registrar_dia(self, ciclo_id, usuario_id, dia_data):
+        dia_data = _cuantizar_columnas(dia_data, COLUMNAS_MONETARIAS_DIA)
         cursor = self.conn.cursor()
         cursor.execute("""
             INSERT INTO dias (
                 ciclo_id, usuario_id, dia_numero, fecha, capital_disponible_inicio,
                 capital_operado, capital_no_operado, capital_fresco_inyectado,
                 saldo_boveda_final, ganancia_bruta_dia, ganancia_retenida,
-                ganancia_retirada, roi_dia, tipo_operacion, tasa_costo_final
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ganancia_retirada, roi_dia, tipo_operacion, tasa_costo_final,
+                metodo_pago_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             ciclo_id, usuario_id, dia_data['dia_numero'], dia_data['fecha'],
             dia_data['capital_disponible_inicio'], dia_data['capital_operado'],
@@ -381,24 +941,55 @@ class ArbitrajeDB:
             dia_data['saldo_boveda_final'], dia_data['ganancia_bruta_dia'],
             dia_data['ganancia_retenida'], dia_data['ganancia_retirada'],
             dia_data['roi_dia'], dia_data['tipo_operacion'],
-            dia_data['tasa_costo_final'] 
+            dia_data['tasa_costo_final'], dia_data.get('metodo_pago_id')
         ))
         
         dia_id = cursor.lastrowid
         
-        # Actualizar contador de das completados
-        cursor.execute("""
-            UPDATE ciclos 
-            SET dias_completados = (
-                SELECT COUNT(*) FROM dias WHERE ciclo_id = ?
-            )
-            WHERE id = ?
-        """, (ciclo_id, ciclo_id))
+        # dias_completados y ciclo_stats los actualizan los triggers
+        self._commit()
+        return dia_id
+    
+    def registrar_dia_completo(self, ciclo_id, usuario_id, dia_data, ventas,
+                               tasa_venta_p2p, tasa_compra, comision_porcentaje, logs=(), version_ciclo=None,
+                               compras=()):
+        """
+        Registra el dia, todas sus ventas (executemany), sus asientos contables,
+        el reparto de su compra entre metodos de pago y las entradas de log en
+        una sola transaccion: o queda todo o nada.
+        
+        Args:
+            ventas: Iterable de VentaDetalle (ver registrar_ventas)
+            logs: Iterable de tuplas (nivel, modulo, funcion, mensaje)
+            compras: Tuplas (metodo_pago_id, monto_usd) del capital fresco del dia
+            version_ciclo: version del ciclo sobre la que se calculo el dia;
+                si otro operador registro o cerro algo en el ciclo desde
+                entonces, se lanza ConflictoConcurrencia y no se escribe nada
         
-        self.conn.commit()
+        Returns:
+            id del dia registrado
+        """
+        with self.transaccion():
+            self._reclamar_ciclo(ciclo_id, version_ciclo)
+            dia_id = self.registrar_dia(ciclo_id, usuario_id, dia_data)
+            self.registrar_ventas(dia_id, ventas, tasa_venta_p2p, tasa_compra, comision_porcentaje)
+            self.registrar_asientos(usuario_id, contabilidad.asientos_dia(
+                dict(dia_data, id=dia_id, ciclo_id=ciclo_id), self.obtener_ventas_dia(dia_id)
+            ))
+            self.registrar_compras_metodos_pago(usuario_id, dia_data['fecha'], compras,
+                                                ciclo_id=ciclo_id, dia_id=dia_id)
+            self.registrar_logs(
+                (nivel, modulo, funcion, mensaje, usuario_id)
+                for nivel, modulo, funcion, mensaje in chain(
+                    (('INFO', 'database', 'registrar_dia_completo',
+                      f"Ciclo {ciclo_id} dia {dia_data['dia_numero']} registrado"),),
+                    logs
+                )
+            )
         return dia_id
     
     def registrar_venta(self, dia_id, venta_data):
+        venta_data = _cuantizar_columnas(venta_data, COLUMNAS_MONETARIAS_VENTA)
         cursor = self.conn.cursor()
         cursor.execute("""
             INSERT INTO ventas (
@@ -413,62 +1004,1050 @@ class ArbitrajeDB:
             venta_data['comision_porcentaje'], venta_data['ingreso_bruto'],
             venta_data['ingreso_neto'], venta_data['ganancia_venta']
         ))
-        self.conn.commit()
+        self._commit()
+    
+    def registrar_ventas(self, dia_id, ventas, tasa_venta_p2p, tasa_compra, comision_porcentaje):
+        """
+        Registra todas las ventas de un dia con un solo executemany.
+        `ventas` puede ser cualquier iterable de VentaDetalle (por ejemplo el
+        generador arbitraje_core.iterar_ventas); se consume sin crear listas.
+        """
+        tasa_venta_p2p = cuantizar(tasa_venta_p2p)
+        tasa_compra = cuantizar(tasa_compra)
+        comision_porcentaje = cuantizar(comision_porcentaje)
+        
+        cursor = self.conn.cursor()
+        cursor.executemany("""
+            INSERT INTO ventas (
+                dia_id, venta_numero, monto_operado, usdt_operado,
+                tasa_venta_p2p, tasa_compra, comision_monto, comision_porcentaje,
+                ingreso_bruto, ingreso_neto, ganancia_venta
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            (dia_id, v.venta_numero, v.monto_operado, v.usdt_operado,
+             tasa_venta_p2p, tasa_compra, v.comision_monto, comision_porcentaje,
+             v.ingreso_bruto, v.ingreso_neto, v.ganancia_venta)
+            for v in ventas
+        ))
+        self._commit()
+    
+    def obtener_ventas_micro(self, ciclo_id=None):
+        """
+        Retorna las ventas (todas o las de un ciclo) como arrays int64 en
+        micro-unidades, una entrada por columna, para recalculos en bloque.
+        Los valores se guardan cuantizados, por lo que la conversion es exacta.
+        """
+        columnas = ', '.join(f'v.{c}' for c in COLUMNAS_MONETARIAS_VENTA)
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        if ciclo_id is None:
+            # Con archivos adjuntos: una rama por base, mezcladas por id
+            cursor.execute(" UNION ALL ".join(
+                f"SELECT v.id, {columnas} FROM {_prefijo(esquema)}ventas v" for esquema in self._esquemas()
+            ) + (" ORDER BY 1" if self._archivos else " ORDER BY v.id"))
+        else:
+            prefijo = _prefijo(self._esquema_ciclo(ciclo_id))
+            cursor.execute(f"""
+                SELECT v.id, {columnas}
+                FROM {prefijo}ventas v
+                JOIN {prefijo}dias d ON v.dia_id = d.id
+                WHERE d.ciclo_id = ?
+                ORDER BY d.dia_numero, d.id, v.venta_numero
+            """, (ciclo_id,))
+        
+        # fromiter sobre el cursor evita materializar la lista de tuplas
+        filas = np.fromiter(chain.from_iterable(cursor), dtype=np.float64).reshape(
+            -1, len(COLUMNAS_MONETARIAS_VENTA) + 1
+        )
+        resultado = {'id': filas[:, 0].astype(np.int64)}
+        for i, columna in enumerate(COLUMNAS_MONETARIAS_VENTA, 1):
+            resultado[columna] = a_micro_np(filas[:, i])
+        return resultado
     
     def obtener_ventas_dia(self, dia_id):
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM ventas WHERE dia_id = ? ORDER BY venta_numero", (dia_id,))
         return [dict(row) for row in cursor.fetchall()]
     
+    def pagina_historial_ventas(self, ciclo_id=None, usuario_id=None, desde=None, hasta=None,
+                                recientes_primero=True, despues_de=None, antes_de=None, tamano=20):
+        """
+        Una pagina del historial de ventas con paginacion por clave (keyset):
+        cada pagina arranca donde termino la anterior usando el indice, sin
+        OFFSET, asi que cuesta lo mismo en la pagina 1 que en la 5000.
+        
+        Orden: con ciclo_id por (dia_numero, dia, venta_numero, venta); sin
+        ciclo (filtrando por usuario o fechas) por (fecha, dia, venta_numero, venta).
+        Se necesita al menos un filtro (ciclo, usuario o rango de fechas).
+        
+        Args:
+            desde, hasta: Rango de fechas inclusive (date o 'YYYY-MM-DD')
+            recientes_primero: Orden de presentacion
+            despues_de: Clave 'ultima' de la pagina actual -> pagina siguiente
+            antes_de: Clave 'primera' de la pagina actual -> pagina anterior
+        
+        Returns:
+            dict con 'filas' (sqlite3.Row con v.*, dia_numero y fecha, en orden
+            de presentacion), claves 'primera' y 'ultima', 'hay_siguiente' y 'hay_anterior'
+        """
+        if despues_de is not None and antes_de is not None:
+            raise ValueError("Use despues_de o antes_de, no ambos.")
+        
+        filtros, parametros = _filtros_historial(ciclo_id, usuario_id, desde, hasta)
+        columnas_clave = _columnas_clave_historial(ciclo_id)
+        
+        hacia_atras = antes_de is not None
+        ascendente = recientes_primero == hacia_atras
+        clave = antes_de if hacia_atras else despues_de
+        if clave is not None:
+            filtros.append(f"({', '.join(columnas_clave)}) {'>' if ascendente else '<'} (?, ?, ?, ?)")
+            parametros.extend(clave)
+        
+        sentido = 'ASC' if ascendente else 'DESC'
+        # Un ciclo vive entero en una sola base; sin ciclo se recorren todas
+        esquemas = [self._esquema_ciclo(ciclo_id)] if ciclo_id is not None else self._esquemas()
+        
+        def consulta(esquema, columnas_venta):
+            prefijo = _prefijo(esquema)
+            return f"""
+                SELECT {columnas_venta}, d.dia_numero, d.fecha
+                FROM {prefijo}ventas v
+                JOIN {prefijo}dias d ON v.dia_id = d.id
+                WHERE {' AND '.join(filtros)}
+                ORDER BY {', '.join(f'{c} {sentido}' for c in columnas_clave)}
+                LIMIT ?
+            """
+        
+        cursor = self.conn.cursor()
+        if len(esquemas) == 1:
+            cursor.execute(consulta(esquemas[0], 'v.*'), parametros + [tamano + 1])
+        else:
+            # Cada rama trae sus primeras tamano + 1 filas por el indice y se mezclan
+            columnas = self._columnas('main', 'ventas')
+            ramas = []
+            for esquema in esquemas:
+                existentes = set(self._columnas(esquema, 'ventas'))
+                ramas.append('SELECT * FROM (' + consulta(esquema, ', '.join(
+                    f'v.{c}' if c in existentes else f'NULL AS {c}' for c in columnas
+                )) + ')')
+            orden = [c.split('.')[1] for c in columnas_clave]
+            orden[1] = 'dia_id'
+            cursor.execute(
+                ' UNION ALL '.join(ramas)
+                + f" ORDER BY {', '.join(f'{c} {sentido}' for c in orden)} LIMIT ?",
+                (parametros + [tamano + 1]) * len(ramas) + [tamano + 1]
+            )
+        filas = cursor.fetchmany(tamano + 1)
+        
+        hay_mas = len(filas) > tamano
+        filas = filas[:tamano]
+        if hacia_atras:
+            filas.reverse()
+        
+        return {
+            'filas': filas,
+            'primera': _clave_historial(filas[0], ciclo_id) if filas else None,
+            'ultima': _clave_historial(filas[-1], ciclo_id) if filas else None,
+            'hay_siguiente': hay_mas if not hacia_atras else True,
+            'hay_anterior': hay_mas if hacia_atras else despues_de is not None
+        }
+    
+    def iterar_historial_ventas(self, ciclo_id=None, usuario_id=None, desde=None, hasta=None,
+                                recientes_primero=False, tamano_pagina=500):
+        """
+        Recorre todo el historial de ventas pagina por pagina (mismos filtros
+        y orden que pagina_historial_ventas), sin cargarlo completo en memoria.
+        """
+        clave = None
+        while True:
+            pagina = self.pagina_historial_ventas(
+                ciclo_id, usuario_id, desde, hasta, recientes_primero,
+                despues_de=clave, tamano=tamano_pagina
+            )
+            yield from pagina['filas']
+            if not pagina['hay_siguiente']:
+                return
+            clave = pagina['ultima']
+    
+    # METODOS DE PAGO
+    def registrar_metodo_pago(self, usuario_id, metodo_data):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO metodos_pago (
+                usuario_id, tipo, nombre_tarjeta, ultimos_4_digitos, banco,
+                costo_fijo_usdt, comision_porcentaje, limite_diario, limite_mensual, activo
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        """, (
+            usuario_id, metodo_data.get('tipo', 'TARJETA'), metodo_data.get('nombre_tarjeta'),
+            metodo_data.get('ultimos_4_digitos'), metodo_data.get('banco'),
+            cuantizar(metodo_data['costo_fijo_usdt']), cuantizar(metodo_data.get('comision_porcentaje', 0)),
+            cuantizar(metodo_data.get('limite_diario')), cuantizar(metodo_data.get('limite_mensual'))
+        ))
+        self._commit()
+        return cursor.lastrowid
+    
+    def actualizar_metodo_pago(self, metodo_id, cambios):
+        """Actualiza columnas de un metodo de pago (costos, limites, activo, datos de tarjeta)"""
+        permitidas = ('tipo', 'nombre_tarjeta', 'ultimos_4_digitos', 'banco', 'costo_fijo_usdt',
+                      'comision_porcentaje', 'limite_diario', 'limite_mensual', 'activo')
+        columnas = [c for c in cambios if c in permitidas]
+        if not columnas:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"UPDATE metodos_pago SET {', '.join(f'{c} = ?' for c in columnas)} WHERE id = ?",
+            [cambios[c] for c in columnas] + [metodo_id]
+        )
+        self._commit()
+    
+    def obtener_metodos_pago(self, usuario_id, solo_activos=True):
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT * FROM metodos_pago
+            WHERE usuario_id = ? {'AND activo = 1' if solo_activos else ''}
+            ORDER BY id
+        """, (usuario_id,))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def registrar_compras_metodos_pago(self, usuario_id, fecha, compras, ciclo_id=None, dia_id=None):
+        """
+        Guarda lo cargado a cada metodo de pago en una compra con capital
+        fresco. `compras` son tuplas (metodo_pago_id, monto_usd).
+        """
+        cursor = self.conn.cursor()
+        cursor.executemany("""
+            INSERT INTO compras_metodos_pago (usuario_id, ciclo_id, dia_id, metodo_pago_id, fecha, monto_usd)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((usuario_id, ciclo_id, dia_id, metodo_id, fecha, cuantizar(monto))
+              for metodo_id, monto in compras))
+        self._commit()
+    
+    def consumo_metodos_pago(self, usuario_id, fecha):
+        """
+        Capital fresco cargado a cada metodo de pago en el dia `fecha` y en
+        su mes. Retorna {metodo_pago_id: (usado_dia, usado_mes)}.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT metodo_pago_id,
+                   COALESCE(SUM(CASE WHEN fecha = ? THEN monto_usd END), 0) as usado_dia,
+                   COALESCE(SUM(monto_usd), 0) as usado_mes
+            FROM compras_metodos_pago
+            WHERE usuario_id = ? AND fecha >= ? AND fecha <= ?
+            GROUP BY metodo_pago_id
+        """, (fecha.isoformat(), usuario_id, fecha.replace(day=1).isoformat(), fecha.isoformat()))
+        return {row['metodo_pago_id']: (row['usado_dia'], row['usado_mes']) for row in cursor.fetchall()}
+    
+    def ultima_tasa_venta(self, usuario_id):
+        """Tasa P2P publicada en el ultimo dia con ventas del usuario (None si no hay)."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT v.tasa_venta_p2p FROM dias d
+            JOIN ventas v ON v.dia_id = d.id
+            WHERE d.usuario_id = ?
+            ORDER BY d.fecha DESC, d.id DESC LIMIT 1
+        """, (usuario_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
     def log_sistema(self, nivel, modulo, funcion, mensaje, usuario_id=None):
+        # Con registro.instalar() el log se encola y lo escribe el hilo de
+        # fondo, pero solo si escribe en esta misma base y no hay una
+        # transaccion abierta (el log tiene que seguir su commit o rollback)
+        escritor = registro.escritor_activo()
+        if (escritor is not None and not self.conn.in_transaction
+                and os.path.abspath(escritor.db_path) == os.path.abspath(self.db_path)):
+            escritor.log(nivel, modulo, funcion, mensaje, usuario_id)
+            return
         cursor = self.conn.cursor()
         cursor.execute("""
             INSERT INTO logs_sistema (nivel, modulo, funcion, mensaje, usuario_id)
             VALUES (?, ?, ?, ?, ?)
         """, (nivel, modulo, funcion, mensaje, usuario_id))
-        self.conn.commit()
+        self._commit()
     
-    def cerrar(self):
-        self.conn.close()
-
-    def get_estadisticas_ciclo(self, ciclo_id):
-        """Obtiene estadisticas del ciclo"""
+    def registrar_logs(self, entradas):
+        """Registra varias entradas (nivel, modulo, funcion, mensaje, usuario_id) con un executemany."""
         cursor = self.conn.cursor()
+        cursor.executemany("""
+            INSERT INTO logs_sistema (nivel, modulo, funcion, mensaje, usuario_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, entradas)
+        self._commit()
+    
+    def registrar_errores(self, entradas):
+        """Registra varios errores (tipo_error, mensaje_error, stack_trace, contexto, usuario_id)."""
+        cursor = self.conn.cursor()
+        cursor.executemany("""
+            INSERT INTO errores (tipo_error, mensaje_error, stack_trace, contexto, usuario_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, entradas)
+        self._commit()
+    
+    # ARCHIVO (ciclos finalizados en bases anuales)
+    def adjuntar_archivos(self, directorio=None):
+        """
+        Adjunta en solo lectura los archivos anuales de archivador.py (por
+        defecto los del directorio 'archivo' junto a la base). Desde
+        entonces el historial de ventas, obtener_ventas_micro y las
+        estadisticas de ciclo incluyen los ciclos archivados. No puede
+        llamarse dentro de una transaccion.
         
-        # Estadisticas de dias
+        Returns:
+            Lista de esquemas adjuntos (archivo_2024, ...)
+        """
+        self._archivos = adjuntar_archivos(self.conn, directorio or self.directorio_archivo, self._archivos)
+        return list(self._archivos)
+    
+    def separar_archivos(self):
+        for esquema in self._archivos:
+            self.conn.execute(f"DETACH DATABASE {esquema}")
+        self._archivos = []
+    
+    def _esquemas(self):
+        return ['main'] + self._archivos
+    
+    def _esquema_ciclo(self, ciclo_id):
+        """Base (main o archivo adjunto) que contiene el ciclo."""
+        return esquema_ciclo(self.conn, self._archivos, ciclo_id)
+    
+    def _columnas(self, esquema, tabla):
+        return [fila[1] for fila in self.conn.execute(f"PRAGMA {esquema}.table_info({tabla})")]
+    
+    # CONTABILIDAD
+    def registrar_asientos(self, usuario_id, asientos):
+        """
+        Registra asientos de contabilidad.py: una fila por linea, con el saldo
+        acumulado de su cuenta. Cada INTERVALO_CHECKPOINT lineas de una cuenta
+        se guarda un checkpoint del saldo en saldos_contables.
+        """
+        with self.transaccion():
+            self._postear_asientos(usuario_id, asientos, {})
+    
+    def _postear_asientos(self, usuario_id, asientos, estado):
+        # estado: {cuenta: [saldo en micro-unidades, lineas desde el ultimo checkpoint]}
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT MAX(asiento_id) FROM movimientos_contables")
+        asiento_id = cursor.fetchone()[0] or 0
+        
+        for asiento in asientos:
+            asiento_id += 1
+            for cuenta, importe in asiento['lineas']:
+                if cuenta not in estado:
+                    estado[cuenta] = self._estado_cuenta(usuario_id, cuenta)
+                saldo = estado[cuenta][0] + importe
+                cursor.execute("""
+                    INSERT INTO movimientos_contables (
+                        asiento_id, ciclo_id, dia_id, venta_id, usuario_id, cuenta,
+                        tipo_movimiento, concepto, debe, haber, saldo_acumulado, fecha, referencia
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    asiento_id, asiento['ciclo_id'], asiento['dia_id'], asiento['venta_id'],
+                    usuario_id, cuenta, asiento['tipo'], asiento['concepto'],
+                    desde_micro(max(importe, 0)), desde_micro(max(-importe, 0)),
+                    desde_micro(saldo), asiento['fecha'], asiento['referencia']
+                ))
+                estado[cuenta] = [saldo, estado[cuenta][1] + 1]
+                
+                if estado[cuenta][1] >= contabilidad.INTERVALO_CHECKPOINT:
+                    cursor.execute("""
+                        INSERT INTO saldos_contables (usuario_id, cuenta, movimiento_id, fecha, saldo)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (usuario_id, cuenta, cursor.lastrowid, asiento['fecha'], desde_micro(saldo)))
+                    estado[cuenta][1] = 0
+    
+    def _estado_cuenta(self, usuario_id, cuenta):
+        """[saldo actual en micro-unidades, lineas desde el ultimo checkpoint]"""
+        cursor = self.conn.cursor()
         cursor.execute("""
-            SELECT 
-                COUNT(*) as total_dias,
-                COALESCE(SUM(ganancia_bruta_dia), 0) as ganancia_total,
-                COALESCE(AVG(ganancia_bruta_dia), 0) as ganancia_promedio,
-                COALESCE(SUM(capital_fresco_inyectado), 0) as total_inyectado
-            FROM dias
-            WHERE ciclo_id = ?
-        """, (ciclo_id,))
-        stats_dias = dict(cursor.fetchone())
+            SELECT saldo_acumulado FROM movimientos_contables
+            WHERE usuario_id = ? AND cuenta = ? ORDER BY id DESC LIMIT 1
+        """, (usuario_id, cuenta))
+        fila = cursor.fetchone()
+        if fila is None:
+            return [0, 0]
         
-        # Estadisticas de ventas
         cursor.execute("""
-            SELECT 
-                COUNT(*) as total_ventas,
-                COALESCE(SUM(usdt_operado), 0) as total_usdt,
-                COALESCE(SUM(comision_monto), 0) as total_comisiones
-            FROM ventas v
-            JOIN dias d ON v.dia_id = d.id
-            WHERE d.ciclo_id = ?
-        """, (ciclo_id,))
-        stats_ventas = dict(cursor.fetchone())
+            SELECT movimiento_id FROM saldos_contables
+            WHERE usuario_id = ? AND cuenta = ? ORDER BY fecha DESC, movimiento_id DESC LIMIT 1
+        """, (usuario_id, cuenta))
+        checkpoint = cursor.fetchone()
+        cursor.execute("""
+            SELECT COUNT(*) FROM movimientos_contables
+            WHERE usuario_id = ? AND cuenta = ? AND id > ?
+        """, (usuario_id, cuenta, checkpoint[0] if checkpoint else 0))
+        return [a_micro(fila[0]), cursor.fetchone()[0]]
+    
+    def saldo_cuenta(self, usuario_id, cuenta, fecha=None):
+        """
+        Saldo (DEBE - HABER) de una cuenta, actual o al cierre de `fecha`.
+        Con fecha: el checkpoint anterior mas las lineas hasta el siguiente
+        checkpoint (a lo sumo INTERVALO_CHECKPOINT filas). Supone que los
+        asientos se registran en orden cronologico.
+        """
+        cursor = self.conn.cursor()
+        if fecha is None:
+            cursor.execute("""
+                SELECT saldo_acumulado FROM movimientos_contables
+                WHERE usuario_id = ? AND cuenta = ? ORDER BY id DESC LIMIT 1
+            """, (usuario_id, cuenta))
+            fila = cursor.fetchone()
+            return fila[0] if fila else 0.0
         
-        return {**stats_dias, **stats_ventas}
-
-    def finalizar_ciclo(self, ciclo_id, capital_final, ganancia_total, roi_total):
-        """Finaliza un ciclo"""
+        fecha = str(fecha)
+        cursor.execute("""
+            SELECT movimiento_id, saldo FROM saldos_contables
+            WHERE usuario_id = ? AND cuenta = ? AND fecha <= ?
+            ORDER BY fecha DESC, movimiento_id DESC LIMIT 1
+        """, (usuario_id, cuenta, fecha))
+        desde_id, saldo = cursor.fetchone() or (0, 0.0)
+        cursor.execute("""
+            SELECT movimiento_id FROM saldos_contables
+            WHERE usuario_id = ? AND cuenta = ? AND fecha > ?
+            ORDER BY fecha, movimiento_id LIMIT 1
+        """, (usuario_id, cuenta, fecha))
+        siguiente = cursor.fetchone()
+        
+        cursor.execute("""
+            SELECT COALESCE(SUM(debe), 0) - COALESCE(SUM(haber), 0) FROM movimientos_contables
+            WHERE usuario_id = ? AND cuenta = ? AND id > ? AND id <= ? AND fecha <= ?
+        """, (usuario_id, cuenta, desde_id, siguiente[0] if siguiente else 2 ** 63 - 1, fecha))
+        return cuantizar(saldo + cursor.fetchone()[0])
+    
+    def balance_comprobacion(self, usuario_id, fecha=None):
+        """Saldo de todas las cuentas; la suma es cero si el libro cuadra."""
+        return {cuenta: self.saldo_cuenta(usuario_id, cuenta, fecha) for cuenta in contabilidad.CUENTAS}
+    
+    def reconstruir_libro_contable(self, directorio=None):
+        """
+        Vuelve a generar todos los asientos desde ciclos, dias y ventas,
+        incluidos los ciclos archivados (el libro sigue en la base operativa
+        aunque sus ciclos se hayan movido a data/archivo). Los saldos se
+        llevan en memoria, sin consultar el libro por linea.
+        
+        Fuera de una transaccion adjunta los archivos; dentro de una no se
+        puede, asi que se niega a borrar el libro si hay archivos sin adjuntar.
+        
+        Returns:
+            Cantidad de lineas registradas
+        """
+        directorio = directorio or self.directorio_archivo
+        if not self.conn.in_transaction:
+            self.adjuntar_archivos(directorio)
+        pendientes = [esquema for esquema, _ in archivos_anuales(directorio) if esquema not in self._archivos]
+        if pendientes:
+            raise RuntimeError(
+                f"No se puede reconstruir el libro dentro de una transaccion sin adjuntar {', '.join(pendientes)}"
+            )
+        
+        with self.transaccion():
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM saldos_contables")
+            cursor.execute("DELETE FROM movimientos_contables")
+            
+            # Los ids de ciclo son unicos entre la base operativa y los archivos
+            ciclos = sorted(
+                (dict(row, esquema=esquema)
+                 for esquema in self._esquemas()
+                 for row in cursor.execute(f"SELECT * FROM {_prefijo(esquema)}ciclos").fetchall()),
+                key=lambda c: c['id']
+            )
+            
+            estados = {}
+            for ciclo in ciclos:
+                usuario_id = ciclo['usuario_id']
+                prefijo = _prefijo(ciclo['esquema'])
+                estado = estados.setdefault(usuario_id, {})
+                self._postear_asientos(usuario_id, contabilidad.asientos_inicio_ciclo(ciclo), estado)
+                
+                cursor.execute(f"SELECT * FROM {prefijo}dias WHERE ciclo_id = ? ORDER BY dia_numero, id", (ciclo['id'],))
+                for dia in [dict(row) for row in cursor.fetchall()]:
+                    ventas = [dict(row) for row in self.conn.execute(
+                        f"SELECT * FROM {prefijo}ventas WHERE dia_id = ? ORDER BY venta_numero", (dia['id'],)
+                    )]
+                    self._postear_asientos(usuario_id, contabilidad.asientos_dia(dia, ventas), estado)
+                
+                if ciclo['estado'] == 'FINALIZADO':
+                    saldo_boveda = estado.get(contabilidad.CUENTA_BOVEDA, [0, 0])[0]
+                    self._postear_asientos(
+                        usuario_id, contabilidad.asientos_cierre_ciclo(ciclo, saldo_boveda, ciclo['fecha_fin']), estado
+                    )
+            
+            cursor.execute("SELECT COUNT(*) FROM movimientos_contables")
+            return cursor.fetchone()[0]
+    
+    # AUDITORIA
+    def historial_registro(self, tabla, registro_id):
+        """
+        Cambios de una fila en orden: accion, usuario_id, timestamp y los
+        valores anteriores/nuevos (en UPDATE solo las columnas que cambiaron).
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, accion, usuario_id, datos_anteriores, datos_nuevos, timestamp
+            FROM auditoria WHERE tabla_afectada = ? AND registro_id = ? ORDER BY id
+        """, (tabla, registro_id))
+        return [
+            dict(row, datos_anteriores=json.loads(row['datos_anteriores'] or '{}'),
+                 datos_nuevos=json.loads(row['datos_nuevos'] or '{}'))
+            for row in cursor.fetchall()
+        ]
+    
+    def estado_registro(self, tabla, registro_id, hasta=None):
+        """
+        Reconstruye una fila aplicando su historial de auditoria, hasta el
+        instante `hasta` (incluido) o completo. None si no existia todavia
+        o ya estaba borrada.
+        
+        Args:
+            hasta: datetime (sin zona = hora local), date (hasta el final de
+                ese dia local) o el mismo valor en texto ISO
+        """
+        limite = None if hasta is None else _limite_utc(hasta)
+        estado = None
+        for cambio in self.historial_registro(tabla, registro_id):
+            if limite is not None and cambio['timestamp'] > limite:
+                break
+            if cambio['accion'] == 'INSERT':
+                estado = dict(cambio['datos_nuevos'])
+            elif cambio['accion'] == 'UPDATE':
+                estado = {**(estado or {}), **cambio['datos_nuevos']}
+            else:
+                estado = None
+        return estado
+    
+    # CONCILIACION
+    def obtener_ventas_conciliacion(self, usuario_id, desde, hasta):
+        """
+        Ventas del usuario entre dos fechas (inclusive) con su orden P2P, ciclo
+        y fecha, incluidas las de los archivos adjuntos.
+        """
+        esquemas = self._esquemas()
+        cursor = self.conn.cursor()
+        cursor.execute(" UNION ALL ".join(f"""
+            SELECT v.id, v.orden_p2p_id, v.ingreso_bruto, d.ciclo_id, d.fecha
+            FROM {_prefijo(esquema)}dias d
+            JOIN {_prefijo(esquema)}ventas v ON v.dia_id = d.id
+            WHERE d.usuario_id = ? AND d.fecha BETWEEN ? AND ?
+        """ for esquema in esquemas), (usuario_id, str(desde), str(hasta)) * len(esquemas))
+        return cursor.fetchall()
+    
+    def obtener_compras_conciliacion(self, usuario_id, desde, hasta):
+        """
+        Compras de USDT con capital fresco entre dos fechas: la inicial de los
+        ciclos USD_FRESCO y las inyecciones de cada dia, incluidas las de los
+        archivos adjuntos.
+        
+        Returns:
+            Filas (origen 'CICLO' o 'DIA', id, ciclo_id, fecha, monto)
+        """
+        esquemas = self._esquemas()
+        cursor = self.conn.cursor()
+        cursor.execute(" UNION ALL ".join(f"""
+            SELECT 'CICLO' AS origen, id, id AS ciclo_id, fecha_inicio AS fecha, capital_inicial AS monto
+            FROM {_prefijo(esquema)}ciclos
+            WHERE usuario_id = ? AND tipo_capital_inicial = 'USD_FRESCO' AND fecha_inicio BETWEEN ? AND ?
+            UNION ALL
+            SELECT 'DIA', id, ciclo_id, fecha, capital_fresco_inyectado
+            FROM {_prefijo(esquema)}dias
+            WHERE usuario_id = ? AND fecha BETWEEN ? AND ? AND capital_fresco_inyectado > 0
+        """ for esquema in esquemas), (usuario_id, str(desde), str(hasta)) * 2 * len(esquemas))
+        return cursor.fetchall()
+    
+    def registrar_conciliacion(self, usuario_id, desde, hasta, conciliaciones, excepciones):
+        """
+        Guarda el resultado de conciliacion.py reemplazando lo importado antes
+        para el mismo periodo (las conciliaciones MANUAL no se tocan), tambien
+        el de ciclos que se archivaron despues: las conciliaciones quedan en
+        la base operativa. Fuera de una transaccion adjunta los archivos.
+        
+        Args:
+            conciliaciones: dicts con ciclo_id, fecha, saldo_sistema,
+                saldo_binance, saldo_banco, diferencia, estado y observaciones
+            excepciones: dicts con fecha, origen, tipo, referencia, monto,
+                diferencia, detalle y ciclo_id (None si no hay movimiento del sistema)
+        
+        Returns:
+            Cantidad de conciliaciones registradas
+        """
+        if not self.conn.in_transaction:
+            self.adjuntar_archivos()
+        esquemas = self._esquemas()
+        cursor = self.conn.cursor()
+        with self.transaccion():
+            cursor.execute("""
+                DELETE FROM excepciones_conciliacion
+                WHERE usuario_id = ? AND fecha BETWEEN ? AND ?
+            """, (usuario_id, str(desde), str(hasta)))
+            cursor.execute(f"""
+                DELETE FROM conciliaciones
+                WHERE origen = 'IMPORTACION' AND fecha_conciliacion BETWEEN ? AND ?
+                  AND ciclo_id IN ({' UNION ALL '.join(
+                      f'SELECT id FROM {_prefijo(esquema)}ciclos WHERE usuario_id = ?' for esquema in esquemas
+                  )})
+            """, (str(desde), str(hasta)) + (usuario_id,) * len(esquemas))
+            
+            ids = {}
+            for c in conciliaciones:
+                cursor.execute("""
+                    INSERT INTO conciliaciones (
+                        ciclo_id, fecha_conciliacion, saldo_sistema, saldo_binance, saldo_banco,
+                        diferencia, estado, observaciones, conciliado_por, origen
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'IMPORTACION')
+                """, (c['ciclo_id'], c['fecha'], c['saldo_sistema'], c['saldo_binance'], c['saldo_banco'],
+                      c['diferencia'], c['estado'], c['observaciones'], usuario_id))
+                ids[(c['ciclo_id'], c['fecha'])] = cursor.lastrowid
+            
+            cursor.executemany("""
+                INSERT INTO excepciones_conciliacion (
+                    usuario_id, conciliacion_id, fecha, origen, tipo, referencia, monto, diferencia, detalle
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (usuario_id, ids.get((e['ciclo_id'], e['fecha'])), e['fecha'], e['origen'], e['tipo'],
+                 e['referencia'], e['monto'], e['diferencia'], e['detalle'])
+                for e in excepciones
+            ])
+        return len(ids)
+    
+    def obtener_excepciones_conciliacion(self, usuario_id, desde, hasta):
         cursor = self.conn.cursor()
         cursor.execute("""
-            UPDATE ciclos 
-            SET fecha_fin = ?, capital_final = ?, ganancia_total = ?, 
-                roi_total = ?, estado = 'FINALIZADO'
-            WHERE id = ?
-        """, (datetime.now().date(), capital_final, ganancia_total, roi_total, ciclo_id))
-        self.conn.commit()
-        self.log_sistema('INFO', 'database', 'finalizar_ciclo', f'Ciclo {ciclo_id} finalizado')
\ No newline at end of file
+            SELECT * FROM excepciones_conciliacion
+            WHERE usuario_id = ? AND fecha BETWEEN ? AND ?
+            ORDER BY fecha, id
+        """, (usuario_id, str(desde), str(hasta)))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    # RESPALDOS
+    def registrar_backup(self, tipo, archivo_path, tamano_bytes, md5_hash, usuario_id=None):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO backups (tipo, archivo_path, tamano_bytes, md5_hash, usuario_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, (tipo, archivo_path, tamano_bytes, md5_hash, usuario_id))
+        self._commit()
+        return cursor.lastrowid
+    
+    def obtener_backups(self, limite=50):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM backups ORDER BY id DESC LIMIT ?", (limite,))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def obtener_backup_por_archivo(self, archivo_path):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM backups WHERE archivo_path = ? ORDER BY id DESC LIMIT 1", (archivo_path,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    def cerrar(self):
+        self.conn.close()
+
+    def get_estadisticas_ciclo(self, ciclo_id):
+        """
+        Obtiene estadisticas del ciclo desde ciclo_stats (una sola fila),
+        junto con el saldo y la tasa de costo del ultimo dia registrado.
+        """
+        prefijo = _prefijo(self._esquema_ciclo(ciclo_id))
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                s.total_dias, s.total_ventas, s.total_usdt, s.total_comisiones,
+                s.ganancia_total, s.total_inyectado,
+                CASE WHEN s.total_dias > 0 THEN s.ganancia_total / s.total_dias ELSE 0 END as ganancia_promedio,
+                d.saldo_boveda_final as ultimo_saldo_boveda,
+                d.tasa_costo_final as ultima_tasa_costo
+            FROM {prefijo}ciclo_stats s
+            LEFT JOIN {prefijo}dias d ON d.id = s.ultimo_dia_id
+            WHERE s.ciclo_id = ?
+        """, (ciclo_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return {
+                'total_dias': 0, 'total_ventas': 0, 'total_usdt': 0.0, 'total_comisiones': 0.0,
+                'ganancia_total': 0.0, 'total_inyectado': 0.0, 'ganancia_promedio': 0.0,
+                'ultimo_saldo_boveda': None, 'ultima_tasa_costo': None
+            }
+        return dict(row)
+
+    def finalizar_ciclo(self, ciclo_id, capital_final, ganancia_total, roi_total, version_ciclo=None):
+        """Finaliza un ciclo (ConflictoConcurrencia si version_ciclo ya no es la vigente)"""
+        with self.transaccion():
+            self._reclamar_ciclo(ciclo_id, version_ciclo)
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                UPDATE ciclos 
+                SET fecha_fin = ?, capital_final = ?, ganancia_total = ?, 
+                    roi_total = ?, estado = 'FINALIZADO'
+                WHERE id = ?
+            """, (datetime.now().date(), cuantizar(capital_final), cuantizar(ganancia_total), roi_total, ciclo_id))
+            
+            # El saldo de la boveda (al costo) sale del ciclo
+            cursor.execute("SELECT id, usuario_id FROM ciclos WHERE id = ?", (ciclo_id,))
+            ciclo = dict(cursor.fetchone())
+            saldo_boveda = a_micro(self.saldo_cuenta(ciclo['usuario_id'], contabilidad.CUENTA_BOVEDA))
+            self.registrar_asientos(ciclo['usuario_id'], contabilidad.asientos_cierre_ciclo(
+                ciclo, saldo_boveda, datetime.now().date()
+            ))
+            self.log_sistema('INFO', 'database', 'finalizar_ciclo', f'Ciclo {ciclo_id} finalizado')
+
+
+def _cuantizar_columnas(datos, columnas):
+    """Copia `datos` con las columnas monetarias redondeadas a micro-unidades."""
+    datos = dict(datos)
+    for columna in columnas:
+        if columna in datos:
+            datos[columna] = cuantizar(datos[columna])
+    return datos
+
+
+class GestorConexiones:
+    """
+    Reparte conexiones a una misma base de datos entre hilos:
+    un unico escritor (ArbitrajeDB compartido, serializado con un lock) y
+    una conexion de solo lectura por hilo lector. Con WAL los lectores ven
+    siempre la ultima transaccion confirmada y no bloquean al escritor.
+
+        gestor = GestorConexiones()
+        with gestor.escritor() as db:
+            db.registrar_dia_completo(...)
+        filas = gestor.lector().execute("SELECT ...").fetchall()
+    """
+
+    def __init__(self, db_path='data/arbitraje.db', pragmas=None):
+        self.db_path = db_path
+        self.pragmas = {**PRAGMAS_DEFAULT, **(pragmas or {})}
+        # El escritor crea el esquema y deja la base en modo WAL antes de abrir lectores
+        self._db = ArbitrajeDB(db_path, pragmas=self.pragmas, check_same_thread=False)
+        self._lock_escritura = threading.RLock()
+        self._local = threading.local()
+        self._lectores = []
+        self._lock_lectores = threading.Lock()
+
+    @contextmanager
+    def escritor(self):
+        """Acceso exclusivo al escritor; el bloque completo es una transaccion."""
+        with self._lock_escritura:
+            with self._db.transaccion():
+                yield self._db
+
+    def lector(self):
+        """Conexion de solo lectura del hilo actual (se crea la primera vez)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            aplicar_pragmas(conn, self.pragmas, solo_lectura=True)
+            self._local.conn = conn
+            with self._lock_lectores:
+                self._lectores.append(conn)
+        return conn
+
+    def cerrar(self):
+        with self._lock_lectores:
+            for conn in self._lectores:
+                conn.close()
+            self._lectores.clear()
+        self._db.cerrar()
+
+
+# Triggers de ciclo_stats (migracion 2). Cada uno ajusta la fila del ciclo
+# con la diferencia de la fila afectada, sin volver a recorrer el historial.
+_TRIGGERS_CICLO_STATS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ciclos_stats_insert AFTER INSERT ON ciclos
+    BEGIN
+        INSERT OR IGNORE INTO ciclo_stats (ciclo_id) VALUES (NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ciclos_stats_delete AFTER DELETE ON ciclos
+    BEGIN
+        DELETE FROM ciclo_stats WHERE ciclo_id = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dias_stats_insert AFTER INSERT ON dias
+    BEGIN
+        INSERT OR IGNORE INTO ciclo_stats (ciclo_id) VALUES (NEW.ciclo_id);
+        UPDATE ciclo_stats SET
+            total_dias = total_dias + 1,
+            ganancia_total = ROUND(ganancia_total + COALESCE(NEW.ganancia_bruta_dia, 0), 6),
+            total_inyectado = ROUND(total_inyectado + COALESCE(NEW.capital_fresco_inyectado, 0), 6),
+            ultimo_dia_id = CASE
+                WHEN ultimo_dia_id IS NULL
+                  OR NEW.dia_numero >= (SELECT dia_numero FROM dias WHERE id = ultimo_dia_id)
+                THEN NEW.id ELSE ultimo_dia_id END
+        WHERE ciclo_id = NEW.ciclo_id;
+        UPDATE ciclos SET dias_completados = dias_completados + 1 WHERE id = NEW.ciclo_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dias_stats_delete AFTER DELETE ON dias
+    BEGIN
+        -- Las ventas que queden del dia dejan de contar (luego ya no encuentran su dia)
+        UPDATE ciclo_stats SET
+            total_dias = total_dias - 1,
+            total_ventas = total_ventas - (SELECT COUNT(*) FROM ventas WHERE dia_id = OLD.id),
+            total_usdt = ROUND(total_usdt - (SELECT COALESCE(SUM(usdt_operado), 0) FROM ventas WHERE dia_id = OLD.id), 6),
+            total_comisiones = ROUND(total_comisiones - (SELECT COALESCE(SUM(comision_monto), 0) FROM ventas WHERE dia_id = OLD.id), 6),
+            ganancia_total = ROUND(ganancia_total - COALESCE(OLD.ganancia_bruta_dia, 0), 6),
+            total_inyectado = ROUND(total_inyectado - COALESCE(OLD.capital_fresco_inyectado, 0), 6),
+            ultimo_dia_id = CASE WHEN ultimo_dia_id = OLD.id THEN (
+                SELECT id FROM dias WHERE ciclo_id = OLD.ciclo_id
+                ORDER BY dia_numero DESC, id DESC LIMIT 1
+            ) ELSE ultimo_dia_id END
+        WHERE ciclo_id = OLD.ciclo_id;
+        UPDATE ciclos SET dias_completados = dias_completados - 1 WHERE id = OLD.ciclo_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_dias_stats_update
+    AFTER UPDATE OF ciclo_id, dia_numero, ganancia_bruta_dia, capital_fresco_inyectado ON dias
+    BEGIN
+        UPDATE ciclo_stats SET
+            total_dias = total_dias - 1,
+            ganancia_total = ROUND(ganancia_total - COALESCE(OLD.ganancia_bruta_dia, 0), 6),
+            total_inyectado = ROUND(total_inyectado - COALESCE(OLD.capital_fresco_inyectado, 0), 6)
+        WHERE ciclo_id = OLD.ciclo_id;
+        INSERT OR IGNORE INTO ciclo_stats (ciclo_id) VALUES (NEW.ciclo_id);
+        UPDATE ciclo_stats SET
+            total_dias = total_dias + 1,
+            ganancia_total = ROUND(ganancia_total + COALESCE(NEW.ganancia_bruta_dia, 0), 6),
+            total_inyectado = ROUND(total_inyectado + COALESCE(NEW.capital_fresco_inyectado, 0), 6)
+        WHERE ciclo_id = NEW.ciclo_id;
+        UPDATE ciclo_stats SET ultimo_dia_id = (
+            SELECT id FROM dias WHERE ciclo_id = ciclo_stats.ciclo_id
+            ORDER BY dia_numero DESC, id DESC LIMIT 1
+        )
+        WHERE ciclo_id IN (OLD.ciclo_id, NEW.ciclo_id);
+        UPDATE ciclos SET dias_completados = dias_completados - 1 WHERE id = OLD.ciclo_id;
+        UPDATE ciclos SET dias_completados = dias_completados + 1 WHERE id = NEW.ciclo_id;
+        -- Si el dia cambia de ciclo, sus ventas se mueven con el
+        UPDATE ciclo_stats SET
+            total_ventas = total_ventas - (SELECT COUNT(*) FROM ventas WHERE dia_id = NEW.id),
+            total_usdt = ROUND(total_usdt - (SELECT COALESCE(SUM(usdt_operado), 0) FROM ventas WHERE dia_id = NEW.id), 6),
+            total_comisiones = ROUND(total_comisiones - (SELECT COALESCE(SUM(comision_monto), 0) FROM ventas WHERE dia_id = NEW.id), 6)
+        WHERE ciclo_id = OLD.ciclo_id AND OLD.ciclo_id IS NOT NEW.ciclo_id;
+        UPDATE ciclo_stats SET
+            total_ventas = total_ventas + (SELECT COUNT(*) FROM ventas WHERE dia_id = NEW.id),
+            total_usdt = ROUND(total_usdt + (SELECT COALESCE(SUM(usdt_operado), 0) FROM ventas WHERE dia_id = NEW.id), 6),
+            total_comisiones = ROUND(total_comisiones + (SELECT COALESCE(SUM(comision_monto), 0) FROM ventas WHERE dia_id = NEW.id), 6)
+        WHERE ciclo_id = NEW.ciclo_id AND OLD.ciclo_id IS NOT NEW.ciclo_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ventas_stats_insert AFTER INSERT ON ventas
+    BEGIN
+        UPDATE ciclo_stats SET
+            total_ventas = total_ventas + 1,
+            total_usdt = ROUND(total_usdt + COALESCE(NEW.usdt_operado, 0), 6),
+            total_comisiones = ROUND(total_comisiones + COALESCE(NEW.comision_monto, 0), 6)
+        WHERE ciclo_id = (SELECT ciclo_id FROM dias WHERE id = NEW.dia_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ventas_stats_delete AFTER DELETE ON ventas
+    BEGIN
+        UPDATE ciclo_stats SET
+            total_ventas = total_ventas - 1,
+            total_usdt = ROUND(total_usdt - COALESCE(OLD.usdt_operado, 0), 6),
+            total_comisiones = ROUND(total_comisiones - COALESCE(OLD.comision_monto, 0), 6)
+        WHERE ciclo_id = (SELECT ciclo_id FROM dias WHERE id = OLD.dia_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ventas_stats_update
+    AFTER UPDATE OF dia_id, usdt_operado, comision_monto ON ventas
+    BEGIN
+        UPDATE ciclo_stats SET
+            total_ventas = total_ventas - 1,
+            total_usdt = ROUND(total_usdt - COALESCE(OLD.usdt_operado, 0), 6),
+            total_comisiones = ROUND(total_comisiones - COALESCE(OLD.comision_monto, 0), 6)
+        WHERE ciclo_id = (SELECT ciclo_id FROM dias WHERE id = OLD.dia_id);
+        UPDATE ciclo_stats SET
+            total_ventas = total_ventas + 1,
+            total_usdt = ROUND(total_usdt + COALESCE(NEW.usdt_operado, 0), 6),
+            total_comisiones = ROUND(total_comisiones + COALESCE(NEW.comision_monto, 0), 6)
+        WHERE ciclo_id = (SELECT ciclo_id FROM dias WHERE id = NEW.dia_id);
+    END
+    """,
+)
+
+
+def _sql_triggers_cambios(tabla):
+    """
+    Sentencias DROP/CREATE de los triggers que anotan en cambios_bloques el
+    bloque de cada fila modificada o borrada (INSERT OR REPLACE: una fila por
+    bloque, con el numero de cambio mas reciente).
+    """
+    anotar = "INSERT OR REPLACE INTO cambios_bloques (tabla, bloque) VALUES ('{tabla}', {fila}.rowid / {n});"
+    return [
+        f"DROP TRIGGER IF EXISTS trg_cambios_{tabla}_update",
+        f"DROP TRIGGER IF EXISTS trg_cambios_{tabla}_delete",
+        f"""
+        CREATE TRIGGER trg_cambios_{tabla}_update AFTER UPDATE ON {tabla}
+        BEGIN
+            {anotar.format(tabla=tabla, fila='OLD', n=FILAS_POR_BLOQUE_CAMBIOS)}
+            INSERT OR REPLACE INTO cambios_bloques (tabla, bloque)
+            SELECT '{tabla}', NEW.rowid / {FILAS_POR_BLOQUE_CAMBIOS}
+            WHERE NEW.rowid / {FILAS_POR_BLOQUE_CAMBIOS} <> OLD.rowid / {FILAS_POR_BLOQUE_CAMBIOS};
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_cambios_{tabla}_delete AFTER DELETE ON {tabla}
+        BEGIN
+            {anotar.format(tabla=tabla, fila='OLD', n=FILAS_POR_BLOQUE_CAMBIOS)}
+        END
+        """
+    ]
+
+
+def _sql_triggers_auditoria(tabla, columnas, excluidas=()):
+    """
+    Sentencias DROP/CREATE de los triggers de auditoria de una tabla. INSERT y
+    DELETE guardan la fila completa con json_object; UPDATE guarda solo las
+    columnas que cambiaron (antes y despues) y no se dispara si no cambio
+    ninguna. Todo ocurre en la misma transaccion que la escritura auditada.
+    """
+    if 'usuario_id' in columnas:
+        usuario = '{fila}.usuario_id'
+    elif tabla == 'ventas':
+        usuario = '(SELECT usuario_id FROM dias WHERE id = {fila}.dia_id)'
+    else:
+        usuario = 'NULL'
+    activa = "(SELECT valor FROM configuracion WHERE clave = 'auditoria_activa') IS NOT '0'"
+    
+    def completa(fila):
+        return 'json_object(' + ', '.join(f"'{c}', {fila}.{c}" for c in columnas) + ')'
+    
+    auditadas = [c for c in columnas if c not in excluidas]
+    
+    def diferencias(fila):
+        return ('(SELECT json_group_object(columna, valor) FROM (' + ' UNION ALL '.join(
+            f"SELECT '{c}' AS columna, {fila}.{c} AS valor, OLD.{c} IS NOT NEW.{c} AS cambio" for c in auditadas
+        ) + ') WHERE cambio)')
+    
+    insertar = """
+        INSERT INTO auditoria (usuario_id, tabla_afectada, registro_id, accion, datos_anteriores, datos_nuevos)
+        VALUES ({usuario}, '{tabla}', {fila}.id, '{accion}', {anteriores}, {nuevos});
+    """
+    return [
+        f"DROP TRIGGER IF EXISTS trg_auditoria_{tabla}_insert",
+        f"DROP TRIGGER IF EXISTS trg_auditoria_{tabla}_update",
+        f"DROP TRIGGER IF EXISTS trg_auditoria_{tabla}_delete",
+        f"""
+        CREATE TRIGGER trg_auditoria_{tabla}_insert AFTER INSERT ON {tabla}
+        WHEN {activa}
+        BEGIN
+        {insertar.format(usuario=usuario.format(fila='NEW'), tabla=tabla, fila='NEW', accion='INSERT',
+                         anteriores='NULL', nuevos=completa('NEW'))}
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_auditoria_{tabla}_update AFTER UPDATE ON {tabla}
+        WHEN ({' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in auditadas)}) AND {activa}
+        BEGIN
+        {insertar.format(usuario=usuario.format(fila='NEW'), tabla=tabla, fila='NEW', accion='UPDATE',
+                         anteriores=diferencias('OLD'), nuevos=diferencias('NEW'))}
+        END
+        """,
+        f"""
+        CREATE TRIGGER trg_auditoria_{tabla}_delete AFTER DELETE ON {tabla}
+        WHEN {activa}
+        BEGIN
+        {insertar.format(usuario=usuario.format(fila='OLD'), tabla=tabla, fila='OLD', accion='DELETE',
+                         anteriores=completa('OLD'), nuevos='NULL')}
+        END
+        """
+    ]
+
+
+def _limite_utc(hasta):
+    """
+    Cota superior '%Y-%m-%d %H:%M:%S' en UTC, comparable con los timestamp
+    CURRENT_TIMESTAMP de SQLite. Una fecha sin hora es el final de ese dia.
+    """
+    if isinstance(hasta, str):
+        hasta = date.fromisoformat(hasta) if len(hasta) == 10 else datetime.fromisoformat(hasta)
+    if not isinstance(hasta, datetime):
+        hasta = datetime.combine(hasta, dt_time.max)
+    return hasta.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def directorio_archivos(db_path):
+    """Directorio de los archivos anuales de una base: 'archivo' junto a ella (data/archivo)."""
+    return os.path.join(os.path.dirname(db_path), 'archivo')
+
+
+def archivos_anuales(directorio=DIRECTORIO_ARCHIVO):
+    """Pares (esquema, ruta) de los archivos arbitraje_AAAA.db del directorio."""
+    if not os.path.isdir(directorio):
+        return []
+    return [
+        (f"archivo_{anio.group(1)}", os.path.join(directorio, nombre))
+        for nombre in sorted(os.listdir(directorio))
+        for anio in [re.fullmatch(r'arbitraje_(\d{4})\.db', nombre)] if anio
+    ]
+
+
+def adjuntar_archivos(conn, directorio=DIRECTORIO_ARCHIVO, adjuntos=()):
+    """
+    ATTACH en solo lectura (mode=ro) de cada data/archivo/arbitraje_AAAA.db
+    como esquema archivo_AAAA. La conexion debe abrirse con uri=True.
+    SQLite admite 10 bases adjuntas por conexion.
+    
+    Returns:
+        Lista de esquemas adjuntos, incluidos los que ya lo estaban
+    """
+    adjuntos = list(adjuntos)
+    for esquema, ruta in archivos_anuales(directorio):
+        if esquema in adjuntos:
+            continue
+        uri = f"file:{os.path.abspath(ruta)}?mode=ro"
+        conn.execute(f"ATTACH DATABASE ? AS {esquema}", (uri,))
+        adjuntos.append(esquema)
+    return adjuntos
+
+
+def esquema_ciclo(conn, archivos, ciclo_id):
+    """Esquema (main o uno de los archivos adjuntos en `conn`) que contiene el ciclo."""
+    for esquema in archivos:
+        if conn.execute(f"SELECT 1 FROM {esquema}.ciclos WHERE id = ?", (ciclo_id,)).fetchone():
+            return esquema
+    return 'main'
+
+
+def _prefijo(esquema):
+    """Prefijo de tabla para un esquema (vacio para la base principal)."""
+    return '' if esquema == 'main' else f'{esquema}.'
+
+
+def _filtros_historial(ciclo_id, usuario_id, desde, hasta):
+    """Condiciones WHERE (y sus parametros) del historial de ventas."""
+    filtros, parametros = [], []
+    if ciclo_id is not None:
+        filtros.append("d.ciclo_id = ?")
+        parametros.append(ciclo_id)
+    if usuario_id is not None:
+        filtros.append("d.usuario_id = ?")
+        parametros.append(usuario_id)
+    if desde is not None:
+        filtros.append("d.fecha >= ?")
+        parametros.append(str(desde))
+    if hasta is not None:
+        filtros.append("d.fecha <= ?")
+        parametros.append(str(hasta))
+    if not filtros:
+        raise ValueError("El historial necesita un filtro: ciclo, usuario o rango de fechas.")
+    return filtros, parametros
+
+
+def _columnas_clave_historial(ciclo_id):
+    """Columnas de la clave de paginacion (en el orden de los indices)."""
+    return ('d.dia_numero' if ciclo_id is not None else 'd.fecha', 'd.id', 'v.venta_numero', 'v.id')
+
+
+def _clave_historial(fila, ciclo_id):
+    return (fila['dia_numero'] if ciclo_id is not None else fila['fecha'],
+            fila['dia_id'], fila['venta_numero'], fila['id'])
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: dinero.py
+# DESCRIPCION: Aritmetica de punto fijo entera (micro-unidades) para USD y USDT
+# ==========================================================
+#
+# Todos los importes (USD, USDT), tasas (USD/USDT) y porcentajes de comision
+# se representan como enteros en micro-unidades: 1.04424 -> 1_044_240.
+# Las operaciones son exactas y solo se redondea en puntos explicitos:
+#
+#   - Cantidad de USDT comprada/vendida: se TRUNCA (nunca se acredita mas
+#     USDT del que el importe alcanza a pagar).
+#   - Comision P2P: se redondea HACIA ARRIBA (nunca se cobra de menos).
+#   - Importes en USD (ingresos, costos, tasas de costo): MITAD HACIA ARRIBA.
+#
+# Las versiones *_np operan sobre arrays int64 de NumPy con las mismas reglas,
+# para recalcular historiales completos en bloque.
+
+import numpy as np
+
+ESCALA = 1_000_000
+
+REDONDEO_ABAJO = 'ABAJO'
+REDONDEO_ARRIBA = 'ARRIBA'
+REDONDEO_MITAD_ARRIBA = 'MITAD_ARRIBA'
+
+
+def a_micro(valor) -> int:
+    """Convierte un float (o texto numerico) a micro-unidades enteras."""
+    return int(round(float(valor) * ESCALA))
+
+
+def desde_micro(micro: int) -> float:
+    """Convierte micro-unidades a float (valor exacto a 6 decimales)."""
+    return micro / ESCALA
+
+
+def cuantizar(valor):
+    """Redondea un float a la malla de micro-unidades. None se conserva."""
+    if valor is None:
+        return None
+    return desde_micro(a_micro(valor))
+
+
+def dividir(numerador: int, denominador: int, modo: str) -> int:
+    """Division entera de micro-unidades con la regla de redondeo indicada."""
+    if denominador <= 0:
+        raise ValueError("El denominador debe ser positivo.")
+    if modo == REDONDEO_ABAJO:
+        return numerador // denominador
+    if modo == REDONDEO_ARRIBA:
+        return -((-numerador) // denominador)
+    if modo == REDONDEO_MITAD_ARRIBA:
+        return (numerador + denominador // 2) // denominador
+    raise ValueError(f"Modo de redondeo desconocido: {modo}")
+
+
+def multiplicar(a: int, b: int, modo: str) -> int:
+    """Producto de dos cantidades en micro-unidades, reescalado a micro-unidades."""
+    return dividir(a * b, ESCALA, modo)
+
+
+def usdt_por_usd(monto_usd: int, tasa: int) -> int:
+    """USDT (truncado) que se obtienen con `monto_usd` a `tasa` USD/USDT."""
+    return dividir(monto_usd * ESCALA, tasa, REDONDEO_ABAJO)
+
+
+def usd_por_usdt(usdt: int, tasa: int) -> int:
+    """Importe USD de `usdt` a `tasa` USD/USDT."""
+    return multiplicar(usdt, tasa, REDONDEO_MITAD_ARRIBA)
+
+
+def tasa_costo(costo_usd: int, usdt: int) -> int:
+    """Tasa de costo USD/USDT de un saldo (mitad hacia arriba)."""
+    return dividir(costo_usd * ESCALA, usdt, REDONDEO_MITAD_ARRIBA)
+
+
+def calcular_venta(monto_usd: int, tasa_venta: int, tasa_compra: int, comision: int) -> tuple:
+    """
+    Resultado exacto de UNA venta en micro-unidades.
+
+    Returns:
+        (usdt_operado, ingreso_bruto, comision_monto, ingreso_neto, ganancia_venta)
+    """
+    usdt = usdt_por_usd(monto_usd, tasa_compra)
+    ingreso_bruto = usd_por_usdt(usdt, tasa_venta)
+    comision_monto = multiplicar(ingreso_bruto, comision, REDONDEO_ARRIBA)
+    ingreso_neto = ingreso_bruto - comision_monto
+    return usdt, ingreso_bruto, comision_monto, ingreso_neto, ingreso_neto - monto_usd
+
+
+# ========== VERSIONES VECTORIZADAS (int64) ==========
+
+def a_micro_np(valores) -> np.ndarray:
+    """Convierte un array de floats a micro-unidades int64."""
+    return np.rint(np.asarray(valores, dtype=np.float64) * ESCALA).astype(np.int64)
+
+
+def desde_micro_np(micros) -> np.ndarray:
+    return np.asarray(micros, dtype=np.int64) / ESCALA
+
+
+def dividir_np(numerador, denominador, modo: str) -> np.ndarray:
+    numerador = np.asarray(numerador, dtype=np.int64)
+    denominador = np.asarray(denominador, dtype=np.int64)
+    if modo == REDONDEO_ABAJO:
+        return numerador // denominador
+    if modo == REDONDEO_ARRIBA:
+        return -((-numerador) // denominador)
+    if modo == REDONDEO_MITAD_ARRIBA:
+        return (numerador + denominador // 2) // denominador
+    raise ValueError(f"Modo de redondeo desconocido: {modo}")
+
+
+def calcular_ventas_np(monto_usd, tasa_venta, tasa_compra, comision) -> dict:
+    """
+    Version vectorizada de calcular_venta sobre arrays int64.
+    Los productos intermedios caben en int64 para ventas de hasta ~7 millones de USD.
+    """
+    monto_usd = np.asarray(monto_usd, dtype=np.int64)
+    usdt = dividir_np(monto_usd * ESCALA, tasa_compra, REDONDEO_ABAJO)
+    ingreso_bruto = dividir_np(usdt * np.asarray(tasa_venta, dtype=np.int64), ESCALA, REDONDEO_MITAD_ARRIBA)
+    comision_monto = dividir_np(ingreso_bruto * np.asarray(comision, dtype=np.int64), ESCALA, REDONDEO_ARRIBA)
+    ingreso_neto = ingreso_bruto - comision_monto
+    return {
+        'usdt_operado': usdt,
+        'ingreso_bruto': ingreso_bruto,
+        'comision_monto': comision_monto,
+        'ingreso_neto': ingreso_neto,
+        'ganancia_venta': ingreso_neto - monto_usd
+    }
+
+
+def recalcular_ventas(db, ciclo_id=None) -> dict:
+    """
+    Recalcula en bloque todas las ventas guardadas (o las de un ciclo) con
+    aritmetica entera y las compara contra lo persistido.
+
+    Returns:
+        dict con total de ventas, cantidad de filas con diferencias por
+        columna y los totales exactos (en micro-unidades) recalculados.
+    """
+    guardado = db.obtener_ventas_micro(ciclo_id)
+    recalculado = calcular_ventas_np(
+        guardado['monto_operado'], guardado['tasa_venta_p2p'],
+        guardado['tasa_compra'], guardado['comision_porcentaje']
+    )
+
+    return {
+        'ventas': int(len(guardado['id'])),
+        'diferencias': {
+            columna: int(np.count_nonzero(valores != guardado[columna]))
+            for columna, valores in recalculado.items()
+        },
+        'totales_micro': {
+            columna: int(valores.sum()) for columna, valores in recalculado.items()
+        }
+    }
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: exportador.py
+# DESCRIPCION: Exportacion de ventas y dias a TXT, CSV, JSON Lines y HTML
+# ==========================================================
+#
+# Las filas se leen de una conexion de solo lectura con fetchmany en bloques
+# de TAMANO_BLOQUE y se escriben bloque a bloque: la memoria usada no depende
+# del tamano del historial. El archivo se escribe en <destino>.parcial y solo
+# al terminar sin errores reemplaza al destino (os.replace), de modo que
+# nunca queda un exporte a medio escribir con el nombre final. Con --gzip la
+# salida se comprime al vuelo (<destino>.gz).
+#
+# Las consultas recorren los indices de dias y ventas en el orden de salida
+# (sin ordenamiento temporal), asi SQLite tambien entrega las filas por partes.
+# Los ciclos movidos por archivador.py se leen de los archivos anuales
+# adjuntos: cada base entrega sus filas ya ordenadas y se intercalan con
+# heapq.merge, sin juntar el historial en memoria.
+#
+#   python exportador.py ventas --formato csv [--ciclo 3 | --usuario 1] [--gzip] [--salida ruta]
+#   python exportador.py dias --formato html --ciclo 3
+
+import os
+import io
+import csv
+import gzip
+import html
+import heapq
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+from itertools import islice, starmap
+from operator import itemgetter
+from contextlib import contextmanager
+
+from database import adjuntar_archivos, directorio_archivos, esquema_ciclo
+
+FORMATOS = ('txt', 'csv', 'jsonl', 'html')
+TAMANO_BLOQUE = 5000
+DIRECTORIO_EXPORTES = 'data/exportes'
+
+# Columnas por tabla: (columna, encabezado, ancho en TXT, formato numerico)
+COLUMNAS = {
+    'ventas': (
+        ('usuario_id', 'Usuario', 7, ''),
+        ('ciclo_id', 'Ciclo', 6, ''),
+        ('dia_numero', 'Dia', 5, ''),
+        ('fecha', 'Fecha', 10, ''),
+        ('venta_numero', 'Venta', 5, ''),
+        ('monto_operado', 'Monto_Operado', 16, ',.2f'),
+        ('usdt_operado', 'USDT_Operado', 16, ',.2f'),
+        ('tasa_venta_p2p', 'Tasa_Venta', 10, '.4f'),
+        ('tasa_compra', 'Tasa_Compra', 11, '.4f'),
+        ('comision_monto', 'Comision', 12, ',.2f'),
+        ('ingreso_neto', 'Ingreso_Neto', 16, ',.2f'),
+        ('ganancia_venta', 'Ganancia', 14, ',.2f'),
+    ),
+    'dias': (
+        ('usuario_id', 'Usuario', 7, ''),
+        ('ciclo_id', 'Ciclo', 6, ''),
+        ('dia_numero', 'Dia', 5, ''),
+        ('fecha', 'Fecha', 10, ''),
+        ('capital_disponible_inicio', 'Capital_Inicio', 16, ',.2f'),
+        ('capital_operado', 'Capital_Operado', 16, ',.2f'),
+        ('capital_fresco_inyectado', 'Capital_Fresco', 16, ',.2f'),
+        ('saldo_boveda_final', 'Boveda_Final', 16, ',.2f'),
+        ('ganancia_bruta_dia', 'Ganancia_Bruta', 16, ',.2f'),
+        ('ganancia_retirada', 'Retirado', 14, ',.2f'),
+        ('roi_dia', 'ROI_%', 8, '.2f'),
+        ('tasa_costo_final', 'Tasa_Costo', 10, '.4f'),
+    ),
+}
+
+# Columnas del exporte de ventas que se toman de dias (el resto sale de ventas)
+_COLUMNAS_DIA = ('usuario_id', 'ciclo_id', 'dia_numero', 'fecha')
+
+# Filtro y orden de salida: por ciclo, por usuario o todo el historial
+FILTROS = {
+    'ciclo': ("WHERE d.ciclo_id = ?", "d.dia_numero, d.id"),
+    'usuario': ("WHERE d.usuario_id = ?", "d.fecha, d.id"),
+    'todo': ("", "d.id"),
+}
+
+# Apariencia de infografia_arbitraje.html, sin recursos externos
+ESTILO_HTML = """
+    body { font-family: 'Inter', 'Segoe UI', Helvetica, Arial, sans-serif; background-color: #111827;
+           color: #e5e7eb; margin: 0; padding: 2rem; }
+    h1 { font-size: 2.25rem; font-weight: 900; margin: 0 0 .5rem 0;
+         background: linear-gradient(to right, #66B2FF, #CCE5FF);
+         -webkit-background-clip: text; -webkit-text-fill-color: transparent; }
+    p { color: #9ca3af; margin: .25rem 0 1.5rem 0; }
+    table { border-collapse: collapse; width: 100%; background-color: rgba(30, 41, 59, .5);
+            border: 1px solid #334155; border-radius: .5rem; font-size: .875rem; }
+    th { position: sticky; top: 0; background-color: #1e293b; color: #fff; font-weight: 600;
+         text-align: left; padding: .5rem .75rem; border-bottom: 1px solid #334155; }
+    td { padding: .35rem .75rem; border-bottom: 1px solid #1f2937; }
+    tr:hover td { background-color: rgba(0, 115, 230, .15); }
+    .num { text-align: right; font-variant-numeric: tabular-nums; }
+"""
+
+
+def consulta_exporte(tabla: str, filtro: str, esquema: str = 'main') -> str:
+    """
+    SELECT de `tabla` ('ventas' o 'dias') de un esquema (main o un archivo
+    adjunto) para el filtro de FILTROS. Despues de las columnas de COLUMNAS
+    van las del ORDER BY, con las que se intercalan las filas de varias bases.
+    """
+    where, orden = FILTROS[filtro]
+    if tabla == 'ventas':
+        orden = f"{orden}, v.venta_numero"
+        columnas = ', '.join(f"{'d' if c in _COLUMNAS_DIA else 'v'}.{c}" for c, _, _, _ in COLUMNAS['ventas'])
+        return (f"SELECT {columnas}, {orden} FROM {esquema}.dias d JOIN {esquema}.ventas v ON v.dia_id = d.id "
+                f"{where} ORDER BY {orden}")
+    columnas = ', '.join(f"d.{c}" for c, _, _, _ in COLUMNAS['dias'])
+    return f"SELECT {columnas}, {orden} FROM {esquema}.dias d {where} ORDER BY {orden}"
+
+
+@contextmanager
+def escritura_atomica(destino: str, comprimir: bool = False):
+    """
+    Archivo de texto UTF-8 que se escribe en `destino`.parcial (comprimido con
+    gzip si se pide) y reemplaza a `destino` solo si el bloque termina bien.
+    """
+    directorio = os.path.dirname(destino)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    parcial = destino + '.parcial'
+    try:
+        with open(parcial, 'wb') as binario:
+            salida = gzip.GzipFile(fileobj=binario, mode='wb', compresslevel=6, mtime=0) if comprimir else binario
+            with io.TextIOWrapper(salida, encoding='utf-8', newline='') as texto:
+                yield texto
+        os.replace(parcial, destino)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+
+
+def _intercalar(cursores, n_columnas):
+    """
+    Filas de una o varias bases en el orden de salida, sin las columnas de
+    orden: cada cursor ya viene ordenado, heapq.merge solo compara las cabezas.
+    """
+    if len(cursores) == 1:
+        filas = cursores[0]
+    else:
+        filas = heapq.merge(*cursores, key=itemgetter(slice(n_columnas, None)))
+    return map(itemgetter(slice(0, n_columnas)), filas)
+
+
+def _bloques(filas, tamano_bloque):
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, tamano_bloque))
+        if not bloque:
+            return
+        yield bloque
+
+
+def _celdas(columnas):
+    """Funcion fila -> lista de textos con el formato de cada columna (NULL como vacio)."""
+    formatos = [f"{{:{especificacion}}}".format for _, _, _, especificacion in columnas]
+
+    def celdas(fila):
+        return [formato(valor) if valor is not None else '' for formato, valor in zip(formatos, fila)]
+    return celdas
+
+
+def _escribir_txt(f, columnas, bloques, titulo):
+    f.write(f"{titulo}\n")
+    f.write(f"Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    encabezado = ' '.join(f"{titulo_columna:>{ancho}}" for _, titulo_columna, ancho, _ in columnas)
+    f.write(f"{encabezado}\n{'-' * len(encabezado)}\n")
+
+    # Un str.format por fila; los bloques con algun NULL se formatean celda por celda
+    linea = ' '.join(f"{{:>{ancho}{especificacion}}}" for _, _, ancho, especificacion in columnas) + '\n'
+    linea_texto = ' '.join(f"{{:>{ancho}}}" for _, _, ancho, _ in columnas) + '\n'
+    celdas = _celdas(columnas)
+    filas = 0
+    for bloque in bloques:
+        try:
+            texto = ''.join(starmap(linea.format, bloque))
+        except TypeError:
+            texto = ''.join(linea_texto.format(*celdas(fila)) for fila in bloque)
+        f.write(texto)
+        filas += len(bloque)
+    return filas
+
+
+def _escribir_csv(f, columnas, bloques, titulo):
+    escritor = csv.writer(f, lineterminator='\n')
+    escritor.writerow([columna for columna, _, _, _ in columnas])
+    filas = 0
+    for bloque in bloques:
+        escritor.writerows(bloque)
+        filas += len(bloque)
+    return filas
+
+
+def _escribir_jsonl(f, columnas, bloques, titulo):
+    claves = [columna for columna, _, _, _ in columnas]
+    filas = 0
+    for bloque in bloques:
+        f.write(''.join(json.dumps(dict(zip(claves, fila)), ensure_ascii=False) + '\n' for fila in bloque))
+        filas += len(bloque)
+    return filas
+
+
+def _escribir_html(f, columnas, bloques, titulo):
+    f.write('<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="UTF-8">\n'
+            '<meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+            f'<title>{html.escape(titulo)}</title>\n<style>{ESTILO_HTML}</style>\n</head>\n<body>\n'
+            f'<h1>{html.escape(titulo)}</h1>\n'
+            f'<p>Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>\n<table>\n<thead><tr>')
+    f.write(''.join(('<th class="num">{}</th>' if especificacion else '<th>{}</th>').format(html.escape(titulo_columna))
+                    for _, titulo_columna, _, especificacion in columnas))
+    f.write('</tr></thead>\n<tbody>\n')
+
+    fila_html = '<tr>' + ''.join('<td class="num">{}</td>' if especificacion else '<td>{}</td>'
+                                 for _, _, _, especificacion in columnas) + '</tr>\n'
+    celdas = _celdas(columnas)
+    filas = 0
+    for bloque in bloques:
+        f.write(''.join(fila_html.format(*map(html.escape, celdas(fila))) for fila in bloque))
+        filas += len(bloque)
+    f.write(f'</tbody>\n</table>\n<p>{filas:,} filas</p>\n</body>\n</html>\n')
+    return filas
+
+
+ESCRITORES = {
+    'txt': _escribir_txt,
+    'csv': _escribir_csv,
+    'jsonl': _escribir_jsonl,
+    'html': _escribir_html,
+}
+
+
+def exportar(destino: str, formato: str = 'csv', tabla: str = 'ventas', ciclo_id: int = None,
+             usuario_id: int = None, db_path: str = 'data/arbitraje.db', comprimir: bool = False,
+             tamano_bloque: int = TAMANO_BLOQUE, directorio_archivo: str = None) -> dict:
+    """
+    Exporta las ventas o los dias de un ciclo, de un usuario o de todo el
+    historial (incluidos los ciclos archivados) en el formato indicado,
+    leyendo y escribiendo por bloques.
+
+    Args:
+        destino: ruta del archivo (con comprimir=True se le agrega .gz)
+        formato: 'txt', 'csv', 'jsonl' o 'html'
+        tabla: 'ventas' o 'dias'
+        directorio_archivo: archivos anuales (por defecto 'archivo' junto a la base)
+
+    Returns:
+        dict con archivo, filas y tamano_bytes
+    """
+    if formato not in ESCRITORES:
+        raise ValueError(f"Formato desconocido: {formato} (opciones: {', '.join(FORMATOS)})")
+    if tabla not in COLUMNAS:
+        raise ValueError(f"Tabla desconocida: {tabla} (opciones: {', '.join(COLUMNAS)})")
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    if comprimir and not destino.endswith('.gz'):
+        destino += '.gz'
+
+    if ciclo_id is not None:
+        filtro, parametros, alcance = 'ciclo', (ciclo_id,), f"ciclo {ciclo_id}"
+    elif usuario_id is not None:
+        filtro, parametros, alcance = 'usuario', (usuario_id,), f"usuario {usuario_id}"
+    else:
+        filtro, parametros, alcance = 'todo', (), "todo el historial"
+    titulo = f"Arbitraje P2P - {tabla.capitalize()} ({alcance})"
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        archivos = adjuntar_archivos(conn, directorio_archivo or directorio_archivos(db_path))
+        if filtro == 'ciclo':
+            esquemas = [esquema_ciclo(conn, archivos, ciclo_id)]
+        else:
+            esquemas = ['main'] + archivos
+        cursores = [conn.execute(consulta_exporte(tabla, filtro, esquema), parametros) for esquema in esquemas]
+        bloques = _bloques(_intercalar(cursores, len(COLUMNAS[tabla])), tamano_bloque)
+        with escritura_atomica(destino, comprimir) as f:
+            filas = ESCRITORES[formato](f, COLUMNAS[tabla], bloques, titulo)
+    finally:
+        conn.close()
+
+    return {'archivo': destino, 'filas': filas, 'tamano_bytes': os.path.getsize(destino)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta ventas o dias a TXT, CSV, JSON Lines o HTML")
+    parser.add_argument('tabla', choices=tuple(COLUMNAS))
+    parser.add_argument('--formato', choices=FORMATOS, default='csv')
+    alcance = parser.add_mutually_exclusive_group()
+    alcance.add_argument('--ciclo', type=int, default=None)
+    alcance.add_argument('--usuario', type=int, default=None)
+    parser.add_argument('--gzip', action='store_true', help="Comprimir la salida (.gz)")
+    parser.add_argument('--salida', default=None, help=f"Archivo de salida (por defecto en {DIRECTORIO_EXPORTES})")
+    parser.add_argument('--db', default='data/arbitraje.db')
+    parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help="Filas por bloque")
+    args = parser.parse_args()
+
+    sufijo = f"ciclo_{args.ciclo}" if args.ciclo is not None else (
+        f"usuario_{args.usuario}" if args.usuario is not None else "todo")
+    salida = args.salida or os.path.join(DIRECTORIO_EXPORTES, f"{args.tabla}_{sufijo}.{args.formato}")
+
+    r = exportar(salida, args.formato, args.tabla, args.ciclo, args.usuario, args.db, args.gzip, args.bloque)
+    print(f"[OK] {r['filas']:,} filas exportadas a {r['archivo']} ({r['tamano_bytes'] / 1024:.1f} KB)")
@@ -6,8 +6,20 @@
 
 import warnings
 import os
+import logging
+import sqlite3
 from datetime import date
-from database import ArbitrajeDB
+from database import ArbitrajeDB, ConflictoConcurrencia
+import contabilidad
+import registro
+import respaldos
+import archivador
+import columnar
+import reportes
+import dinero
+from arbitraje_core import CicloArbitraje, iterar_ventas, TotalesVentas
+from planificador import planificar_ciclo, paso_malla, ACCION_REINVERTIR, ACCION_NO_OPERAR
+from metodos_pago import MotorMetodosPago
 from utils import (validar_numero_positivo, validar_entero_rango, 
                    confirmar_accion, formatear_moneda, formatear_porcentaje,
                    imprimir_titulo, imprimir_separador)
@@ -21,8 +33,13 @@ LIMITE_FINAL_USD = 1000.00
 PORCENTAJE_AHORRO_BTC = 0.50
 COSTO_COMPRA_BASE = 1.04424
 
-# Usuario por defecto (multi-usuario para el futuro)
-USUARIO_ID = 1
+# Operador de esta terminal: cada usuario tiene sus propios ciclos. Varias
+# terminales pueden compartir la base (WAL); las escrituras sobre un mismo
+# ciclo se validan con su version (ConflictoConcurrencia)
+USUARIO_ID = int(os.environ.get('ARBITRAJE_USUARIO_ID', 1))
+
+# Los registros de 'arbitraje' van a logs_sistema por registro.py
+logger = logging.getLogger(registro.LOGGER)
 
 def cargar_parametros_desde_bd(db):
     """Carga parametros del sistema desde la BD"""
@@ -45,20 +62,25 @@ def cargar_parametros_desde_bd(db):
 def calcular_venta_individual(monto_venta, tasa_venta_p2p, tasa_compra, comision):
     """Calcula el resultado de UNA venta individual"""
     # monto_venta es el costo en USD de los USDT operados en esta venta
-    usdt_operado = monto_venta / tasa_compra
-    ingreso_bruto = usdt_operado * tasa_venta_p2p
-    comision_monto = ingreso_bruto * comision
-    ingreso_neto = ingreso_bruto - comision_monto
-    ganancia_venta = ingreso_neto - monto_venta
+    # Calculo exacto en micro-unidades enteras (ver dinero.py)
+    usdt_operado, ingreso_bruto, comision_monto, ingreso_neto, ganancia_venta = dinero.calcular_venta(
+        dinero.a_micro(monto_venta), dinero.a_micro(tasa_venta_p2p),
+        dinero.a_micro(tasa_compra), dinero.a_micro(comision)
+    )
     
     return {
-        'usdt_operado': usdt_operado,
-        'ingreso_bruto': ingreso_bruto,
-        'comision_monto': comision_monto,
-        'ingreso_neto': ingreso_neto,
-        'ganancia_venta': ganancia_venta
+        'usdt_operado': dinero.desde_micro(usdt_operado),
+        'ingreso_bruto': dinero.desde_micro(ingreso_bruto),
+        'comision_monto': dinero.desde_micro(comision_monto),
+        'ingreso_neto': dinero.desde_micro(ingreso_neto),
+        'ganancia_venta': dinero.desde_micro(ganancia_venta)
     }
 
+def _ingreso_neto_micro(usdt_micro, tasa_venta_micro, comision_micro):
+    """Ingreso neto (USD, micro-unidades) de vender `usdt_micro` USDT"""
+    ingreso_bruto = dinero.usd_por_usdt(usdt_micro, tasa_venta_micro)
+    return ingreso_bruto - dinero.multiplicar(ingreso_bruto, comision_micro, dinero.REDONDEO_ARRIBA)
+
 def solicitar_ventas_del_dia(capital_disponible, max_ventas):
     """Solicita el monto de cada venta individual del dia"""
     ventas = []
@@ -119,26 +141,21 @@ def preview_ventas(ventas_montos, tasa_venta_p2p, tasa_compra, comision):
     print(f"\n{'Venta':<8} {'Monto':<12} {'USDT':<12} {'Ingreso':<12} {'Comision':<12} {'Ganancia':<12}")
     imprimir_separador("-", 80)
     
-    total_monto = 0
-    total_usdt = 0
-    total_ingreso = 0
-    total_comision = 0
-    total_ganancia = 0
+    # Los totales se acumulan en la misma pasada del generador
+    totales = TotalesVentas()
     
-    for i, monto in enumerate(ventas_montos, 1):
-        resultado = calcular_venta_individual(monto, tasa_venta_p2p, tasa_compra, comision)
-        
-        print(f"#{i:<7} {formatear_moneda(monto):<12} "
-              f"{resultado['usdt_operado']:>10.2f} "
-              f"{formatear_moneda(resultado['ingreso_bruto']):<12} "
-              f"{formatear_moneda(resultado['comision_monto']):<12} "
-              f"{formatear_moneda(resultado['ganancia_venta']):<12}")
-        
-        total_monto += monto
-        total_usdt += resultado['usdt_operado']
-        total_ingreso += resultado['ingreso_bruto']
-        total_comision += resultado['comision_monto']
-        total_ganancia += resultado['ganancia_venta']
+    for venta in iterar_ventas(ventas_montos, tasa_venta_p2p, tasa_compra, comision, totales):
+        print(f"#{venta.venta_numero:<7} {formatear_moneda(venta.monto_operado):<12} "
+              f"{venta.usdt_operado:>10.2f} "
+              f"{formatear_moneda(venta.ingreso_bruto):<12} "
+              f"{formatear_moneda(venta.comision_monto):<12} "
+              f"{formatear_moneda(venta.ganancia_venta):<12}")
+    
+    total_monto = totales.monto_operado
+    total_usdt = totales.usdt_operado
+    total_ingreso = totales.ingreso_bruto
+    total_comision = totales.comision_monto
+    total_ganancia = totales.ganancia_venta
     
     imprimir_separador("-", 80)
     print(f"{'TOTAL':<8} {formatear_moneda(total_monto):<12} "
@@ -171,45 +188,14 @@ def resumen_final_ciclo(db, ciclo_id):
     cursor.execute("SELECT * FROM ciclos WHERE id = ?", (ciclo_id,))
     ciclo = dict(cursor.fetchone())
     
-    # Estadisticas de dias
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_dias,
-            COALESCE(SUM(ganancia_bruta_dia), 0) as ganancia_total,
-            COALESCE(SUM(capital_fresco_inyectado), 0) as total_inyectado
-        FROM dias WHERE ciclo_id = ?
-    """, (ciclo_id,))
-    stats = dict(cursor.fetchone())
-    
-    # Estadisticas de ventas
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_ventas,
-            COALESCE(SUM(usdt_operado), 0) as total_usdt,
-            COALESCE(SUM(comision_monto), 0) as total_comisiones
-        FROM ventas v
-        JOIN dias d ON v.dia_id = d.id
-        WHERE d.ciclo_id = ?
-    """, (ciclo_id,))
-    stats_ventas = dict(cursor.fetchone())
-    
-    # Obtener capital final del ultimo dia
-    cursor.execute("""
-        SELECT saldo_boveda_final, tasa_costo_final 
-        FROM dias 
-        WHERE ciclo_id = ? 
-        ORDER BY dia_numero DESC 
-        LIMIT 1
-    """, (ciclo_id,))
-    ultimo_saldo_row = cursor.fetchone()
+    # Estadisticas agregadas (una fila de ciclo_stats)
+    stats = db.get_estadisticas_ciclo(ciclo_id)
     
     capital_inicial = ciclo['capital_inicial']
     
     # El capital final debe ser el valor USD (costo) del USDT en bveda
-    if ultimo_saldo_row:
-        saldo_usdt = ultimo_saldo_row['saldo_boveda_final']
-        tasa_costo = ultimo_saldo_row['tasa_costo_final']
-        capital_final = saldo_usdt * tasa_costo
+    if stats['ultimo_saldo_boveda'] is not None:
+        capital_final = stats['ultimo_saldo_boveda'] * stats['ultima_tasa_costo']
     else:
         capital_final = capital_inicial
     
@@ -237,9 +223,9 @@ def resumen_final_ciclo(db, ciclo_id):
         print(f"   ROI diario (compuesto): {formatear_porcentaje(roi_diario, 3)}")
     
     print(f"\n[OPERACIONES]:")
-    print(f"   Total ventas:     {stats_ventas['total_ventas']}")
-    print(f"   USDT operado:     {stats_ventas['total_usdt']:.2f} USDT")
-    print(f"   Comisiones:       {formatear_moneda(stats_ventas['total_comisiones'])}")
+    print(f"   Total ventas:     {stats['total_ventas']}")
+    print(f"   USDT operado:     {stats['total_usdt']:.2f} USDT")
+    print(f"   Comisiones:       {formatear_moneda(stats['total_comisiones'])}")
     
     # Plan de ahorro BTC
     monto_btc = ganancia_total * PORCENTAJE_AHORRO_BTC
@@ -252,6 +238,61 @@ def resumen_final_ciclo(db, ciclo_id):
     imprimir_separador()
 
 
+def sugerir_compra(motor, monto_usd, tasa_venta_p2p=None):
+    """
+    Muestra la ruta mas barata para comprar `monto_usd` con los metodos de
+    pago activos. `motor` es el MotorMetodosPago de la sesion, asi su cache
+    de tasas se reutiliza entre sugerencias. Con `tasa_venta_p2p` (la ultima
+    publicada) se descartan los metodos que no serian rentables a esa tasa.
+    Retorna (tasa_sugerida, ruta); sin metodos utilizables se sugiere
+    COSTO_COMPRA_BASE y la ruta es None.
+    """
+    ruta = motor.mejor_ruta(monto_usd, tasa_venta_p2p)
+    
+    if not ruta['asignaciones']:
+        if tasa_venta_p2p is not None and motor.evaluar_metodos():
+            print(f"\n[AVISO] Ningun metodo de pago es rentable a la ultima tasa P2P ({tasa_venta_p2p:.4f})")
+        return COSTO_COMPRA_BASE, None
+    
+    print("\n[RUTA DE COMPRA SUGERIDA]:")
+    for asignacion in ruta['asignaciones']:
+        print(f"   {asignacion['nombre']:<20} {formatear_moneda(asignacion['monto_usd']):>12}"
+              f"  @ {asignacion['costo_efectivo']:.4f}  -> {asignacion['usdt']:.4f} USDT")
+    if ruta['faltante'] > 0:
+        print(f"   [AVISO] Limites insuficientes, faltan {formatear_moneda(ruta['faltante'])}")
+    
+    return ruta['costo_promedio'], ruta
+
+
+def metodo_principal(ruta):
+    """
+    Metodo con mayor monto de la ruta: es el que se guarda en
+    dias.metodo_pago_id. Lo cargado a cada metodo queda en
+    compras_metodos_pago (ver compras_ruta).
+    """
+    if not ruta:
+        return None
+    return max(ruta['asignaciones'], key=lambda a: a['monto_usd'])['metodo_id']
+
+
+def compras_ruta(ruta):
+    """Tuplas (metodo_pago_id, monto_usd) de una ruta, para descontar de los limites"""
+    if not ruta:
+        return ()
+    return tuple((a['metodo_id'], a['monto_usd']) for a in ruta['asignaciones'])
+
+
+def logs_ruta_compra(ruta):
+    """Entrada de log con el reparto de una compra entre varios metodos de pago"""
+    if not ruta or len(ruta['asignaciones']) < 2:
+        return ()
+    detalle = ', '.join(
+        f"metodo {a['metodo_id']} ({a['nombre']}): {formatear_moneda(a['monto_usd'])} @ {a['costo_efectivo']:.4f}"
+        for a in ruta['asignaciones']
+    )
+    return (('INFO', 'main', 'ejecutar_dia', f"Ruta de compra repartida - {detalle}"),)
+
+
 def cerrar_dia(capital_operado_usd, usdt_operados, tasa_venta, comision):
     """
     Al cerrar el dia, pregunta que paso realmente con los USDT
@@ -264,9 +305,15 @@ def cerrar_dia(capital_operado_usd, usdt_operados, tasa_venta, comision):
     print(f"   Capital operado:  {formatear_moneda(capital_operado_usd)}")
     print(f"   USDT en juego:    {usdt_operados:.4f} USDT")
     
-    # Calcular ganancia potencial si vendio todo
-    ingreso_total = usdt_operados * tasa_venta * (1 - comision)
-    ganancia_total = ingreso_total - capital_operado_usd
+    # Calcular ganancia potencial si vendio todo (en micro-unidades)
+    capital_micro = dinero.a_micro(capital_operado_usd)
+    usdt_micro = dinero.a_micro(usdt_operados)
+    tasa_venta_micro = dinero.a_micro(tasa_venta)
+    comision_micro = dinero.a_micro(comision)
+    
+    ingreso_total_micro = _ingreso_neto_micro(usdt_micro, tasa_venta_micro, comision_micro)
+    ingreso_total = dinero.desde_micro(ingreso_total_micro)
+    ganancia_total = dinero.desde_micro(ingreso_total_micro - capital_micro)
     
     print(f"   Si vendes todo:   {formatear_moneda(ingreso_total)}")
     print(f"   Ganancia seria:   {formatear_moneda(ganancia_total)}")
@@ -299,10 +346,16 @@ def cerrar_dia(capital_operado_usd, usdt_operados, tasa_venta, comision):
             maximo=usdt_operados
         )
         
-        usdt_en_boveda = usdt_operados - usdt_vendidos
-        usd_a_banco = usdt_vendidos * tasa_venta * (1 - comision)
-        costo_usdt_vendidos = (usdt_vendidos / usdt_operados) * capital_operado_usd
-        ganancia_real = usd_a_banco - costo_usdt_vendidos
+        usdt_vendidos_micro = dinero.a_micro(usdt_vendidos)
+        usd_a_banco_micro = _ingreso_neto_micro(usdt_vendidos_micro, tasa_venta_micro, comision_micro)
+        # Costo proporcional de los USDT vendidos
+        costo_vendidos_micro = dinero.dividir(
+            usdt_vendidos_micro * capital_micro, usdt_micro, dinero.REDONDEO_MITAD_ARRIBA
+        )
+        
+        usdt_en_boveda = dinero.desde_micro(usdt_micro - usdt_vendidos_micro)
+        usd_a_banco = dinero.desde_micro(usd_a_banco_micro)
+        ganancia_real = dinero.desde_micro(usd_a_banco_micro - costo_vendidos_micro)
         
         print(f"\n[Operacion parcial]:")
         print(f"   A tu banco:       {formatear_moneda(usd_a_banco)}")
@@ -330,11 +383,23 @@ def cerrar_dia(capital_operado_usd, usdt_operados, tasa_venta, comision):
     }
 
 
+def _avisar_conflicto(db, error):
+    """Otro operador cambio el ciclo mientras se cargaba el dia: no se guardo nada"""
+    print(f"\n[CONFLICTO] {error}")
+    print("   No se guardaron cambios. Vuelva a ejecutar la operacion con los datos actuales.")
+    logger.warning("Conflicto de concurrencia: %s", error)
+    db.cerrar()
+
 def ejecutar_dia():
     """Funcion principal de ejecucion diaria con BD"""
     
     db = ArbitrajeDB()
     cargar_parametros_desde_bd(db)
+    # Un motor por sesion: su cache de tasas sirve a todas las sugerencias de compra
+    motor = MotorMetodosPago(db, USUARIO_ID, COMISION_P2P_MAKER)
+    # Referencia para descartar metodos no rentables antes de conocer la tasa de hoy
+    tasa_referencia = db.ultima_tasa_venta(USUARIO_ID)
+    ruta_inicial = None # Reparto de la compra inicial del ciclo entre metodos de pago
     
     # Verificar si hay ciclo activo
     ciclo = db.obtener_ciclo_activo(usuario_id=USUARIO_ID)
@@ -377,10 +442,12 @@ def ejecutar_dia():
             print("  (Ve a Binance > Comprar Crypto > USDT)")
             print("  Ejemplo: Si dice '1 USDT = $1.0442', ingresa 1.0442\n")
             
+            tasa_sugerida, ruta_inicial = sugerir_compra(motor, monto_usd_gastar, tasa_referencia)
+            
             while True:
                 tasa_compra_inicial = validar_numero_positivo(
-                    f"-> Tasa de compra Binance (Sugerida {COSTO_COMPRA_BASE:.4f}): $",
-                    default=COSTO_COMPRA_BASE
+                    f"-> Tasa de compra Binance (Sugerida {tasa_sugerida:.4f}): $",
+                    default=tasa_sugerida
                 )
                 
                 # Validar que la tasa sea razonable (entre 0.95 y 1.15)
@@ -433,14 +500,21 @@ def ejecutar_dia():
         
         nombre_ciclo = input("\n-> Nombre del ciclo (Enter para auto): ").strip()
         
-        ciclo_id = db.iniciar_ciclo(
-            usuario_id=USUARIO_ID,
-            dias_totales=dias_totales,
-            capital_inicial=capital_inicial,
-            nombre_ciclo=nombre_ciclo if nombre_ciclo else None,
-            tasa_compra_inicial=tasa_compra_inicial,
-            tipo_capital='USD_FRESCO' if tipo_capital == 'A' else 'USDT_EXISTENTE'
-        )
+        try:
+            ciclo_id = db.iniciar_ciclo(
+                usuario_id=USUARIO_ID,
+                dias_totales=dias_totales,
+                capital_inicial=capital_inicial,
+                nombre_ciclo=nombre_ciclo if nombre_ciclo else None,
+                tasa_compra_inicial=tasa_compra_inicial,
+                tipo_capital='USD_FRESCO' if tipo_capital == 'A' else 'USDT_EXISTENTE',
+                unico_activo=True,
+                compras=compras_ruta(ruta_inicial)
+            )
+        except ConflictoConcurrencia as e:
+            _avisar_conflicto(db, e)
+            return
+        logger.info("Ciclo %s iniciado: %s dias, capital %.2f", ciclo_id, dias_totales, capital_inicial)
         
         ciclo = db.obtener_ciclo_activo(usuario_id=USUARIO_ID)
         
@@ -485,12 +559,17 @@ def ejecutar_dia():
                 # Se pasa el capital final en USD (costo) para el registro
                 capital_final_usd = saldo_boveda * tasa_costo_boveda
                 
-                db.finalizar_ciclo(
-                    ciclo_id=ciclo_id,
-                    capital_final=capital_final_usd,
-                    ganancia_total=capital_final_usd - ciclo['capital_inicial'],
-                    roi_total=((capital_final_usd - ciclo['capital_inicial']) / ciclo['capital_inicial']) * 100
-                )
+                try:
+                    db.finalizar_ciclo(
+                        ciclo_id=ciclo_id,
+                        capital_final=capital_final_usd,
+                        ganancia_total=capital_final_usd - ciclo['capital_inicial'],
+                        roi_total=((capital_final_usd - ciclo['capital_inicial']) / ciclo['capital_inicial']) * 100,
+                        version_ciclo=ciclo['version']
+                    )
+                except ConflictoConcurrencia as e:
+                    _avisar_conflicto(db, e)
+                    return
                 db.cerrar()
                 # Reiniciar
                 return ejecutar_dia()
@@ -512,6 +591,7 @@ def ejecutar_dia():
     capital_operado = 0.0 # USDT a operar
     capital_no_operado = 0.0 # USDT que quedan en bveda
     capital_fresco = 0.0 # USD gastado en capital fresco
+    ruta_compra = None # Reparto del capital fresco entre metodos de pago
     tipo_operacion = ""
     tasa_compra_promedio = tasa_costo_boveda # Costo del capital a operar
     
@@ -548,9 +628,10 @@ def ejecutar_dia():
             print("\n[COMPRA DE CAPITAL FRESCO]")
             monto_usd_fresco = validar_numero_positivo("Monto USD a gastar (tarjeta): $")
             
+            tasa_sugerida, ruta_compra = sugerir_compra(motor, monto_usd_fresco, tasa_referencia)
             tasa_compra_fresco = validar_numero_positivo(
-                f"Tasa de compra Binance (Sugerida {COSTO_COMPRA_BASE:.4f}): $",
-                default=COSTO_COMPRA_BASE
+                f"Tasa de compra Binance (Sugerida {tasa_sugerida:.4f}): $",
+                default=tasa_sugerida
             )
             
             # Calcular USDT que recibir
@@ -577,9 +658,10 @@ def ejecutar_dia():
             print("\n[CAPITAL FRESCO ADICIONAL]")
             monto_usd_fresco = validar_numero_positivo("Monto USD a gastar (tarjeta): $")
             
+            tasa_sugerida, ruta_compra = sugerir_compra(motor, monto_usd_fresco, tasa_referencia)
             tasa_compra_fresco = validar_numero_positivo(
-                f"Tasa de compra Binance (Sugerida {COSTO_COMPRA_BASE:.4f}): $",
-                default=COSTO_COMPRA_BASE
+                f"Tasa de compra Binance (Sugerida {tasa_sugerida:.4f}): $",
+                default=tasa_sugerida
             )
             
             # Calcular USDT del fresco
@@ -626,21 +708,23 @@ def ejecutar_dia():
                 # Quiere inyectar capital fresco (USDT de bveda no operados)
                 capital_no_operado = saldo_boveda
                 capital_fresco = validar_numero_positivo("Monto FRESCO a comprar: $")
-                capital_operado = capital_fresco / COSTO_COMPRA_BASE # Asumimos se opera todo el USDT comprado
+                tasa_sugerida, ruta_compra = sugerir_compra(motor, capital_fresco, tasa_referencia)
                 tasa_compra_promedio = validar_numero_positivo(
-                    f"Costo USDT/Tarjeta (Sugerido {COSTO_COMPRA_BASE:.4f}): $",
-                    default=COSTO_COMPRA_BASE
+                    f"Costo USDT/Tarjeta (Sugerido {tasa_sugerida:.4f}): $",
+                    default=tasa_sugerida
                 )
+                capital_operado = capital_fresco / tasa_compra_promedio # Asumimos se opera todo el USDT comprado
                 tipo_operacion = "CAPITAL_FRESCO_DIA1"
         else:
             # No hay saldo, obligado a inyectar
             print(f"\n[CAPITAL INICIAL REQUERIDO]")
             capital_fresco = validar_numero_positivo("Monto a COMPRAR (tarjeta): $")
-            capital_operado = capital_fresco / COSTO_COMPRA_BASE # Asumimos se opera todo el USDT comprado
+            tasa_sugerida, ruta_compra = sugerir_compra(motor, capital_fresco, tasa_referencia)
             tasa_compra_promedio = validar_numero_positivo(
-                f"Costo USDT/Tarjeta (Sugerido {COSTO_COMPRA_BASE:.4f}): $",
-                default=COSTO_COMPRA_BASE
+                f"Costo USDT/Tarjeta (Sugerido {tasa_sugerida:.4f}): $",
+                default=tasa_sugerida
             )
+            capital_operado = capital_fresco / tasa_compra_promedio # Asumimos se opera todo el USDT comprado
             tipo_operacion = "CAPITAL_INICIAL"
     
     # CRTICO: El capital operado (USDT) se retira de la bveda
@@ -783,9 +867,12 @@ def ejecutar_dia():
     # 3. Costo USD total de los USDT remanentes en la bveda
     costo_total_boveda_usd = costo_usdt_no_operados_usd + costo_ganancia_retenida_usd
     
+    saldo_boveda = dinero.cuantizar(saldo_boveda)
     if saldo_boveda > 0:
         # Tasa_Costo_Final = (Costo USD Total del saldo final) / (USDT Total del saldo final)
-        tasa_costo_final = costo_total_boveda_usd / saldo_boveda
+        tasa_costo_final = dinero.desde_micro(dinero.tasa_costo(
+            dinero.a_micro(costo_total_boveda_usd), dinero.a_micro(saldo_boveda)
+        ))
     else:
         tasa_costo_final = 1.0 
     
@@ -803,31 +890,29 @@ def ejecutar_dia():
         'ganancia_retirada': ganancia_retirada, # USD
         'roi_dia': roi_dia,
         'tipo_operacion': tipo_operacion,
-        'tasa_costo_final': tasa_costo_final # CAMPO NUEVO
+        'tasa_costo_final': tasa_costo_final, # CAMPO NUEVO
+        'metodo_pago_id': metodo_principal(ruta_compra) # El reparto completo va a compras_metodos_pago
     }
     
-    dia_id = db.registrar_dia(ciclo_id, USUARIO_ID, dia_data)
-    
-    # Guardar cada venta
-    for i, monto in enumerate(ventas_montos, 1):
-        resultado = calcular_venta_individual(
-            monto, tasa_venta_publicada, tasa_compra_promedio, COMISION_P2P_MAKER
+    # Dia + ventas + contador + log en una sola transaccion
+    # (el generador de ventas se consume directamente)
+    # Falla sin escribir si otro operador registro o cerro un dia del ciclo
+    # desde que se leyo al comienzo
+    try:
+        db.registrar_dia_completo(
+            ciclo_id, USUARIO_ID, dia_data,
+            iterar_ventas(ventas_montos, tasa_venta_publicada, tasa_compra_promedio, COMISION_P2P_MAKER),
+            tasa_venta_publicada,
+            tasa_compra_promedio,
+            COMISION_P2P_MAKER,
+            logs=logs_ruta_compra(ruta_compra),
+            version_ciclo=ciclo['version'],
+            compras=compras_ruta(ruta_compra)
         )
-        
-        venta_data = {
-            'venta_numero': i,
-            'monto_operado': monto,
-            'usdt_operado': resultado['usdt_operado'],
-            'tasa_venta_p2p': tasa_venta_publicada,
-            'tasa_compra': tasa_compra_promedio,
-            'comision_monto': resultado['comision_monto'],
-            'comision_porcentaje': COMISION_P2P_MAKER,
-            'ingreso_bruto': resultado['ingreso_bruto'],
-            'ingreso_neto': resultado['ingreso_neto'],
-            'ganancia_venta': resultado['ganancia_venta']
-        }
-        
-        db.registrar_venta(dia_id, venta_data)
+    except ConflictoConcurrencia as e:
+        _avisar_conflicto(db, e)
+        return
+    ciclo['version'] += 1
     
     # RESUMEN FINAL DEL DIA
     imprimir_titulo("RESUMEN DEL DIA")
@@ -847,17 +932,146 @@ def ejecutar_dia():
         # Se pasa el capital final en USD (costo) para el registro
         capital_final_usd = saldo_boveda * tasa_costo_final
         
-        db.finalizar_ciclo(
-            ciclo_id=ciclo_id,
-            capital_final=capital_final_usd,
-            ganancia_total=capital_final_usd - ciclo['capital_inicial'],
-            roi_total=((capital_final_usd - ciclo['capital_inicial']) / ciclo['capital_inicial']) * 100
-        )
+        try:
+            db.finalizar_ciclo(
+                ciclo_id=ciclo_id,
+                capital_final=capital_final_usd,
+                ganancia_total=capital_final_usd - ciclo['capital_inicial'],
+                roi_total=((capital_final_usd - ciclo['capital_inicial']) / ciclo['capital_inicial']) * 100,
+                version_ciclo=ciclo['version']
+            )
+        except ConflictoConcurrencia as e:
+            _avisar_conflicto(db, e)
+            return
         resumen_final_ciclo(db, ciclo_id)
     else:
         print(f"\n-> Listo para operar Dia {dia_actual + 1}")
     
     db.cerrar()
+    
+    # Instantanea columnar para reportes: solo agrega el dia recien registrado
+    try:
+        columnar.actualizar_columnar()
+    except (sqlite3.DatabaseError, OSError, ValueError) as e:
+        logger.warning("No se pudo actualizar la instantanea columnar: %s", e, exc_info=True)
+
+def mostrar_historial_ventas(db, ciclo_id, tamano=20):
+    """Historial de ventas del ciclo, de la mas reciente a la mas antigua, por paginas"""
+    pagina = db.pagina_historial_ventas(ciclo_id=ciclo_id, tamano=tamano)
+    
+    if not pagina['filas']:
+        print("\n[AVISO] Sin ventas registradas")
+        input("\nPresione Enter para continuar...")
+        return
+    
+    while True:
+        print(f"\n[ULTIMAS VENTAS] (mas recientes primero):")
+        print(f"{'Dia':<5} {'#':<3} {'Monto':<12} {'USDT':<10} {'Ganancia':<12}")
+        imprimir_separador("-", 60)
+        for v in pagina['filas']:
+            print(f"{v['dia_numero']:<5} #{v['venta_numero']:<2} "
+                  f"{formatear_moneda(v['monto_operado']):<12} "
+                  f"{v['usdt_operado']:>8.2f} "
+                  f"{formatear_moneda(v['ganancia_venta']):<12}")
+        
+        opciones = []
+        if pagina['hay_siguiente']:
+            opciones.append("[S] Mas antiguas")
+        if pagina['hay_anterior']:
+            opciones.append("[A] Mas recientes")
+        opcion = input(f"\n{'  '.join(opciones + ['[Enter] Volver'])}: ").strip().upper()
+        
+        if opcion == 'S' and pagina['hay_siguiente']:
+            pagina = db.pagina_historial_ventas(ciclo_id=ciclo_id, tamano=tamano, despues_de=pagina['ultima'])
+        elif opcion == 'A' and pagina['hay_anterior']:
+            pagina = db.pagina_historial_ventas(ciclo_id=ciclo_id, tamano=tamano, antes_de=pagina['primera'])
+        elif opcion == '':
+            return
+
+def planificar_ciclo_actual(db, ciclo):
+    """Recomienda el plan de reinversion/retiro para los dias restantes del ciclo"""
+    cargar_parametros_desde_bd(db)
+    
+    ultimo_dia = db.obtener_ultimo_dia(ciclo['id'])
+    if ultimo_dia:
+        saldo_usd = ultimo_dia['saldo_boveda_final'] * ultimo_dia['tasa_costo_final']
+        dia_siguiente = ultimo_dia['dia_numero'] + 1
+    else:
+        saldo_usd = ciclo['capital_inicial']
+        dia_siguiente = 1
+    
+    dias_restantes = ciclo['dias_totales'] - dia_siguiente + 1
+    if dias_restantes <= 0:
+        print("\n[AVISO] El ciclo ya no tiene dias pendientes")
+        return
+    
+    imprimir_titulo("PLANIFICADOR DEL CICLO")
+    print(f"\n   Saldo en boveda:  {formatear_moneda(saldo_usd)}")
+    print(f"   Dias restantes:   {dias_restantes}")
+    print(f"   Limite del ciclo: {formatear_moneda(LIMITE_FINAL_USD)}\n")
+    
+    tasa_venta = validar_numero_positivo("Tasa de venta P2P esperada: $")
+    costo_compra = validar_numero_positivo(
+        f"Costo de compra USDT (Sugerido {COSTO_COMPRA_BASE:.4f}): $",
+        default=COSTO_COMPRA_BASE
+    )
+    ventas_esperadas = validar_entero_rango(
+        f"Ventas esperadas por dia (1-{MAX_VENTAS_DIARIAS}): ", 1, MAX_VENTAS_DIARIAS
+    )
+    fresco_max = validar_numero_positivo(
+        "Capital fresco maximo por dia (Enter = 0): $", default=0.0, permitir_cero=True
+    )
+    # El planificador inyecta capital fresco en tramos enteros de la malla de saldos
+    paso = paso_malla(LIMITE_FINAL_USD)
+    if 0 < fresco_max < paso:
+        print(f"\n[AVISO] El capital fresco se planifica en tramos de {formatear_moneda(paso)}: "
+              f"con un maximo de {formatear_moneda(fresco_max)} no se inyectara capital fresco")
+    
+    try:
+        tasa_rentabilidad = CicloArbitraje(
+            saldo_usd, tasa_venta, costo_compra, COMISION_P2P_MAKER,
+            ciclo['dias_totales'], LIMITE_FINAL_USD, MAX_VENTAS_DIARIAS
+        ).get_tasa_rentabilidad_por_venta()
+    except ValueError as e:
+        print(f"\n[ERROR] {e}")
+        return
+    
+    resultado = planificar_ciclo(
+        capital_inicial_usd=saldo_usd,
+        tasas_rentabilidad_por_venta=tasa_rentabilidad,
+        ventas_por_dia=ventas_esperadas,
+        dias_restantes=dias_restantes,
+        limite_final_usd=LIMITE_FINAL_USD,
+        max_ventas_diarias=MAX_VENTAS_DIARIAS,
+        capital_fresco_max_diario=fresco_max
+    )
+    
+    print(f"\n{'Dia':<5} {'Accion':<12} {'Fresco':<12} {'Operado':<12} {'Retirado':<12} {'Boveda':<12}")
+    imprimir_separador("-", 80)
+    for dia in resultado['plan']:
+        print(f"{dia_siguiente + dia['dia'] - 1:<5} {dia['accion']:<12} "
+              f"{formatear_moneda(dia['capital_fresco']):<12} "
+              f"{formatear_moneda(dia['capital_operado']):<12} "
+              f"{formatear_moneda(dia['retirado']):<12} "
+              f"{formatear_moneda(dia['saldo_final']):<12}")
+    imprimir_separador("-", 80)
+    
+    hoy = resultado['plan'][0]
+    print(f"\n[RECOMENDACION PARA HOY - DIA {dia_siguiente}]:")
+    if hoy['accion'] == ACCION_NO_OPERAR and tasa_rentabilidad <= 0:
+        print("   No operar (la tasa esperada no es rentable)")
+    elif hoy['accion'] == ACCION_NO_OPERAR:
+        print("   No operar (no hay saldo en boveda ni capital fresco para operar)")
+    else:
+        if hoy['capital_fresco'] > 0:
+            print(f"   Inyectar capital fresco: {formatear_moneda(hoy['capital_fresco'])}")
+        decision = "REINVERTIR la ganancia" if hoy['accion'] == ACCION_REINVERTIR else "RETIRAR la ganancia"
+        print(f"   Operar {formatear_moneda(hoy['capital_operado'])} y {decision}")
+    
+    print(f"\n   Ganancia retirada total: {formatear_moneda(resultado['ganancia_retirada_total'])}")
+    print(f"   Capital fresco total:    {formatear_moneda(resultado['capital_fresco_total'])}")
+    print(f"   Boveda al cierre:        {formatear_moneda(resultado['boveda_final'])}")
+    imprimir_separador()
 
 def menu_principal():
     """Menu principal del sistema"""
@@ -873,10 +1087,11 @@ def menu_principal():
         print("4. Estadisticas")
         print("5. Crear Backup")
         print("6. [TEST] RESET COMPLETO - Borrar todo")
-        print("7. Salir")
+        print("7. Planificar Ciclo (reinversion/retiro)")
+        print("8. Salir")
         imprimir_separador()
         
-        opcion = input("\nOpcion (1-7): ").strip()
+        opcion = input("\nOpcion (1-8): ").strip()
         
         if opcion == "1":
             ejecutar_dia()
@@ -904,32 +1119,11 @@ def menu_principal():
         elif opcion == "3":
             
             if ciclo:
-                cursor = db.conn.cursor()
-                cursor.execute("""
-                    SELECT v.*, d.dia_numero, d.fecha
-                    FROM ventas v
-                    JOIN dias d ON v.dia_id = d.id
-                    WHERE d.ciclo_id = ?
-                    ORDER BY d.dia_numero, v.venta_numero
-                    LIMIT 20
-                """, (ciclo['id'],))
-                ventas = cursor.fetchall()
-                
-                if ventas:
-                    print(f"\n[ULTIMAS 20 VENTAS]:")
-                    print(f"{'Dia':<5} {'#':<3} {'Monto':<12} {'USDT':<10} {'Ganancia':<12}")
-                    imprimir_separador("-", 60)
-                    for v in ventas:
-                        print(f"{v['dia_numero']:<5} #{v['venta_numero']:<2} "
-                              f"{formatear_moneda(v['monto_operado']):<12} "
-                              f"{v['usdt_operado']:>8.2f} "
-                              f"{formatear_moneda(v['ganancia_venta']):<12}")
-                else:
-                    print("\n[AVISO] Sin ventas registradas")
+                mostrar_historial_ventas(db, ciclo['id'])
             else:
                 print("\n[AVISO] No hay ciclo activo")
+                input("\nPresione Enter para continuar...")
             db.cerrar()
-            input("\nPresione Enter para continuar...")
         
         elif opcion == "4":
             
@@ -942,28 +1136,57 @@ def menu_principal():
                 print(f"   Comisiones:      {formatear_moneda(stats['total_comisiones'])}")
                 print(f"   Ganancia total:  {formatear_moneda(stats['ganancia_total'])}")
                 print(f"   Promedio/dia:    {formatear_moneda(stats['ganancia_promedio'])}")
+                
+                # Saldos del libro contable (DEBE - HABER; las cuentas acreedoras se muestran en positivo)
+                libro = db.balance_comprobacion(USUARIO_ID)
+                print(f"\n[CONTABILIDAD]:")
+                print(f"   Boveda (costo):  {formatear_moneda(libro[contabilidad.CUENTA_BOVEDA])}")
+                print(f"   Aportes:         {formatear_moneda(-libro[contabilidad.CUENTA_APORTES])}")
+                print(f"   Ganancia ventas: {formatear_moneda(-libro[contabilidad.CUENTA_GANANCIA])}")
+                print(f"   Comisiones P2P:  {formatear_moneda(libro[contabilidad.CUENTA_COMISIONES])}")
+                print(f"   Retiros:         {formatear_moneda(libro[contabilidad.CUENTA_RETIROS])}")
+                
+                # Desde la cache de reportes mientras la base no cambie
+                reportes.mostrar_ultimos_dias(n_dias=5, ciclo_id=ciclo['id'])
             else:
                 print("\n[AVISO] No hay ciclo activo")
             db.cerrar()
+            
+            # Todos los ciclos (incluidos los archivados) desde la instantanea columnar
+            if confirmar_accion("\nVer reporte historico de todos los ciclos?"):
+                reportes.reporte_columnar(usuario_id=USUARIO_ID)
             input("\nPresione Enter para continuar...")
         
         elif opcion == "5":
-            import shutil
-            from datetime import datetime
-            
-            # Crear directorio si no existe
-            backup_dir = 'data/backups'
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{backup_dir}/arbitraje_{timestamp}.db"
+            db.cerrar()
             
             if os.path.exists('data/arbitraje.db'):
-                shutil.copy2('data/arbitraje.db', backup_file)
-                tamano = os.path.getsize(backup_file)
-                print(f"\n[OK] Backup creado:")
-                print(f"   Archivo: {backup_file}")
-                print(f"   Tamano: {tamano/1024:.2f} KB")
+                print("\n   1. Incremental (solo lo que cambio, con retencion)")
+                print("   2. Completo (copia en linea verificada, con MD5)")
+                tipo_backup = input("Tipo de backup (1-2) [1]: ").strip() or "1"
+                try:
+                    if tipo_backup == "2":
+                        # Respaldo en linea (API de backup de SQLite), verificado y registrado
+                        respaldo = respaldos.crear_respaldo(usuario_id=USUARIO_ID)
+                        print(f"\n[OK] Backup creado:")
+                        print(f"   Archivo: {respaldo['archivo']}")
+                        print(f"   Tamano: {respaldo['tamano_bytes']/1024:.2f} KB")
+                        print(f"   MD5: {respaldo['md5']}")
+                        print(f"   Integridad: {respaldo['integridad']}")
+                    else:
+                        # Respaldo incremental (solo lo que cambio) y politica de retencion
+                        respaldo = respaldos.crear_respaldo_incremental(usuario_id=USUARIO_ID)
+                        purga = respaldos.purgar_incrementales()
+                        print(f"\n[OK] Backup incremental creado:")
+                        print(f"   Manifiesto: {respaldo['manifiesto']}")
+                        print(f"   Bloques: {respaldo['bloques']} ({respaldo['bloques_nuevos']} nuevos)")
+                        print(f"   Escrito: {respaldo['bytes_nuevos']/1024:.2f} KB")
+                        if purga['manifiestos_borrados']:
+                            print(f"   Retencion: {purga['manifiestos_borrados']} backup(s) antiguos eliminados "
+                                  f"({purga['bytes_liberados']/1024:.2f} KB liberados)")
+                except (sqlite3.DatabaseError, OSError) as e:
+                    logger.error("Backup fallido: %s", e, exc_info=True)
+                    print(f"\n[ERROR] No se pudo crear el backup: {e}")
             else:
                 print("\n[AVISO] No hay base de datos para respaldar")
             
@@ -979,21 +1202,32 @@ def menu_principal():
             
             if confirmar_accion("ESTAS SEGURO?"):
                 if confirmar_accion("REALMENTE seguro? (Ultima confirmacion)"):
-                    import shutil
-                    from datetime import datetime
+                    db.cerrar()
                     
                     # Hacer backup antes de borrar
                     if os.path.exists('data/arbitraje.db'):
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        backup = f"data/backups/BEFORE_RESET_{timestamp}.db"
-                        os.makedirs('data/backups', exist_ok=True)
-                        shutil.copy2('data/arbitraje.db', backup)
-                        print(f"[OK] Backup guardado: {backup}")
+                        respaldo = respaldos.crear_respaldo(
+                            tipo='PRE_RESET', prefijo='BEFORE_RESET', registrar=False
+                        )
+                        print(f"[OK] Backup guardado: {respaldo['archivo']}")
                     
-                    # Borrar base de datos
-                    if os.path.exists('data/arbitraje.db'):
-                        os.remove('data/arbitraje.db')
+                    # El escritor de registros y los lectores de reportes tienen la BD abierta
+                    registro.detener()
+                    reportes.cerrar_conexiones()
+                    
+                    # Borrar base de datos (y los archivos del modo WAL)
+                    for archivo in ('data/arbitraje.db', 'data/arbitraje.db-wal', 'data/arbitraje.db-shm'):
+                        if os.path.exists(archivo):
+                            os.remove(archivo)
+                    
+                    # Los ciclos archivados son de la base borrada: se apartan junto al backup
+                    apartados = archivador.apartar_archivos(destino=respaldos.DIRECTORIO_RESPALDOS)
+                    if apartados:
+                        print(f"[OK] Archivos anuales movidos a: {apartados}")
                     
+                    columnar.descartar_columnar()
+                    
+                    registro.instalar(usuario_id=USUARIO_ID)
                     print("\n[OK] RESET COMPLETO - Base de datos eliminada")
                     print("Al ejecutar la proxima operacion se creara una BD nueva\n")
                 else:
@@ -1004,19 +1238,32 @@ def menu_principal():
             input("\nPresione Enter para continuar...")
         
         elif opcion == "7":
+            
+            if ciclo:
+                planificar_ciclo_actual(db, ciclo)
+            else:
+                print("\n[AVISO] No hay ciclo activo")
+            db.cerrar()
+            input("\nPresione Enter para continuar...")
+        
+        elif opcion == "8":
             print("\n[DESPEDIDA] Hasta luego!")
             break
         
         else:
-            print("Opcion invalida (1-7)")
+            print("Opcion invalida (1-8)")
             input("\nPresione Enter para continuar...")
 
 if __name__ == "__main__":
+    registro.instalar(usuario_id=USUARIO_ID)
     try:
         menu_principal()
     except KeyboardInterrupt:
         print("\n\n[AVISO] Operacion interrumpida")
     except Exception as e:
+        registro.registrar_excepcion(e, 'menu_principal', USUARIO_ID)
         print(f"\n[ERROR] ERROR: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+    finally:
+        registro.detener()
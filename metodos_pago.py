@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: metodos_pago.py
+# DESCRIPCION: Motor de costos por metodo de pago y seleccion de la ruta mas barata
+# ==========================================================
+
+from datetime import date
+
+# Campos de metodos_pago que afectan a las tasas derivadas y a los limites
+CAMPOS_HUELLA = ('costo_fijo_usdt', 'comision_porcentaje', 'limite_diario', 'limite_mensual', 'activo')
+
+
+def costo_efectivo(metodo: dict) -> float:
+    """
+    Costo real en USD de 1 USDT comprado con este metodo:
+    precio por USDT mas la comision porcentual de la tarjeta/banco.
+    """
+    return metodo['costo_fijo_usdt'] * (1 + (metodo['comision_porcentaje'] or 0))
+
+
+class MotorMetodosPago:
+    """
+    Evalua los metodos de pago activos de un usuario.
+
+    Las tasas derivadas se guardan en cache por (metodo_id, tasa_venta). Cada
+    entrada lleva la huella de la fila de metodos_pago con la que se calculo;
+    si la fila cambia (costo, comision, limites o estado) la entrada se descarta.
+    """
+
+    def __init__(self, db, usuario_id: int, comision_p2p_maker: float):
+        self.db = db
+        self.usuario_id = usuario_id
+        self.comision_p2p_maker = comision_p2p_maker
+        self._cache = {}
+
+    def tasas_derivadas(self, metodo: dict, tasa_venta_p2p: float) -> dict:
+        """
+        Retorna costo_efectivo, punto_equilibrio, tasa_venta_neta y
+        tasa_rentabilidad_por_venta del metodo para una tasa de venta dada.
+        """
+        clave = (metodo['id'], tasa_venta_p2p)
+        huella = tuple(metodo[c] for c in CAMPOS_HUELLA)
+
+        en_cache = self._cache.get(clave)
+        if en_cache and en_cache[0] == huella:
+            return en_cache[1]
+
+        costo = costo_efectivo(metodo)
+        tasas = {
+            'costo_efectivo': costo,
+            'punto_equilibrio': costo / (1 - self.comision_p2p_maker),
+            'tasa_venta_neta': None,
+            'tasa_rentabilidad_por_venta': None
+        }
+        if tasa_venta_p2p is not None:
+            tasas['tasa_venta_neta'] = tasa_venta_p2p * (1 - self.comision_p2p_maker)
+            tasas['tasa_rentabilidad_por_venta'] = tasas['tasa_venta_neta'] / costo - 1
+
+        self._cache[clave] = (huella, tasas)
+        return tasas
+
+    def evaluar_metodos(self, tasa_venta_p2p: float = None, fecha: date = None) -> list:
+        """
+        Evalua todos los metodos activos a la vez (una consulta para las filas
+        y otra para el consumo) y los retorna ordenados del mas barato al mas caro.
+        """
+        fecha = fecha or date.today()
+        metodos = self.db.obtener_metodos_pago(self.usuario_id)
+        consumo = self.db.consumo_metodos_pago(self.usuario_id, fecha)
+
+        evaluados = []
+        for metodo in metodos:
+            usado_dia, usado_mes = consumo.get(metodo['id'], (0.0, 0.0))
+            disponible = min(
+                _restante(metodo['limite_diario'], usado_dia),
+                _restante(metodo['limite_mensual'], usado_mes)
+            )
+            evaluados.append({
+                'metodo': metodo,
+                'disponible_usd': disponible,
+                **self.tasas_derivadas(metodo, tasa_venta_p2p)
+            })
+
+        evaluados.sort(key=lambda e: e['costo_efectivo'])
+        return evaluados
+
+    def mejor_ruta(self, monto_usd: float, tasa_venta_p2p: float = None, fecha: date = None) -> dict:
+        """
+        Reparte `monto_usd` entre los metodos activos empezando por el mas
+        barato y respetando lo que queda de sus limites diario y mensual.
+        Con tasa_venta_p2p se descartan los metodos que no serian rentables.
+
+        Returns:
+            dict con 'asignaciones' (metodo_id, nombre, monto_usd, usdt,
+            costo_efectivo), monto_cubierto, faltante, usdt_total y costo_promedio.
+        """
+        asignaciones = []
+        pendiente = monto_usd
+
+        for evaluado in self.evaluar_metodos(tasa_venta_p2p, fecha):
+            if pendiente <= 0:
+                break
+            rentabilidad = evaluado['tasa_rentabilidad_por_venta']
+            if rentabilidad is not None and rentabilidad <= 0:
+                continue
+            monto = min(pendiente, evaluado['disponible_usd'])
+            if monto <= 0:
+                continue
+
+            metodo = evaluado['metodo']
+            asignaciones.append({
+                'metodo_id': metodo['id'],
+                'nombre': metodo['nombre_tarjeta'] or metodo['tipo'],
+                'monto_usd': monto,
+                'usdt': monto / evaluado['costo_efectivo'],
+                'costo_efectivo': evaluado['costo_efectivo']
+            })
+            pendiente -= monto
+
+        cubierto = monto_usd - pendiente
+        usdt_total = sum(a['usdt'] for a in asignaciones)
+        return {
+            'asignaciones': asignaciones,
+            'monto_cubierto': cubierto,
+            'faltante': max(pendiente, 0.0),
+            'usdt_total': usdt_total,
+            'costo_promedio': cubierto / usdt_total if usdt_total > 0 else None
+        }
+
+
+def _restante(limite, usado) -> float:
+    """Lo que queda de un limite (None = sin limite)."""
+    if limite is None:
+        return float('inf')
+    return max(limite - usado, 0.0)
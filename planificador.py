@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: planificador.py
+# DESCRIPCION: Planificador de reinversion/retiro por programacion dinamica
+# ==========================================================
+
+import numpy as np
+
+ACCION_REINVERTIR = 'REINVERTIR'
+ACCION_RETIRAR = 'RETIRAR'
+ACCION_NO_OPERAR = 'NO_OPERAR'
+
+
+def paso_malla(limite_final_usd: float, paso_usd: float = None) -> float:
+    """Ancho de los tramos de saldo del planificador (por defecto limite / 200)."""
+    return paso_usd or limite_final_usd / 200
+
+
+def planificar_ciclo(capital_inicial_usd: float,
+                     tasas_rentabilidad_por_venta,
+                     ventas_por_dia,
+                     dias_restantes: int,
+                     limite_final_usd: float,
+                     max_ventas_diarias: int,
+                     capital_fresco_max_diario: float = 0.0,
+                     peso_boveda_final: float = 1.0,
+                     paso_usd: float = None) -> dict:
+    """
+    Calcula el plan de reinversion/retiro/capital fresco que maximiza la
+    ganancia retirada de lo que resta del ciclo.
+
+    Programacion dinamica hacia atras sobre estados (dia, tramo de saldo de
+    boveda en USD). Cada tramo de cada dia se resuelve una sola vez y se
+    guarda en la tabla de valores, que luego se recorre hacia adelante desde
+    el saldo real para armar el plan.
+
+    Reglas del modelo:
+    - El capital operado (boveda + fresco) nunca supera limite_final_usd.
+    - REINVERTIR retiene la ganancia hasta el limite; el exceso se retira
+      (en vez de descartarse como hace el recorte del ultimo dia).
+    - RETIRAR envia toda la ganancia del dia al banco.
+    - Los dias con rentabilidad <= 0 no se opera, ni los dias sin saldo
+      ni capital fresco (operado = 0).
+    - El capital fresco cuenta como salida de dinero del operador y se
+      inyecta en multiplos de paso_usd: un maximo diario menor a un paso
+      equivale a no inyectar (ver capital_fresco_max_efectivo).
+
+    Args:
+        capital_inicial_usd: Saldo actual de la boveda (valor USD a costo)
+        tasas_rentabilidad_por_venta: Rentabilidad por venta esperada, escalar o
+            una por dia (ver CicloArbitraje.get_tasa_rentabilidad_por_venta)
+        ventas_por_dia: Ventas esperadas, escalar o una por dia
+        dias_restantes: Dias que faltan para cerrar el ciclo
+        limite_final_usd: Tope de capital del ciclo
+        max_ventas_diarias: Maximo de ventas por dia
+        capital_fresco_max_diario: Maximo de capital fresco a inyectar por dia
+        peso_boveda_final: Valor asignado a cada USD que queda en boveda al
+            final (1.0 = vale igual que lo retirado, 0.0 = solo cuenta lo retirado)
+        paso_usd: Ancho de los tramos de saldo (por defecto limite / 200)
+
+    Returns:
+        dict con valor_objetivo, ganancia_retirada_total, capital_fresco_total,
+        boveda_final, paso_usd, capital_fresco_max_efectivo y 'plan' (una
+        entrada por dia).
+    """
+    tasas, ventas = np.broadcast_arrays(
+        np.asarray(tasas_rentabilidad_por_venta, dtype=np.float64),
+        np.asarray(ventas_por_dia, dtype=np.float64)
+    )
+    tasas = np.broadcast_to(tasas, (dias_restantes,) if tasas.ndim == 0 else tasas.shape)
+    ventas = np.clip(np.broadcast_to(ventas, tasas.shape), 0, max_ventas_diarias)
+    if len(tasas) != dias_restantes:
+        raise ValueError("Se necesita una tasa y un numero de ventas por cada dia restante.")
+
+    # Factor de crecimiento del dia: (1 + r)^ventas; los dias no rentables no se opera
+    operable = tasas > 0
+    factores = np.where(operable, np.exp(ventas * np.log1p(np.maximum(tasas, 0.0))), 1.0)
+
+    paso = paso_malla(limite_final_usd, paso_usd)
+    malla = np.append(np.arange(0.0, limite_final_usd, paso), limite_final_usd)
+    n = len(malla)
+    pasos_fresco = int(capital_fresco_max_diario // paso)
+    # Ventana de montos operables desde cada tramo: saldo + k * paso, sin pasar del limite
+    ventana = np.minimum(np.arange(n)[:, None] + np.arange(pasos_fresco + 1)[None, :], n - 1)
+
+    # valores[d][i] = mejor valor alcanzable desde el dia d con saldo malla[i]
+    valores = np.empty((dias_restantes + 1, n))
+    valores[dias_restantes] = peso_boveda_final * malla
+
+    for d in range(dias_restantes - 1, -1, -1):
+        if not operable[d]:
+            valores[d] = valores[d + 1]
+            continue
+        # El valor de operar un monto no depende del saldo de origen:
+        # valor(saldo) = saldo + max_{operado en la ventana} (valor_operar(operado) - operado)
+        valor_operar, _ = _valor_operar(malla, factores[d], limite_final_usd, malla, valores[d + 1])
+        valores[d] = malla + (valor_operar - malla)[ventana].max(axis=1)
+
+    # Recorrido hacia adelante desde el saldo real (sin redondear a tramos)
+    plan = []
+    saldo = min(capital_inicial_usd, limite_final_usd)
+    total_retirado = 0.0
+    total_fresco = 0.0
+
+    for d in range(dias_restantes):
+        fresco = 0.0
+        accion = ACCION_NO_OPERAR
+        operado = saldo
+        ganancia = 0.0
+        retirado = 0.0
+        saldo_final = saldo
+
+        if operable[d]:
+            candidatos = np.minimum(saldo + np.arange(pasos_fresco + 1) * paso, limite_final_usd)
+            valor, acciones = _valor_operar(candidatos, factores[d], limite_final_usd, malla, valores[d + 1])
+            mejor = int(np.argmax(valor - candidatos))
+            operado = float(candidatos[mejor])
+            fresco = operado - saldo
+            accion = str(acciones[mejor]) if operado > 0 else ACCION_NO_OPERAR
+            ganancia = operado * (factores[d] - 1)
+
+            if accion == ACCION_REINVERTIR:
+                saldo_final = min(operado + ganancia, limite_final_usd)
+                retirado = operado + ganancia - saldo_final
+            else:
+                saldo_final = operado
+                retirado = ganancia
+
+        plan.append({
+            'dia': d + 1,
+            'accion': accion,
+            'capital_fresco': fresco,
+            'capital_operado': operado if accion != ACCION_NO_OPERAR else 0.0,
+            'ganancia': float(ganancia),
+            'retirado': float(retirado),
+            'saldo_final': float(saldo_final)
+        })
+        total_retirado += retirado
+        total_fresco += fresco
+        saldo = float(saldo_final)
+
+    return {
+        'valor_objetivo': float(total_retirado - total_fresco + peso_boveda_final * saldo),
+        'ganancia_retirada_total': float(total_retirado),
+        'capital_fresco_total': float(total_fresco),
+        'boveda_final': saldo,
+        'paso_usd': paso,
+        'capital_fresco_max_efectivo': pasos_fresco * paso,
+        'plan': plan
+    }
+
+
+def _valor_operar(operado, factor, limite, malla, valores_siguientes):
+    """
+    Valor de operar cada monto de `operado` en un dia con crecimiento `factor`,
+    eligiendo entre reinvertir y retirar. Retorna (valor, accion) por monto.
+    El valor del dia siguiente se interpola linealmente sobre la malla de tramos.
+    """
+    ganancia = operado * (factor - 1)
+
+    nuevo_reinv = np.minimum(operado + ganancia, limite)
+    valor_reinv = (operado + ganancia - nuevo_reinv) + np.interp(nuevo_reinv, malla, valores_siguientes)
+    valor_retiro = ganancia + np.interp(operado, malla, valores_siguientes)
+
+    # A igualdad de valor se prefiere retirar (el dinero ya esta fuera de riesgo)
+    usar_retiro = valor_retiro >= valor_reinv - 1e-9
+    valor = np.where(usar_retiro, valor_retiro, valor_reinv)
+    accion = np.where(usar_retiro, ACCION_RETIRAR, ACCION_REINVERTIR)
+    return valor, accion
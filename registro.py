@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: registro.py
+# DESCRIPCION: Escritura en segundo plano de logs_sistema y errores
+# ==========================================================
+#
+# Los logs y errores se encolan en memoria (cola acotada) y un hilo aparte
+# los inserta por lotes con executemany, cuando el lote llega a
+# `tamano_lote` o pasan `intervalo` segundos. Quien registra nunca espera
+# a la base de datos: si la cola esta llena, la entrada se descarta y se
+# cuenta en `descartados`.
+#
+#   import registro, logging
+#   registro.instalar()                      # handler de logging + excepthooks
+#   logging.getLogger('arbitraje').info("Ciclo iniciado")
+#   registro.detener()                       # vacia la cola (tambien via atexit)
+
+import sys
+import time
+import queue
+import atexit
+import logging
+import sqlite3
+import threading
+import traceback
+
+import database
+
+LOGGER = 'arbitraje'
+
+_LOG = 'LOG'
+_ERROR = 'ERROR'
+_VACIAR = 'VACIAR'
+_FIN = 'FIN'
+
+
+class EscritorRegistros(threading.Thread):
+    """Hilo que drena la cola de logs/errores hacia la base de datos."""
+
+    def __init__(self, db_path='data/arbitraje.db', max_cola=10_000,
+                 tamano_lote=200, intervalo=1.0):
+        super().__init__(name='EscritorRegistros', daemon=True)
+        self.db_path = db_path
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.descartados = 0
+        self._cola = queue.Queue(maxsize=max_cola)
+
+    # ---------- API para quien registra (no bloquea) ----------
+
+    def log(self, nivel, modulo, funcion, mensaje, usuario_id=None):
+        self._encolar((_LOG, (nivel, modulo, funcion, mensaje, usuario_id)))
+
+    def error(self, tipo_error, mensaje_error, stack_trace=None, contexto=None, usuario_id=None):
+        self._encolar((_ERROR, (tipo_error, mensaje_error, stack_trace, contexto, usuario_id)))
+
+    def vaciar(self, timeout=5.0):
+        """Espera a que todo lo encolado hasta ahora quede escrito."""
+        if not self.is_alive():
+            return False
+        listo = threading.Event()
+        self._cola.put((_VACIAR, listo))
+        return listo.wait(timeout)
+
+    def detener(self, timeout=5.0):
+        """Escribe lo pendiente y termina el hilo."""
+        if self.is_alive():
+            self._cola.put((_FIN, None))
+            self.join(timeout)
+
+    def _encolar(self, entrada):
+        try:
+            self._cola.put_nowait(entrada)
+        except queue.Full:
+            self.descartados += 1
+
+    # ---------- Hilo escritor ----------
+
+    def run(self):
+        # La conexion pertenece a este hilo
+        db = database.ArbitrajeDB(self.db_path)
+        logs, errores = [], []
+        limite = time.monotonic() + self.intervalo
+
+        try:
+            while True:
+                try:
+                    tipo, datos = self._cola.get(timeout=max(limite - time.monotonic(), 0))
+                except queue.Empty:
+                    tipo, datos = None, None
+
+                if tipo == _LOG:
+                    logs.append(datos)
+                elif tipo == _ERROR:
+                    errores.append(datos)
+
+                if (tipo in (_VACIAR, _FIN) or time.monotonic() >= limite
+                        or len(logs) + len(errores) >= self.tamano_lote):
+                    self._escribir(db, logs, errores)
+                    logs, errores = [], []
+                    limite = time.monotonic() + self.intervalo
+
+                if tipo == _VACIAR:
+                    datos.set()
+                elif tipo == _FIN:
+                    break
+        finally:
+            db.cerrar()
+
+    def _escribir(self, db, logs, errores):
+        if not logs and not errores:
+            return
+        try:
+            with db.transaccion():
+                if logs:
+                    db.registrar_logs(logs)
+                if errores:
+                    db.registrar_errores(errores)
+        except sqlite3.Error as e:
+            # No hay donde registrar el fallo del propio registro
+            self.descartados += len(logs) + len(errores)
+            print(f"[AVISO] No se pudieron guardar {len(logs) + len(errores)} registros: {e}",
+                  file=sys.stderr)
+
+
+class ManejadorBD(logging.Handler):
+    """Handler de logging que encola cada registro en el EscritorRegistros."""
+
+    def __init__(self, escritor, usuario_id=None, nivel=logging.INFO):
+        super().__init__(nivel)
+        self.escritor = escritor
+        self.usuario_id = usuario_id
+
+    def emit(self, record):
+        try:
+            mensaje = record.getMessage()
+            self.escritor.log(record.levelname, record.module, record.funcName,
+                              mensaje, self.usuario_id)
+            if record.exc_info:
+                tipo, valor, tb = record.exc_info
+                self.escritor.error(tipo.__name__, str(valor),
+                                    ''.join(traceback.format_exception(tipo, valor, tb)),
+                                    f"{record.module}.{record.funcName}: {mensaje}", self.usuario_id)
+        except Exception:
+            self.handleError(record)
+
+
+# ---------- Instancia del proceso ----------
+
+_escritor = None
+_manejador = None
+_hooks_previos = None
+
+
+def escritor_activo():
+    """El EscritorRegistros instalado, o None."""
+    return _escritor if _escritor is not None and _escritor.is_alive() else None
+
+
+def registrar_excepcion(excepcion, contexto=None, usuario_id=None):
+    """Guarda una excepcion (con su traceback) en la tabla errores."""
+    escritor = escritor_activo()
+    if escritor is None:
+        return
+    escritor.error(type(excepcion).__name__, str(excepcion),
+                   ''.join(traceback.format_exception(type(excepcion), excepcion, excepcion.__traceback__)),
+                   contexto, usuario_id)
+
+
+def instalar(db_path='data/arbitraje.db', usuario_id=None, nivel=logging.INFO, **opciones):
+    """
+    Arranca el escritor, agrega el handler al logger 'arbitraje' y captura
+    las excepciones no atrapadas (hilo principal y otros hilos) en errores.
+    `opciones` se pasan a EscritorRegistros (max_cola, tamano_lote, intervalo).
+    """
+    global _escritor, _manejador, _hooks_previos
+    if escritor_activo():
+        return _escritor
+
+    _escritor = EscritorRegistros(db_path, **opciones)
+    _escritor.start()
+
+    _manejador = ManejadorBD(_escritor, usuario_id, nivel)
+    logger = logging.getLogger(LOGGER)
+    logger.setLevel(min(logger.level or nivel, nivel))
+    logger.addHandler(_manejador)
+
+    _hooks_previos = (sys.excepthook, threading.excepthook)
+
+    def excepthook(tipo, valor, tb):
+        if not issubclass(tipo, KeyboardInterrupt) and escritor_activo():
+            registrar_excepcion(valor, 'Excepcion no atrapada', usuario_id)
+            escritor_activo().vaciar()
+        _hooks_previos[0](tipo, valor, tb)
+
+    def threading_excepthook(args):
+        if args.exc_value is not None:
+            registrar_excepcion(args.exc_value, f"Excepcion no atrapada en hilo {args.thread.name}", usuario_id)
+        _hooks_previos[1](args)
+
+    sys.excepthook = excepthook
+    threading.excepthook = threading_excepthook
+    return _escritor
+
+
+def detener():
+    """Vacia la cola, detiene el hilo y restaura los hooks."""
+    global _escritor, _manejador, _hooks_previos
+    if _manejador is not None:
+        logging.getLogger(LOGGER).removeHandler(_manejador)
+        _manejador = None
+    if _hooks_previos is not None:
+        sys.excepthook, threading.excepthook = _hooks_previos
+        _hooks_previos = None
+    if _escritor is not None:
+        _escritor.detener()
+        _escritor = None
+
+
+atexit.register(detener)
@@ -3,130 +3,371 @@
 # ARCHIVO: reportes.py
 # DESCRIPCION: Generador de reportes y analisis
 # ==========================================================
+#
+# Los reportes de ciclo leen ArbitrajeDB por una conexion de solo lectura
+# que se mantiene abierta (GestorConexiones.lector). Los DataFrames
+# calculados quedan en cache mientras PRAGMA data_version de esa conexion no
+# cambie, es decir, hasta que cualquier otra conexion o proceso confirme una
+# escritura: repetir un reporte desde el menu no vuelve a consultar la base.
+# Esa conexion adjunta los archivos anuales de archivador.py, asi que los
+# ciclos archivados se siguen pudiendo consultar por su id.
 
 import pandas as pd
+import numpy as np
 import os
+import threading
+from columnar import abrir_columnar, DIRECTORIO_COLUMNAR
+from database import GestorConexiones, adjuntar_archivos, directorio_archivos, esquema_ciclo
+from dinero import desde_micro_np
+from exportador import escritura_atomica
 from utils import imprimir_titulo, imprimir_separador, formatear_moneda, formatear_porcentaje
 
-def generar_reporte_ciclo(archivo_historico: str, capital_inicial_global: float):
-    """Genera un reporte completo del ciclo actual"""
+DB_PATH = 'data/arbitraje.db'
+
+# Un dia por fila, con los totales de sus ventas ({esquema}: main o el archivo del ciclo)
+SQL_DIAS_CICLO = """
+    SELECT d.dia_numero, d.fecha, d.capital_disponible_inicio,
+           d.saldo_boveda_final * d.tasa_costo_final AS capital_final,
+           d.ganancia_bruta_dia, COUNT(v.id) AS ventas,
+           COALESCE(SUM(v.usdt_operado), 0) AS usdt_operado,
+           AVG(v.tasa_venta_p2p) AS tasa_venta_p2p, AVG(v.tasa_compra) AS tasa_compra
+    FROM {esquema}.dias d LEFT JOIN {esquema}.ventas v ON v.dia_id = d.id
+    WHERE d.ciclo_id = ?
+    GROUP BY d.dia_numero, d.id
+    ORDER BY d.dia_numero, d.id
+"""
+
+TIPOS_DIAS_CICLO = {
+    'dia_numero': 'int64', 'fecha': 'object', 'capital_disponible_inicio': 'float64',
+    'capital_final': 'float64', 'ganancia_bruta_dia': 'float64', 'ventas': 'int64',
+    'usdt_operado': 'float64', 'tasa_venta_p2p': 'float64', 'tasa_compra': 'float64'
+}
+
+# Detalle diario del reporte exportado: (columna, encabezado, ancho, formato)
+COLUMNAS_DETALLE = (
+    ('dia_numero', 'Dia', 5, ''),
+    ('fecha', 'Fecha', 10, ''),
+    ('capital_disponible_inicio', 'Capital_Inicio', 16, ',.2f'),
+    ('capital_final', 'Capital_Final', 16, ',.2f'),
+    ('ganancia_bruta_dia', 'Ganancia_Bruta', 16, ',.2f'),
+    ('roi_dia', 'ROI_%', 8, '.2f'),
+    ('ventas', 'Ventas', 6, ''),
+    ('usdt_operado', 'USDT_Operado', 16, ',.2f'),
+    ('tasa_venta_p2p', 'Tasa_Venta', 10, '.4f'),
+    ('tasa_compra', 'Tasa_Compra', 11, '.4f'),
+)
+
+# Fila de mostrar_ultimos_dias (los montos con el mismo formato que formatear_moneda)
+FORMATO_ULTIMOS_DIAS = "{:<5} {:<12} ${:<11,.2f} {:<7} ${:<11,.2f} {:>6.2f}%"
+
+_gestores = {}
+_caches = {}
+_archivos = {}
+_lock = threading.Lock()
+
+def _lector(db_path):
+    """Conexion de lectura del hilo, con los archivos anuales adjuntos (incluidos los nuevos)."""
+    ruta = os.path.abspath(db_path)
+    with _lock:
+        gestor = _gestores.get(ruta)
+        if gestor is None:
+            gestor = _gestores[ruta] = GestorConexiones(db_path)
+    conn = gestor.lector()
+    _archivos[id(conn)] = adjuntar_archivos(conn, directorio_archivos(db_path), _archivos.get(id(conn), ()))
+    return conn
+
+def _en_cache(db_path, clave, calcular):
+    """
+    Resultado de calcular(conn) para `clave`. Se recalcula solo si la base
+    cambio desde la ultima vez (PRAGMA data_version es propio de cada
+    conexion, por eso la cache es por conexion lectora).
+    """
+    conn = _lector(db_path)
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    cache = _caches.setdefault(id(conn), {'version': None, 'resultados': {}})
+    if cache['version'] != version:
+        cache['version'] = version
+        cache['resultados'] = {}
+    if clave not in cache['resultados']:
+        cache['resultados'][clave] = calcular(conn)
+    return cache['resultados'][clave]
+
+def cerrar_conexiones():
+    """Cierra las conexiones de lectura y vacia la cache (antes de borrar o reemplazar la base)."""
+    with _lock:
+        for gestor in _gestores.values():
+            gestor.cerrar()
+        _gestores.clear()
+        _caches.clear()
+        _archivos.clear()
+
+def _ciclo_reporte(conn, ciclo_id, usuario_id):
+    """
+    (ciclo, esquema): el ciclo pedido o, si no se indica, el activo (o el
+    ultimo iniciado) del usuario, y la base adjunta que lo contiene.
+    """
+    archivos = _archivos.get(id(conn), [])
+    if ciclo_id is not None:
+        esquema = esquema_ciclo(conn, archivos, ciclo_id)
+        fila = conn.execute(f"SELECT * FROM {esquema}.ciclos WHERE id = ?", (ciclo_id,)).fetchone()
+        return (dict(fila), esquema) if fila else (None, None)
     
-    if not os.path.exists(archivo_historico):
-        print("?? No hay historial disponible para generar reporte.")
-        return
+    # Solo se archivan ciclos finalizados: el activo siempre esta en main
+    filtro, parametros = ("usuario_id = ? AND ", (usuario_id,)) if usuario_id is not None else ("", ())
+    for estado, esquemas in (('ACTIVO', ['main']), ('FINALIZADO', ['main'] + archivos)):
+        encontrados = []
+        for esquema in esquemas:
+            fila = conn.execute(
+                f"SELECT * FROM {esquema}.ciclos WHERE {filtro}estado = ? ORDER BY fecha_inicio DESC LIMIT 1",
+                parametros + (estado,)
+            ).fetchone()
+            if fila:
+                encontrados.append((dict(fila), esquema))
+        if encontrados:
+            return max(encontrados, key=lambda encontrado: encontrado[0]['fecha_inicio'])
+    return None, None
+
+def metricas_ciclo(ciclo: dict, df: pd.DataFrame) -> dict:
+    """
+    Metricas del reporte de un ciclo: una pasada vectorizada por columna
+    (sumas, argmax/argmin de la ganancia, medias de tasas sin los dias sin ventas).
+    """
+    ganancia = df['ganancia_bruta_dia'].to_numpy()
+    tasas_venta = df['tasa_venta_p2p'].to_numpy()
+    tasas_compra = df['tasa_compra'].to_numpy()
+    con_ventas = ~np.isnan(tasas_venta)
     
-    df = pd.read_csv(archivo_historico)
+    total_dias = len(df)
+    capital_inicial = ciclo['capital_inicial'] or 0
+    capital_final = float(df['capital_final'].iat[-1])
+    ganancia_total = float(ganancia.sum())
+    total_ventas = int(df['ventas'].sum())
+    mejor, peor = int(ganancia.argmax()), int(ganancia.argmin())
+    tasa_venta = float(tasas_venta[con_ventas].mean()) if con_ventas.any() else 0.0
+    tasa_compra = float(tasas_compra[con_ventas].mean()) if con_ventas.any() else 0.0
     
+    return {
+        'total_dias': total_dias,
+        'capital_inicial': capital_inicial,
+        'capital_final': capital_final,
+        'ganancia_total': ganancia_total,
+        'roi_total': ((capital_final - capital_inicial) / capital_inicial * 100) if capital_inicial > 0 else 0,
+        'usdt_operado': float(df['usdt_operado'].sum()),
+        'total_ventas': total_ventas,
+        'promedio_ventas_dia': total_ventas / total_dias,
+        'promedio_ganancia_dia': ganancia_total / total_dias,
+        'mejor_dia': (int(df['dia_numero'].iat[mejor]), float(ganancia[mejor])),
+        'peor_dia': (int(df['dia_numero'].iat[peor]), float(ganancia[peor])),
+        'tasa_venta': tasa_venta,
+        'tasa_compra': tasa_compra,
+        'spread': ((tasa_venta / tasa_compra) - 1) * 100 if tasa_compra > 0 else 0
+    }
+
+def _reporte(db_path, ciclo_id, usuario_id):
+    """(ciclo, df, metricas) del ciclo, calculados una vez por version de la base."""
+    def calcular(conn):
+        ciclo, esquema = _ciclo_reporte(conn, ciclo_id, usuario_id)
+        if ciclo is None:
+            return None, None, None
+        cursor = conn.execute(SQL_DIAS_CICLO.format(esquema=esquema), (ciclo['id'],))
+        df = pd.DataFrame.from_records(
+            cursor.fetchall(), columns=[columna[0] for columna in cursor.description]
+        ).astype(TIPOS_DIAS_CICLO)
+        
+        capital = df['capital_disponible_inicio'].to_numpy()
+        df['roi_dia'] = np.divide(df['ganancia_bruta_dia'].to_numpy() * 100, capital,
+                                  out=np.zeros(len(df)), where=capital > 0)
+        return ciclo, df, (metricas_ciclo(ciclo, df) if len(df) else None)
+    
+    return _en_cache(db_path, ('reporte_ciclo', ciclo_id, usuario_id), calcular)
+
+def datos_ciclo(db_path: str = DB_PATH, ciclo_id: int = None, usuario_id: int = None):
+    """
+    Retorna (ciclo, df) con el registro del ciclo y un DataFrame de sus dias
+    (columnas de TIPOS_DIAS_CICLO mas roi_dia), o (None, None) si no hay ciclo.
+    """
+    ciclo, df, _ = _reporte(db_path, ciclo_id, usuario_id)
+    return ciclo, df
+
+def _cargar(db_path, ciclo_id, usuario_id, sin_datos):
+    """_reporte() con los avisos de base, ciclo o dias inexistentes."""
+    if not os.path.exists(db_path):
+        print(sin_datos)
+        return None, None, None
+    ciclo, df, metricas = _reporte(db_path, ciclo_id, usuario_id)
+    if ciclo is None:
+        print(sin_datos)
+        return None, None, None
     if df.empty:
-        print("?? El historial está vacío.")
+        print("?? El ciclo no tiene dias registrados.")
+        return None, None, None
+    return ciclo, df, metricas
+
+def _tabla(df, columnas):
+    """
+    Lineas de texto (con salto de linea) de una tabla con anchos fijos,
+    formateada por columnas: cada columna se convierte a lista una sola vez
+    y las filas se arman con un unico str.format por fila, a medida que se
+    escriben (sin iterrows ni accesos por celda).
+    """
+    yield ' '.join(f"{titulo:>{ancho}}" for _, titulo, ancho, _ in columnas) + '\n'
+    formato = ' '.join(f"{{:>{ancho}{especificacion}}}" for _, _, ancho, especificacion in columnas) + '\n'
+    yield from map(formato.format, *(df[columna].tolist() for columna, _, _, _ in columnas))
+
+def generar_reporte_ciclo(db_path: str = DB_PATH, ciclo_id: int = None, usuario_id: int = None):
+    """Genera un reporte completo del ciclo (por defecto el activo)"""
+    
+    ciclo, _, m = _cargar(db_path, ciclo_id, usuario_id, "?? No hay historial disponible para generar reporte.")
+    if m is None:
         return
     
     imprimir_titulo("?? REPORTE DETALLADO DEL CICLO")
     
-    # Métricas generales
-    total_dias = len(df)
-    total_ganancia = df['Ganancia_Bruta_Diaria'].sum() if 'Ganancia_Bruta_Diaria' in df.columns else df['Ganancia_Neta_Diaria'].sum()
-    total_usdt_operado = df['USDT_Comprado_Total'].sum()
-    total_ciclos = df['Ciclos_Completados'].sum()
-    
-    promedio_ganancia_dia = total_ganancia / total_dias if total_dias > 0 else 0
-    promedio_ciclos_dia = total_ciclos / total_dias if total_dias > 0 else 0
-    
-    # ROI
-    capital_final = df.iloc[-1]['C_Final_USD']
-    roi_total = ((capital_final - capital_inicial_global) / capital_inicial_global * 100) if capital_inicial_global > 0 else 0
-    
     print(f"\n?? MÉTRICAS GENERALES:")
-    print(f"   Días Operados:              {total_dias}")
-    print(f"   Capital Inicial:            {formatear_moneda(capital_inicial_global)}")
-    print(f"   Capital Final:              {formatear_moneda(capital_final)}")
-    print(f"   Ganancia Total:             {formatear_moneda(total_ganancia)}")
-    print(f"   ROI Total:                  {formatear_porcentaje(roi_total)}")
+    print(f"   Ciclo:                      {ciclo['id']} - {ciclo['nombre_ciclo']}")
+    print(f"   Días Operados:              {m['total_dias']}")
+    print(f"   Capital Inicial:            {formatear_moneda(m['capital_inicial'])}")
+    print(f"   Capital Final:              {formatear_moneda(m['capital_final'])}")
+    print(f"   Ganancia Total:             {formatear_moneda(m['ganancia_total'])}")
+    print(f"   ROI Total:                  {formatear_porcentaje(m['roi_total'])}")
     
     print(f"\n?? OPERACIONES:")
-    print(f"   USDT Total Operado:         {total_usdt_operado:,.2f} USDT")
-    print(f"   Ciclos Completados:         {total_ciclos}")
-    print(f"   Promedio Ciclos/Día:        {promedio_ciclos_dia:.1f}")
-    print(f"   Ganancia Promedio/Día:      {formatear_moneda(promedio_ganancia_dia)}")
-    
-    # Mejor y peor día
-    mejor_dia = df.loc[df['Ganancia_Bruta_Diaria' if 'Ganancia_Bruta_Diaria' in df.columns else 'Ganancia_Neta_Diaria'].idxmax()]
-    peor_dia = df.loc[df['Ganancia_Bruta_Diaria' if 'Ganancia_Bruta_Diaria' in df.columns else 'Ganancia_Neta_Diaria'].idxmin()]
+    print(f"   USDT Total Operado:         {m['usdt_operado']:,.2f} USDT")
+    print(f"   Ventas Completadas:         {m['total_ventas']}")
+    print(f"   Promedio Ventas/Día:        {m['promedio_ventas_dia']:.1f}")
+    print(f"   Ganancia Promedio/Día:      {formatear_moneda(m['promedio_ganancia_dia'])}")
     
     print(f"\n?? MEJORES Y PEORES DÍAS:")
-    print(f"   Mejor Día:  Día {int(mejor_dia['Dia'])} - {formatear_moneda(mejor_dia['Ganancia_Bruta_Diaria' if 'Ganancia_Bruta_Diaria' in df.columns else 'Ganancia_Neta_Diaria'])}")
-    print(f"   Peor Día:   Día {int(peor_dia['Dia'])} - {formatear_moneda(peor_dia['Ganancia_Bruta_Diaria' if 'Ganancia_Bruta_Diaria' in df.columns else 'Ganancia_Neta_Diaria'])}")
-    
-    # Tasas promedio
-    tasa_venta_promedio = df['Tasa_Venta_P2P'].mean()
-    tasa_compra_promedio = df['Costo_Compra_USD'].mean()
-    spread_promedio = ((tasa_venta_promedio / tasa_compra_promedio) - 1) * 100
+    print(f"   Mejor Día:  Día {m['mejor_dia'][0]} - {formatear_moneda(m['mejor_dia'][1])}")
+    print(f"   Peor Día:   Día {m['peor_dia'][0]} - {formatear_moneda(m['peor_dia'][1])}")
     
     print(f"\n?? TASAS PROMEDIO:")
-    print(f"   Tasa Compra:    {tasa_compra_promedio:.4f} USD/USDT")
-    print(f"   Tasa Venta:     {tasa_venta_promedio:.4f} USD/USDT")
-    print(f"   Spread Promedio: {formatear_porcentaje(spread_promedio)}")
+    print(f"   Tasa Compra:    {m['tasa_compra']:.4f} USD/USDT")
+    print(f"   Tasa Venta:     {m['tasa_venta']:.4f} USD/USDT")
+    print(f"   Spread Promedio: {formatear_porcentaje(m['spread'])}")
     
     imprimir_separador()
 
-def mostrar_ultimos_dias(archivo_historico: str, n_dias: int = 5):
-    """Muestra los últimos N días de operaciones"""
-    
-    if not os.path.exists(archivo_historico):
-        print("?? No hay historial disponible.")
-        return
+def mostrar_ultimos_dias(db_path: str = DB_PATH, n_dias: int = 5, ciclo_id: int = None, usuario_id: int = None):
+    """Muestra los últimos N días de operaciones del ciclo (por defecto el activo)"""
     
-    df = pd.read_csv(archivo_historico)
-    
-    if df.empty:
-        print("?? El historial está vacío.")
+    _, df, _ = _cargar(db_path, ciclo_id, usuario_id, "?? No hay historial disponible.")
+    if df is None:
         return
     
     ultimos = df.tail(n_dias)
     
     imprimir_titulo(f"?? ÚLTIMOS {min(n_dias, len(ultimos))} DÍAS DE OPERACIONES")
     
-    print(f"\n{'Día':<5} {'Fecha':<12} {'Capital':<12} {'Ciclos':<7} {'Ganancia':<12} {'ROI%':<8}")
+    print(f"\n{'Día':<5} {'Fecha':<12} {'Capital':<12} {'Ventas':<7} {'Ganancia':<12} {'ROI%':<8}")
     imprimir_separador("-", 80)
     
-    for _, row in ultimos.iterrows():
-        ganancia = row['Ganancia_Bruta_Diaria'] if 'Ganancia_Bruta_Diaria' in row else row['Ganancia_Neta_Diaria']
-        roi = (ganancia / row['C_Inicial_USD'] * 100) if row['C_Inicial_USD'] > 0 else 0
-        
-        print(f"{int(row['Dia']):<5} {row['Fecha']:<12} {formatear_moneda(row['C_Inicial_USD']):<12} "
-              f"{int(row['Ciclos_Completados']):<7} {formatear_moneda(ganancia):<12} {roi:>6.2f}%")
+    print('\n'.join(map(FORMATO_ULTIMOS_DIAS.format, *(ultimos[columna].tolist() for columna in (
+        'dia_numero', 'fecha', 'capital_disponible_inicio', 'ventas', 'ganancia_bruta_dia', 'roi_dia'
+    )))))
     
     imprimir_separador()
 
-def exportar_reporte_txt(archivo_historico: str, capital_inicial_global: float, output_file: str = 'data/reporte_ciclo.txt'):
-    """Exporta el reporte completo a un archivo de texto"""
+def exportar_reporte_txt(db_path: str = DB_PATH, output_file: str = 'data/reporte_ciclo.txt',
+                         ciclo_id: int = None, usuario_id: int = None):
+    """Exporta el reporte completo del ciclo a un archivo de texto"""
     
-    if not os.path.exists(archivo_historico):
-        print("?? No hay historial para exportar.")
+    ciclo, df, m = _cargar(db_path, ciclo_id, usuario_id, "?? No hay historial para exportar.")
+    if m is None:
         return
     
-    df = pd.read_csv(archivo_historico)
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
+    # Temporal + os.replace: un reporte anterior no queda truncado si algo falla
+    with escritura_atomica(output_file) as f:
         f.write("="*80 + "\n")
         f.write("REPORTE DE ARBITRAJE P2P - CICLO COMPLETO\n")
         f.write(f"Generado: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write("="*80 + "\n\n")
         
-        total_ganancia = df['Ganancia_Bruta_Diaria'].sum() if 'Ganancia_Bruta_Diaria' in df.columns else df['Ganancia_Neta_Diaria'].sum()
-        capital_final = df.iloc[-1]['C_Final_USD']
-        roi_total = ((capital_final - capital_inicial_global) / capital_inicial_global * 100) if capital_inicial_global > 0 else 0
-        
         f.write("RESUMEN EJECUTIVO\n")
         f.write("-"*80 + "\n")
-        f.write(f"Capital Inicial:     {formatear_moneda(capital_inicial_global)}\n")
-        f.write(f"Capital Final:       {formatear_moneda(capital_final)}\n")
-        f.write(f"Ganancia Total:      {formatear_moneda(total_ganancia)}\n")
-        f.write(f"ROI Total:           {formatear_porcentaje(roi_total)}\n")
-        f.write(f"Días Operados:       {len(df)}\n\n")
+        f.write(f"Ciclo:               {ciclo['id']} - {ciclo['nombre_ciclo']}\n")
+        f.write(f"Capital Inicial:     {formatear_moneda(m['capital_inicial'])}\n")
+        f.write(f"Capital Final:       {formatear_moneda(m['capital_final'])}\n")
+        f.write(f"Ganancia Total:      {formatear_moneda(m['ganancia_total'])}\n")
+        f.write(f"ROI Total:           {formatear_porcentaje(m['roi_total'])}\n")
+        f.write(f"Días Operados:       {m['total_dias']}\n\n")
         
         f.write("DETALLE DIARIO\n")
         f.write("-"*80 + "\n")
-        f.write(df.to_string(index=False))
+        f.writelines(_tabla(df, COLUMNAS_DETALLE))
+    
+    print(f"? Reporte exportado a: {output_file}")
+
+def reporte_columnar(directorio: str = DIRECTORIO_COLUMNAR, usuario_id: int = None, n_ciclos: int = 10):
+    """
+    Reporte de todo el historial (todos los ciclos) desde la instantanea
+    columnar de columnar.py: las columnas se abren mapeadas en memoria y se
+    agregan con NumPy en micro-unidades, sin consultar la base ni parsear CSV.
+    """
+    instantanea = abrir_columnar(directorio)
+    if instantanea is None:
+        print("[AVISO] No hay instantanea columnar. Ejecute: python columnar.py actualizar")
+        return
+    
+    ventas, dias = instantanea['ventas'], instantanea['dias']
+    filtro_ventas = slice(None) if usuario_id is None else ventas['usuario_id'] == usuario_id
+    filtro_dias = slice(None) if usuario_id is None else dias['usuario_id'] == usuario_id
     
-    print(f"? Reporte exportado a: {output_file}")
\ No newline at end of file
+    # Ventas agrupadas por ciclo: se ordenan por ciclo y se suman por tramos (exacto en int64)
+    ciclo_venta = ventas['ciclo_id'][filtro_ventas]
+    if len(ciclo_venta) == 0:
+        print("[AVISO] La instantanea no tiene ventas.")
+        return
+    orden = np.argsort(ciclo_venta, kind='stable')
+    ciclos, inicios = np.unique(ciclo_venta[orden], return_index=True)
+    
+    def por_ciclo(columna):
+        return np.add.reduceat(ventas[columna][filtro_ventas][orden], inicios)
+    
+    usdt = por_ciclo('usdt_operado')
+    operado = por_ciclo('monto_operado')
+    bruto = por_ciclo('ingreso_bruto')
+    comisiones = por_ciclo('comision_monto')
+    ganancia = por_ciclo('ganancia_venta')
+    cantidad_ventas = np.diff(np.append(inicios, len(ciclo_venta)))
+    
+    ciclo_dia, cantidad_dias = np.unique(dias['ciclo_id'][filtro_dias], return_counts=True)
+    dias_ciclo = np.zeros(len(ciclos), dtype=np.int64)
+    presentes = np.isin(ciclo_dia, ciclos)
+    dias_ciclo[np.searchsorted(ciclos, ciclo_dia[presentes])] = cantidad_dias[presentes]
+    
+    fechas = ventas['fecha'][filtro_ventas]
+    tasa_venta = bruto.sum() / usdt.sum() if usdt.sum() else 0
+    tasa_compra = operado.sum() / usdt.sum() if usdt.sum() else 0
+    spread = ((tasa_venta / tasa_compra) - 1) * 100 if tasa_compra else 0
+    
+    imprimir_titulo("REPORTE HISTORICO (INSTANTANEA COLUMNAR)")
+    
+    print(f"\nMETRICAS GENERALES:")
+    print(f"   Periodo:                    {fechas.min()} a {fechas.max()}")
+    print(f"   Ciclos:                     {len(ciclos)}")
+    print(f"   Dias Operados:              {int(cantidad_dias.sum())}")
+    print(f"   Ventas:                     {len(ciclo_venta):,}")
+    print(f"   Capital Operado:            {formatear_moneda(desde_micro_np(operado.sum()))}")
+    print(f"   USDT Operado:               {desde_micro_np(usdt.sum()):,.2f} USDT")
+    print(f"   Comisiones P2P:             {formatear_moneda(desde_micro_np(comisiones.sum()))}")
+    print(f"   Ganancia Total:             {formatear_moneda(desde_micro_np(ganancia.sum()))}")
+    
+    print(f"\nTASAS PROMEDIO (PONDERADAS POR USDT):")
+    print(f"   Tasa Compra:    {tasa_compra:.4f} USD/USDT")
+    print(f"   Tasa Venta:     {tasa_venta:.4f} USD/USDT")
+    print(f"   Spread Promedio: {formatear_porcentaje(spread)}")
+    
+    ultimos = slice(-n_ciclos, None)
+    print(f"\nULTIMOS {min(n_ciclos, len(ciclos))} CICLOS:")
+    print(f"{'Ciclo':<7} {'Dias':<6} {'Ventas':<8} {'Operado':<14} {'Ganancia':<12} {'Margen%':<8}")
+    imprimir_separador("-", 80)
+    margen = np.divide(ganancia * 100.0, operado, out=np.zeros(len(ciclos)), where=operado != 0)
+    for ciclo_id, n_dias, n_ventas, monto, gan, pct in zip(
+        ciclos[ultimos], dias_ciclo[ultimos], cantidad_ventas[ultimos],
+        desde_micro_np(operado[ultimos]), desde_micro_np(ganancia[ultimos]), margen[ultimos]
+    ):
+        print(f"{ciclo_id:<7} {n_dias:<6} {n_ventas:<8} {formatear_moneda(monto):<14} "
+              f"{formatear_moneda(gan):<12} {pct:>6.2f}%")
+    
+    imprimir_separador()
@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: respaldos.py
+# DESCRIPCION: Respaldos en linea con la API de backup de SQLite
+# ==========================================================
+#
+# A diferencia de copiar el archivo, sqlite3.Connection.backup copia paginas
+# consistentes aunque la consola este escribiendo: si la base cambia a mitad
+# de copia, SQLite reinicia la copia. Se copia por pasos con pausas para no
+# acaparar la base, el resultado se verifica (PRAGMA quick_check), se calcula
+# su MD5 leyendo por bloques y se registra en la tabla backups.
+#
+#   python respaldos.py crear [--tipo MANUAL] [--db data/arbitraje.db]
+#   python respaldos.py verificar data/backups/arbitraje_20250101_120000.db
+#   python respaldos.py listar
+#
+# RESPALDOS INCREMENTALES
+# Cada tabla se parte en bloques de FILAS_POR_BLOQUE rowids alineados. Cada
+# bloque se guarda comprimido en bloques/<sha256>.jsonl.gz, donde el hash es el
+# de su contenido: un bloque que no cambio entre dos respaldos se guarda una
+# sola vez. Cada respaldo escribe un manifiesto (esquema + lista de bloques
+# por tabla) que por si solo alcanza para restaurar la base completa.
+#
+# Las tablas de TABLAS_SOLO_INSERCION solo crecen (nunca reciben UPDATE ni
+# DELETE): se reutilizan los bloques del manifiesto anterior y se exporta desde
+# el ultimo bloque (la marca de agua). El resto de las tablas (dias, ventas,
+# ciclos, saldos_contables...) si se modifican: sus triggers anotan en
+# cambios_bloques el bloque de cada UPDATE o DELETE con un numero de cambio
+# creciente. El manifiesto guarda el ultimo numero visto y el respaldo
+# siguiente exporta solo el final de la tabla (los INSERT) y los bloques con
+# un cambio posterior; el costo depende de lo que cambio, no del tamano de la
+# base. Las tablas sin esos triggers (configuracion, sqlite_sequence,
+# cambios_bloques, bases anteriores a la migracion 9) se exportan completas.
+#
+#   python respaldos.py incremental
+#   python respaldos.py restaurar data/backups/incremental/manifiestos/X.json data/restaurada.db
+#   python respaldos.py purgar [--horas 24] [--dias 7] [--semanas 4]
+
+import os
+import sys
+import time
+import gzip
+import json
+import sqlite3
+import hashlib
+import argparse
+from datetime import datetime
+
+from database import ArbitrajeDB, TABLAS_SOLO_INSERCION, FILAS_POR_BLOQUE_CAMBIOS
+
+DIRECTORIO_RESPALDOS = 'data/backups'
+TAMANO_BLOQUE_HASH = 1 << 20
+
+DIRECTORIO_INCREMENTAL = os.path.join(DIRECTORIO_RESPALDOS, 'incremental')
+# Los bloques del respaldo son los mismos que anotan los triggers de cambios_bloques
+FILAS_POR_BLOQUE = FILAS_POR_BLOQUE_CAMBIOS
+
+
+def crear_respaldo(db_path='data/arbitraje.db', directorio=DIRECTORIO_RESPALDOS, tipo='MANUAL',
+                   prefijo='arbitraje', paginas_por_paso=256, pausa=0.005, usuario_id=None,
+                   registrar=True) -> dict:
+    """
+    Crea un respaldo consistente de `db_path` sin detener al escritor.
+
+    Args:
+        paginas_por_paso: Paginas copiadas por paso (-1 = todo de una vez)
+        pausa: Segundos de espera entre pasos (libera la base para el escritor)
+        registrar: Guardar el respaldo en la tabla backups de la base origen
+
+    Returns:
+        dict con archivo, tamano_bytes, md5, paginas, segundos e integridad
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No existe la base de datos {db_path}")
+    os.makedirs(directorio, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    archivo = os.path.join(directorio, f"{prefijo}_{timestamp}.db")
+    parcial = archivo + '.parcial'
+    paginas = {'total': 0}
+
+    def progreso(estado, restantes, total):
+        paginas['total'] = total
+
+    t0 = time.perf_counter()
+    origen = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    destino = sqlite3.connect(parcial)
+    try:
+        origen.backup(destino, pages=paginas_por_paso, progress=progreso, sleep=pausa)
+        # El respaldo queda como un unico archivo, sin -wal
+        destino.execute("PRAGMA journal_mode = DELETE")
+        integridad = destino.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        destino.close()
+        origen.close()
+
+    if integridad != 'ok':
+        os.remove(parcial)
+        raise sqlite3.DatabaseError(f"El respaldo no paso quick_check: {integridad}")
+
+    os.replace(parcial, archivo)
+    resultado = {
+        'archivo': archivo,
+        'tamano_bytes': os.path.getsize(archivo),
+        'md5': md5_archivo(archivo),
+        'paginas': paginas['total'],
+        'segundos': time.perf_counter() - t0,
+        'integridad': integridad
+    }
+
+    if registrar:
+        db = ArbitrajeDB(db_path)
+        db.registrar_backup(tipo, archivo, resultado['tamano_bytes'], resultado['md5'], usuario_id)
+        db.cerrar()
+
+    return resultado
+
+
+def md5_archivo(archivo) -> str:
+    """MD5 de un archivo leido por bloques."""
+    md5 = hashlib.md5()
+    with open(archivo, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+            md5.update(bloque)
+    return md5.hexdigest()
+
+
+def verificar_respaldo(archivo, md5_esperado=None) -> dict:
+    """Verifica un respaldo: quick_check y, si se indica, que el MD5 coincida."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(archivo)}?mode=ro", uri=True)
+    try:
+        integridad = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+
+    md5 = md5_archivo(archivo)
+    return {
+        'archivo': archivo,
+        'integridad': integridad,
+        'md5': md5,
+        'md5_coincide': None if md5_esperado is None else md5 == md5_esperado,
+        'valido': integridad == 'ok' and md5_esperado in (None, md5)
+    }
+
+
+# ========== RESPALDOS INCREMENTALES ==========
+
+def _rutas_incrementales(directorio):
+    return os.path.join(directorio, 'bloques'), os.path.join(directorio, 'manifiestos')
+
+
+def _ruta_bloque(directorio_bloques, sha):
+    return os.path.join(directorio_bloques, sha[:2], f"{sha}.jsonl.gz")
+
+
+def _guardar_bloque(directorio_bloques, filas) -> tuple:
+    """Guarda un bloque si no existe. Retorna (sha256, bytes escritos)."""
+    contenido = ''.join(
+        json.dumps(list(fila), ensure_ascii=False, separators=(',', ':')) + '\n' for fila in filas
+    ).encode('utf-8')
+    sha = hashlib.sha256(contenido).hexdigest()
+    ruta = _ruta_bloque(directorio_bloques, sha)
+    if os.path.exists(ruta):
+        return sha, 0
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    comprimido = gzip.compress(contenido, mtime=0)
+    with open(ruta + '.parcial', 'wb') as f:
+        f.write(comprimido)
+    os.replace(ruta + '.parcial', ruta)
+    return sha, len(comprimido)
+
+
+def _leer_bloque(directorio_bloques, sha) -> list:
+    with open(_ruta_bloque(directorio_bloques, sha), 'rb') as f:
+        contenido = gzip.decompress(f.read())
+    if hashlib.sha256(contenido).hexdigest() != sha:
+        raise sqlite3.DatabaseError(f"Bloque corrupto: {sha}")
+    return [json.loads(linea) for linea in contenido.decode('utf-8').splitlines()]
+
+
+def listar_manifiestos(directorio=DIRECTORIO_INCREMENTAL) -> list:
+    """Rutas de los manifiestos, del mas antiguo al mas reciente."""
+    _, directorio_manifiestos = _rutas_incrementales(directorio)
+    if not os.path.isdir(directorio_manifiestos):
+        return []
+    return [os.path.join(directorio_manifiestos, nombre)
+            for nombre in sorted(os.listdir(directorio_manifiestos)) if nombre.endswith('.json')]
+
+
+def _cargar_manifiesto(ruta) -> dict:
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _exportar_tabla(conn, tabla, directorio_bloques, desde=0, hasta=None) -> tuple:
+    """
+    Exporta las filas con desde <= rowid < hasta (sin limite si hasta es None)
+    en bloques alineados. Retorna (bloques, bytes).
+    """
+    bloques, escritos = [], 0
+    actual, filas = None, []
+
+    def cerrar_bloque():
+        nonlocal escritos
+        sha, n = _guardar_bloque(directorio_bloques, filas)
+        escritos += n
+        bloques.append({'desde': actual * FILAS_POR_BLOQUE, 'filas': len(filas), 'sha256': sha})
+
+    filtro, parametros = ('rowid >= ?', (desde,)) if hasta is None else ('rowid >= ? AND rowid < ?', (desde, hasta))
+    for fila in conn.execute(f'SELECT rowid, * FROM "{tabla}" WHERE {filtro} ORDER BY rowid', parametros):
+        rango = fila[0] // FILAS_POR_BLOQUE
+        if rango != actual and filas:
+            cerrar_bloque()
+            filas = []
+        actual = rango
+        filas.append(fila)
+    if filas:
+        cerrar_bloque()
+    return bloques, escritos
+
+
+def _registro_cambios(conn):
+    """
+    Identificador y ultimo numero de cambio de cambios_bloques, y las tablas
+    que tienen sus triggers. None si la base es anterior a la migracion 9.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cambios_bloques'").fetchone():
+        return None
+    fila = conn.execute("SELECT valor FROM configuracion WHERE clave = 'id_registro_cambios'").fetchone()
+    if fila is None:
+        return None
+    tablas = sorted(tabla for (tabla,) in conn.execute("""
+        SELECT tbl_name FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ('trg_cambios_' || tbl_name || '_update',
+                                            'trg_cambios_' || tbl_name || '_delete')
+        GROUP BY tbl_name HAVING COUNT(*) = 2
+    """))
+    cambio = conn.execute("SELECT COALESCE(MAX(cambio), 0) FROM cambios_bloques").fetchone()[0]
+    return {'id': fila[0], 'cambio': cambio, 'tablas': tablas}
+
+
+def _bloques_modificados(conn, registro, anterior):
+    """
+    {tabla: {bloque}} con un cambio posterior al manifiesto anterior, o None si
+    el registro no continua el de ese manifiesto (otra base, o restaurada).
+    """
+    previo = anterior.get('registro_cambios')
+    if not registro or not previo or previo['id'] != registro['id'] or previo['cambio'] > registro['cambio']:
+        return None
+    modificados = {}
+    for tabla, bloque in conn.execute(
+            "SELECT tabla, bloque FROM cambios_bloques WHERE cambio > ?", (previo['cambio'],)):
+        modificados.setdefault(tabla, set()).add(bloque)
+    return modificados
+
+
+def crear_respaldo_incremental(db_path='data/arbitraje.db', directorio=DIRECTORIO_INCREMENTAL,
+                               usuario_id=None, registrar=True) -> dict:
+    """
+    Exporta a bloques solo lo que cambio desde el ultimo manifiesto y escribe
+    un manifiesto nuevo (autosuficiente para restaurar).
+
+    Returns:
+        dict con manifiesto, bloques, bloques_nuevos, bytes_nuevos,
+        filas_exportadas y segundos
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No existe la base de datos {db_path}")
+    directorio_bloques, directorio_manifiestos = _rutas_incrementales(directorio)
+    os.makedirs(directorio_manifiestos, exist_ok=True)
+
+    previos = listar_manifiestos(directorio)
+    anterior = _cargar_manifiesto(previos[-1]) if previos else {'tablas': {}}
+
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    bytes_nuevos = filas_exportadas = 0
+    tablas = {}
+    try:
+        # Una sola transaccion de lectura: todas las tablas del mismo instante
+        conn.execute("BEGIN")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        esquema = [list(fila) for fila in conn.execute("""
+            SELECT type, name, tbl_name, sql FROM sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END, rowid
+        """)]
+
+        nombres = [nombre for tipo, nombre, _, _ in esquema if tipo == 'table']
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+            nombres.append('sqlite_sequence')
+        registro = _registro_cambios(conn)
+        modificados = _bloques_modificados(conn, registro, anterior)
+
+        for tabla in nombres:
+            columnas = ['rowid'] + [c[1] for c in conn.execute(f'PRAGMA table_info("{tabla}")')]
+            previa = anterior['tablas'].get(tabla)
+            reutilizados, rangos = [], [(0, None)]
+
+            if previa and previa['columnas'] == columnas and previa['bloques']:
+                # Marca de agua: el ultimo bloque puede estar incompleto
+                desde = previa['bloques'][-1]['desde']
+                if tabla in TABLAS_SOLO_INSERCION:
+                    reutilizados = previa['bloques'][:-1]
+                    rangos = [(desde, None)]
+                    anteriores = conn.execute(f'SELECT COUNT(*) FROM "{tabla}" WHERE rowid < ?', (desde,)).fetchone()[0]
+                    if anteriores != sum(b['filas'] for b in reutilizados):
+                        # Se borraron filas ya respaldadas: exportar la tabla completa
+                        reutilizados, rangos = [], [(0, None)]
+                elif modificados is not None and tabla in registro['tablas']:
+                    # Bloques con UPDATE o DELETE desde el manifiesto anterior, mas el final
+                    tocados = modificados.get(tabla, set())
+                    reutilizados = [b for b in previa['bloques'][:-1] if b['desde'] // FILAS_POR_BLOQUE not in tocados]
+                    rangos = [(b * FILAS_POR_BLOQUE, (b + 1) * FILAS_POR_BLOQUE)
+                              for b in sorted(tocados) if b * FILAS_POR_BLOQUE < desde]
+                    rangos.append((desde, None))
+
+            nuevos = []
+            for inicio, fin in rangos:
+                exportados, escritos = _exportar_tabla(conn, tabla, directorio_bloques, inicio, fin)
+                nuevos += exportados
+                bytes_nuevos += escritos
+            filas_exportadas += sum(b['filas'] for b in nuevos)
+            tablas[tabla] = {'columnas': columnas,
+                             'bloques': sorted(reutilizados + nuevos, key=lambda b: b['desde'])}
+        conn.rollback()
+    finally:
+        conn.close()
+
+    creado = datetime.now()
+    manifiesto = {
+        'creado': creado.isoformat(timespec='seconds'),
+        'db_path': db_path,
+        'user_version': version,
+        'esquema': esquema,
+        'registro_cambios': registro and {'id': registro['id'], 'cambio': registro['cambio']},
+        'tablas': tablas
+    }
+    ruta = os.path.join(directorio_manifiestos, f"{creado.strftime('%Y%m%d_%H%M%S_%f')}.json")
+    with open(ruta + '.parcial', 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(ruta + '.parcial', ruta)
+
+    bloques = sum(len(t['bloques']) for t in tablas.values())
+    resultado = {
+        'manifiesto': ruta,
+        'bloques': bloques,
+        'bloques_nuevos': sum(1 for t in tablas.values() for b in t['bloques']
+                              if b['sha256'] not in _hashes(anterior)),
+        'bytes_nuevos': bytes_nuevos,
+        'filas_exportadas': filas_exportadas,
+        'segundos': time.perf_counter() - t0
+    }
+
+    if registrar:
+        db = ArbitrajeDB(db_path)
+        db.registrar_backup('INCREMENTAL', ruta, bytes_nuevos, md5_archivo(ruta), usuario_id)
+        db.cerrar()
+
+    return resultado
+
+
+def _hashes(manifiesto) -> set:
+    return {b['sha256'] for t in manifiesto['tablas'].values() for b in t['bloques']}
+
+
+def restaurar_incremental(manifiesto_path, destino, directorio=None) -> dict:
+    """
+    Reconstruye una base de datos nueva en `destino` a partir de un manifiesto:
+    crea las tablas, reinserta los bloques en orden y despues crea indices y
+    triggers (asi los triggers no vuelven a sumar en ciclo_stats).
+    """
+    if os.path.exists(destino):
+        raise FileExistsError(f"El destino ya existe: {destino}")
+    directorio = directorio or os.path.dirname(os.path.dirname(os.path.abspath(manifiesto_path)))
+    directorio_bloques, _ = _rutas_incrementales(directorio)
+    manifiesto = _cargar_manifiesto(manifiesto_path)
+
+    parcial = destino + '.parcial'
+    if os.path.exists(parcial):
+        os.remove(parcial)
+    conn = sqlite3.connect(parcial)
+    filas = 0
+    try:
+        for tipo, _, _, sql in manifiesto['esquema']:
+            if tipo == 'table':
+                conn.execute(sql)
+
+        for tabla, datos in manifiesto['tablas'].items():
+            columnas = ', '.join(f'"{c}"' for c in datos['columnas'])
+            marcadores = ', '.join('?' * len(datos['columnas']))
+            if tabla == 'sqlite_sequence':
+                conn.execute("DELETE FROM sqlite_sequence")
+            for bloque in datos['bloques']:
+                contenido = _leer_bloque(directorio_bloques, bloque['sha256'])
+                conn.executemany(f'INSERT INTO "{tabla}" ({columnas}) VALUES ({marcadores})', contenido)
+                filas += len(contenido)
+
+        for tipo, _, _, sql in manifiesto['esquema']:
+            if tipo != 'table':
+                conn.execute(sql)
+        if manifiesto.get('registro_cambios'):
+            # La base restaurada empieza su propio registro de cambios: el
+            # proximo respaldo incremental de ella la exporta completa
+            conn.execute("UPDATE configuracion SET valor = lower(hex(randomblob(16))) "
+                         "WHERE clave = 'id_registro_cambios'")
+        conn.execute(f"PRAGMA user_version = {int(manifiesto['user_version'])}")
+        conn.commit()
+        integridad = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+
+    if integridad != 'ok':
+        os.remove(parcial)
+        raise sqlite3.DatabaseError(f"La base restaurada no paso quick_check: {integridad}")
+    os.replace(parcial, destino)
+    return {'destino': destino, 'filas': filas, 'integridad': integridad}
+
+
+def purgar_incrementales(directorio=DIRECTORIO_INCREMENTAL, horas=24, dias=7, semanas=4) -> dict:
+    """
+    Politica de retencion: conserva el manifiesto mas reciente de cada una de
+    las ultimas `horas` horas, `dias` dias y `semanas` semanas (y siempre el
+    ultimo). Borra los demas manifiestos y los bloques que ya nadie referencia.
+    """
+    directorio_bloques, _ = _rutas_incrementales(directorio)
+    manifiestos = listar_manifiestos(directorio)
+    if not manifiestos:
+        return {'manifiestos_borrados': 0, 'bloques_borrados': 0, 'bytes_liberados': 0}
+
+    creados = {ruta: datetime.fromisoformat(_cargar_manifiesto(ruta)['creado']) for ruta in manifiestos}
+    conservar = {manifiestos[-1]}
+    for limite, periodo in ((horas, lambda f: f.strftime('%Y%m%d%H')),
+                            (dias, lambda f: f.strftime('%Y%m%d')),
+                            (semanas, lambda f: f.isocalendar()[:2])):
+        vistos = set()
+        for ruta in reversed(manifiestos):
+            clave = periodo(creados[ruta])
+            if clave in vistos:
+                continue
+            if len(vistos) >= limite:
+                break
+            vistos.add(clave)
+            conservar.add(ruta)
+
+    borrados = [ruta for ruta in manifiestos if ruta not in conservar]
+    for ruta in borrados:
+        os.remove(ruta)
+
+    # Marcar y barrer: bloques sin ningun manifiesto conservado que los use
+    referenciados = set()
+    for ruta in conservar:
+        referenciados |= _hashes(_cargar_manifiesto(ruta))
+
+    bloques_borrados = bytes_liberados = 0
+    if os.path.isdir(directorio_bloques):
+        for raiz, _, archivos in os.walk(directorio_bloques):
+            for nombre in archivos:
+                if nombre.split('.')[0] not in referenciados:
+                    ruta = os.path.join(raiz, nombre)
+                    bytes_liberados += os.path.getsize(ruta)
+                    os.remove(ruta)
+                    bloques_borrados += 1
+
+    return {'manifiestos_borrados': len(borrados), 'bloques_borrados': bloques_borrados,
+            'bytes_liberados': bytes_liberados}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Respaldos de la base de datos de arbitraje")
+    parser.add_argument('--db', default='data/arbitraje.db')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_crear = sub.add_parser('crear', help="Crear un respaldo en linea")
+    p_crear.add_argument('--tipo', default='MANUAL')
+    p_crear.add_argument('--directorio', default=DIRECTORIO_RESPALDOS)
+    p_crear.add_argument('--paginas-por-paso', type=int, default=256)
+    p_crear.add_argument('--pausa', type=float, default=0.005)
+
+    p_verificar = sub.add_parser('verificar', help="Verificar integridad y MD5 de un respaldo")
+    p_verificar.add_argument('archivo')
+
+    sub.add_parser('listar', help="Listar respaldos registrados")
+
+    p_incremental = sub.add_parser('incremental', help="Respaldo incremental por bloques")
+    p_incremental.add_argument('--directorio', default=DIRECTORIO_INCREMENTAL)
+
+    p_restaurar = sub.add_parser('restaurar', help="Restaurar un manifiesto incremental en una base nueva")
+    p_restaurar.add_argument('manifiesto')
+    p_restaurar.add_argument('destino')
+
+    p_purgar = sub.add_parser('purgar', help="Aplicar la politica de retencion a los incrementales")
+    p_purgar.add_argument('--directorio', default=DIRECTORIO_INCREMENTAL)
+    p_purgar.add_argument('--horas', type=int, default=24)
+    p_purgar.add_argument('--dias', type=int, default=7)
+    p_purgar.add_argument('--semanas', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.comando == 'crear':
+        r = crear_respaldo(args.db, args.directorio, args.tipo,
+                           paginas_por_paso=args.paginas_por_paso, pausa=args.pausa)
+        print(f"[OK] Respaldo creado: {r['archivo']}")
+        print(f"   Tamano: {r['tamano_bytes'] / 1024:.2f} KB  ({r['paginas']} paginas, {r['segundos']:.2f} s)")
+        print(f"   MD5:    {r['md5']}")
+
+    elif args.comando == 'verificar':
+        db = ArbitrajeDB(args.db)
+        registrado = db.obtener_backup_por_archivo(args.archivo)
+        db.cerrar()
+        r = verificar_respaldo(args.archivo, registrado['md5_hash'] if registrado else None)
+        print(f"Integridad: {r['integridad']}")
+        print(f"MD5:        {r['md5']}"
+              + ('' if r['md5_coincide'] is None else f"  ({'coincide' if r['md5_coincide'] else 'NO coincide'} con el registro)"))
+        sys.exit(0 if r['valido'] else 1)
+
+    elif args.comando == 'listar':
+        db = ArbitrajeDB(args.db)
+        for b in db.obtener_backups():
+            print(f"{b['timestamp']}  {b['tipo']:<10} {b['tamano_bytes'] / 1024:>10.2f} KB  {b['md5_hash']}  {b['archivo_path']}")
+        db.cerrar()
+
+    elif args.comando == 'incremental':
+        r = crear_respaldo_incremental(args.db, args.directorio)
+        print(f"[OK] Manifiesto: {r['manifiesto']}")
+        print(f"   Bloques: {r['bloques']} ({r['bloques_nuevos']} nuevos, {r['bytes_nuevos'] / 1024:.2f} KB escritos)")
+        print(f"   Filas exportadas: {r['filas_exportadas']}  ({r['segundos']:.2f} s)")
+
+    elif args.comando == 'restaurar':
+        r = restaurar_incremental(args.manifiesto, args.destino)
+        print(f"[OK] Base restaurada: {r['destino']} ({r['filas']} filas, integridad {r['integridad']})")
+
+    elif args.comando == 'purgar':
+        r = purgar_incrementales(args.directorio, args.horas, args.dias, args.semanas)
+        print(f"[OK] {r['manifiestos_borrados']} manifiesto(s) y {r['bloques_borrados']} bloque(s) borrados "
+              f"({r['bytes_liberados'] / 1024:.2f} KB liberados)")
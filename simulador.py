@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: simulador.py
+# DESCRIPCION: Simulador Monte Carlo de resultados de ciclos
+# ==========================================================
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CUANTILES_DEFAULT = (0.01, 0.05, 0.25, 0.50, 0.75, 0.95, 0.99)
+
+# Columnas de cada registro escrito en disco (float64)
+COLUMNAS_RESULTADO = ('boveda_final', 'ganancia_retirada', 'exceso_descartado')
+
+
+class DistribucionesCiclo:
+    """
+    Distribuciones de las variables diarias de un ciclo.
+
+    - Tasa de venta P2P: normal(media, desviacion)
+    - Costo de compra del USDT: uniforme(minimo, maximo)
+    - Ventas completadas: discreta sobre 0..max_ventas_diarias
+    - Retiro de la ganancia: Bernoulli(probabilidad_retiro)
+    """
+
+    def __init__(self,
+                 tasa_venta_media: float = 1.12,
+                 tasa_venta_desviacion: float = 0.01,
+                 costo_compra_minimo: float = 1.04,
+                 costo_compra_maximo: float = 1.05,
+                 probabilidades_ventas=None,
+                 probabilidad_retiro: float = 0.0,
+                 comision_p2p_maker: float = 0.0035,
+                 max_ventas_diarias: int = 3):
+        """
+        Args:
+            probabilidades_ventas: Probabilidad de completar 0, 1, ..., max_ventas_diarias
+                ventas en un dia. Por defecto uniforme entre 1 y max_ventas_diarias.
+        """
+        if probabilidades_ventas is None:
+            probabilidades_ventas = [0.0] + [1.0 / max_ventas_diarias] * max_ventas_diarias
+
+        probabilidades_ventas = np.asarray(probabilidades_ventas, dtype=np.float64)
+        if len(probabilidades_ventas) != max_ventas_diarias + 1:
+            raise ValueError("probabilidades_ventas debe tener max_ventas_diarias + 1 valores.")
+        if not np.isclose(probabilidades_ventas.sum(), 1.0):
+            raise ValueError("probabilidades_ventas debe sumar 1.")
+        if costo_compra_minimo > costo_compra_maximo:
+            raise ValueError("costo_compra_minimo no puede superar a costo_compra_maximo.")
+
+        self.tasa_venta_media = tasa_venta_media
+        self.tasa_venta_desviacion = tasa_venta_desviacion
+        self.costo_compra_minimo = costo_compra_minimo
+        self.costo_compra_maximo = costo_compra_maximo
+        self.probabilidades_ventas = probabilidades_ventas
+        self.probabilidad_retiro = probabilidad_retiro
+        self.comision_p2p_maker = comision_p2p_maker
+        self.max_ventas_diarias = max_ventas_diarias
+
+
+def _simular_bloque(semilla, n_ciclos, capital_inicial, dias_ciclo, limite_final_usd, dist):
+    """
+    Simula `n_ciclos` ciclos completos en un proceso trabajador.
+
+    Cada bloque recibe su propia SeedSequence, por lo que el resultado es
+    reproducible sin importar cuantos procesos se usen ni en que orden terminen.
+    Retorna un array (n_ciclos, 3) con las COLUMNAS_RESULTADO.
+    """
+    rng = np.random.default_rng(semilla)
+
+    capital = np.full(n_ciclos, capital_inicial, dtype=np.float64)
+    retirado = np.zeros(n_ciclos, dtype=np.float64)
+
+    for _ in range(dias_ciclo):
+        tasa_venta = rng.normal(dist.tasa_venta_media, dist.tasa_venta_desviacion, n_ciclos)
+        costo_compra = rng.uniform(dist.costo_compra_minimo, dist.costo_compra_maximo, n_ciclos)
+        ventas = rng.choice(dist.max_ventas_diarias + 1, size=n_ciclos, p=dist.probabilidades_ventas)
+        retira = rng.random(n_ciclos) < dist.probabilidad_retiro
+
+        r = tasa_venta * (1 - dist.comision_p2p_maker) / costo_compra - 1
+        # Por debajo del punto de equilibrio el operador no publica (main.py lo rechaza)
+        ventas = np.where(r > 0, ventas, 0)
+        ganancia = capital * np.expm1(ventas * np.log1p(np.maximum(r, 0.0)))
+
+        retirado += np.where(retira, ganancia, 0.0)
+        capital += np.where(retira, 0.0, ganancia)
+
+    resultado = np.empty((n_ciclos, len(COLUMNAS_RESULTADO)), dtype=np.float64)
+    resultado[:, 0] = np.minimum(capital, limite_final_usd)
+    resultado[:, 1] = retirado
+    resultado[:, 2] = np.maximum(capital - limite_final_usd, 0.0)
+    return resultado
+
+
+def simular_ciclos(capital_inicial: float,
+                   dias_ciclo: int,
+                   distribuciones: DistribucionesCiclo = None,
+                   n_ciclos: int = 100_000,
+                   limite_final_usd: float = 1000.00,
+                   semilla: int = None,
+                   procesos: int = None,
+                   tamano_bloque: int = 10_000,
+                   archivo_salida: str = 'data/simulaciones/montecarlo.bin',
+                   cuantiles=CUANTILES_DEFAULT) -> dict:
+    """
+    Simula `n_ciclos` ciclos en un pool de procesos y resume la distribucion
+    del valor final de la boveda (con el tope LIMITE_FINAL_USD aplicado).
+
+    Los bloques se escriben a disco a medida que terminan (float64 crudo,
+    una fila por ciclo con COLUMNAS_RESULTADO), con un maximo de 2 bloques
+    en vuelo por proceso, de modo que la memoria no crece con n_ciclos.
+    Los cuantiles se calculan despues sobre el archivo mapeado en memoria.
+
+    Returns:
+        dict con n_ciclos, archivo, media, prob_limite (fraccion de ciclos que
+        llegan al tope) y cuantiles por columna.
+    """
+    if distribuciones is None:
+        distribuciones = DistribucionesCiclo()
+    procesos = procesos or os.cpu_count() or 1
+
+    n_bloques = -(-n_ciclos // tamano_bloque)
+    semillas = np.random.SeedSequence(semilla).spawn(n_bloques)
+    tamanos = [min(tamano_bloque, n_ciclos - i * tamano_bloque) for i in range(n_bloques)]
+
+    directorio = os.path.dirname(archivo_salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    en_vuelo = []
+    max_en_vuelo = 2 * procesos
+
+    with open(archivo_salida, 'wb') as f, ProcessPoolExecutor(max_workers=procesos) as pool:
+        for semilla_bloque, n in zip(semillas, tamanos):
+            if len(en_vuelo) >= max_en_vuelo:
+                en_vuelo.pop(0).result().tofile(f)
+            en_vuelo.append(pool.submit(
+                _simular_bloque, semilla_bloque, n, capital_inicial,
+                dias_ciclo, limite_final_usd, distribuciones
+            ))
+
+        for futuro in en_vuelo:
+            futuro.result().tofile(f)
+
+    return resumir_simulacion(archivo_salida, limite_final_usd, cuantiles)
+
+
+def resumir_simulacion(archivo: str, limite_final_usd: float, cuantiles=CUANTILES_DEFAULT) -> dict:
+    """Calcula los cuantiles de un archivo de resultados de simular_ciclos."""
+    if os.path.getsize(archivo) == 0:
+        # np.memmap no admite archivos vacios (n_ciclos=0 o ningun bloque escrito)
+        datos = np.empty((0, len(COLUMNAS_RESULTADO)))
+    else:
+        datos = np.memmap(archivo, dtype=np.float64, mode='r').reshape(-1, len(COLUMNAS_RESULTADO))
+
+    resumen = {
+        'n_ciclos': len(datos),
+        'archivo': archivo,
+        'media': {},
+        'cuantiles': {},
+        'prob_limite': float(np.mean(datos[:, 0] >= limite_final_usd)) if len(datos) else 0.0
+    }
+
+    for i, columna in enumerate(COLUMNAS_RESULTADO):
+        valores = datos[:, i]
+        resumen['media'][columna] = float(valores.mean()) if len(datos) else 0.0
+        resumen['cuantiles'][columna] = (
+            dict(zip(cuantiles, np.quantile(valores, cuantiles).tolist())) if len(datos) else {}
+        )
+
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulacion Monte Carlo de ciclos de arbitraje")
+    parser.add_argument('--capital', type=float, default=500.0)
+    parser.add_argument('--dias', type=int, default=30)
+    parser.add_argument('--ciclos', type=int, default=100_000)
+    parser.add_argument('--limite', type=float, default=1000.00)
+    parser.add_argument('--semilla', type=int, default=None)
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--prob-retiro', type=float, default=0.0)
+    args = parser.parse_args()
+
+    resumen = simular_ciclos(
+        capital_inicial=args.capital,
+        dias_ciclo=args.dias,
+        distribuciones=DistribucionesCiclo(probabilidad_retiro=args.prob_retiro),
+        n_ciclos=args.ciclos,
+        limite_final_usd=args.limite,
+        semilla=args.semilla,
+        procesos=args.procesos
+    )
+
+    print(f"Ciclos simulados: {resumen['n_ciclos']:,}")
+    print(f"Llegan al limite: {resumen['prob_limite'] * 100:.2f}%")
+    for columna in COLUMNAS_RESULTADO:
+        print(f"\n{columna}  (media {resumen['media'][columna]:,.2f})")
+        for q, valor in resumen['cuantiles'][columna].items():
+            print(f"   p{q * 100:>5.1f}: {valor:>12,.2f}")
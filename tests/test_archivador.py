@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_archivador.py
+# DESCRIPCION: Base recreada junto a archivos anuales y RESET con archivos
+# ==========================================================
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archivador import apartar_archivos, archivar_ciclos
+from benchmark import generar_historial
+from database import ArbitrajeDB, archivos_anuales
+
+
+def _borrar_base(db_path):
+    for archivo in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(archivo):
+            os.remove(archivo)
+
+
+def _ids_archivados(directorio, tabla):
+    ids = set()
+    for _, ruta in archivos_anuales(directorio):
+        conn = sqlite3.connect(ruta)
+        try:
+            ids.update(fila[0] for fila in conn.execute(f"SELECT id FROM {tabla}"))
+        finally:
+            conn.close()
+    return ids
+
+
+def test_archivos_junto_a_la_base(tmp_path):
+    db_path = str(tmp_path / 'operativa' / 'arbitraje.db')
+    generar_historial(db_path, 1, 3, 20, 2)
+    db = ArbitrajeDB(db_path)
+    db.cerrar()
+    assert db.directorio_archivo == str(tmp_path / 'operativa' / 'archivo')
+
+    r = archivar_ciclos(db_path, dias_retencion=0)
+    assert r['ciclos'] > 0
+    assert all(os.path.dirname(ruta) == db.directorio_archivo for ruta in r['archivos'])
+
+
+def test_base_recreada_no_reutiliza_ids_archivados(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'archivo')
+    generar_historial(db_path, 1, 3, 20, 2)
+    archivar_ciclos(db_path, dias_retencion=0)
+    ciclos_archivados = _ids_archivados(directorio, 'ciclos')
+    _borrar_base(db_path)
+
+    # La migracion del libro contable no falla con archivos sin adjuntar
+    generar_historial(db_path, 1, 3, 20, 2)
+
+    db = ArbitrajeDB(db_path)
+    try:
+        ciclos = {fila[0] for fila in db.conn.execute("SELECT id FROM ciclos")}
+        dias = {fila[0] for fila in db.conn.execute("SELECT id FROM dias")}
+        assert min(ciclos) > max(ciclos_archivados)
+        assert not dias & _ids_archivados(directorio, 'dias')
+    finally:
+        db.cerrar()
+
+    # Un segundo traslado agrega los ciclos nuevos sin pisar los ya archivados
+    archivar_ciclos(db_path, dias_retencion=0)
+    assert _ids_archivados(directorio, 'ciclos') > ciclos_archivados
+
+
+def test_reset_aparta_los_archivos(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'archivo')
+    generar_historial(db_path, 1, 3, 20, 2)
+    archivar_ciclos(db_path, dias_retencion=0)
+    archivados = _ids_archivados(directorio, 'ciclos')
+
+    _borrar_base(db_path)
+    apartados = apartar_archivos(directorio, str(tmp_path / 'backups'))
+    assert not archivos_anuales(directorio)
+    assert _ids_archivados(apartados, 'ciclos') == archivados
+    assert apartar_archivos(directorio, str(tmp_path / 'backups')) is None
+
+    db = ArbitrajeDB(db_path)
+    try:
+        assert db.adjuntar_archivos() == []
+        db.conn.execute("INSERT INTO ciclos (usuario_id, nombre_ciclo, estado) VALUES (1, 'nuevo', 'ACTIVO')")
+        assert db.conn.execute("SELECT MAX(id) FROM ciclos").fetchone()[0] == 1
+    finally:
+        db.cerrar()
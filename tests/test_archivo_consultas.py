@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_archivo_consultas.py
+# DESCRIPCION: Reportes y exportes de ciclos movidos a los archivos anuales
+# ==========================================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reportes
+from archivador import archivar_ciclos
+from benchmark import generar_historial
+from exportador import exportar
+
+
+def _exportes(db_path, destino, directorio):
+    contenido = {}
+    for tabla in ('ventas', 'dias'):
+        for alcance in ({}, {'ciclo_id': 1}, {'usuario_id': 1}):
+            archivo = str(destino / f"{tabla}_{'_'.join(alcance) or 'todo'}.jsonl")
+            exportar(archivo, 'jsonl', tabla, db_path=db_path, directorio_archivo=directorio, **alcance)
+            with open(archivo, encoding='utf-8') as f:
+                contenido[archivo] = f.read()
+    return contenido
+
+
+def test_reportes_y_exportes_con_ciclos_archivados(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'archivo')
+    generar_historial(db_path, 1, 3, 20, 2)
+
+    ciclo, df = reportes.datos_ciclo(db_path, ciclo_id=1)
+    exportes = _exportes(db_path, tmp_path, directorio)
+    reportes.cerrar_conexiones()
+
+    assert archivar_ciclos(db_path, directorio, dias_retencion=0)['ciclos'] >= 1
+    try:
+        ciclo_archivado, df_archivado = reportes.datos_ciclo(db_path, ciclo_id=1)
+        assert ciclo_archivado == ciclo
+        assert df_archivado.equals(df)
+    finally:
+        reportes.cerrar_conexiones()
+    assert _exportes(db_path, tmp_path, directorio) == exportes
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_auditoria.py
+# DESCRIPCION: Historial y estado de una fila a partir de la auditoria
+# ==========================================================
+
+import os
+import sys
+import time
+from datetime import date, datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ArbitrajeDB
+
+
+@pytest.fixture
+def caracas(monkeypatch):
+    """Hora local UTC-4 para que la conversion a UTC importe."""
+    monkeypatch.setenv('TZ', 'America/Caracas')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ArbitrajeDB(str(tmp_path / 'arbitraje.db'))
+    yield db
+    db.cerrar()
+
+
+def test_historial_y_estado_con_limite_en_utc(db, caracas):
+    ciclo_id = db.iniciar_ciclo(1, 30, 100.0, nombre_ciclo='Original')
+    with db.transaccion():
+        db.conn.execute("UPDATE ciclos SET nombre_ciclo = 'Renombrado' WHERE id = ?", (ciclo_id,))
+
+    historial = db.historial_registro('ciclos', ciclo_id)
+    assert [c['accion'] for c in historial] == ['INSERT', 'UPDATE']
+    assert historial[1]['datos_anteriores'] == {'nombre_ciclo': 'Original'}
+    assert historial[1]['datos_nuevos'] == {'nombre_ciclo': 'Renombrado'}
+
+    # CURRENT_TIMESTAMP es UTC: 23:30 UTC del 10 son las 19:30 del 10 en Caracas
+    for cambio, timestamp in zip(historial, ('2026-01-10 23:30:00', '2026-01-11 12:00:00')):
+        db.conn.execute("UPDATE auditoria SET timestamp = ? WHERE id = ?", (timestamp, cambio['id']))
+    db.conn.commit()
+
+    assert db.estado_registro('ciclos', ciclo_id, '2026-01-10 19:00:00') is None
+    assert db.estado_registro('ciclos', ciclo_id, '2026-01-10 20:00:00')['nombre_ciclo'] == 'Original'
+    # Una fecha es hasta el final de ese dia local (03:59:59 UTC del dia siguiente)
+    assert db.estado_registro('ciclos', ciclo_id, date(2026, 1, 10))['nombre_ciclo'] == 'Original'
+    assert db.estado_registro('ciclos', ciclo_id, '2026-01-11')['nombre_ciclo'] == 'Renombrado'
+    limite = datetime(2026, 1, 11, 12, 0, tzinfo=timezone.utc)
+    assert db.estado_registro('ciclos', ciclo_id, limite)['nombre_ciclo'] == 'Renombrado'
+    assert db.estado_registro('ciclos', ciclo_id)['nombre_ciclo'] == 'Renombrado'
+
+
+def test_sin_auditoria_no_registra_cambios(db):
+    ciclo_id = db.iniciar_ciclo(1, 30, 100.0, nombre_ciclo='Original')
+    with db.sin_auditoria():
+        db.conn.execute("UPDATE ciclos SET nombre_ciclo = 'Carga masiva' WHERE id = ?", (ciclo_id,))
+    assert [c['accion'] for c in db.historial_registro('ciclos', ciclo_id)] == ['INSERT']
+    assert db.estado_registro('ciclos', ciclo_id)['nombre_ciclo'] == 'Original'
+
+    # Al salir la auditoria vuelve a estar activa
+    with db.transaccion():
+        db.conn.execute("UPDATE ciclos SET nombre_ciclo = 'Despues' WHERE id = ?", (ciclo_id,))
+    assert [c['accion'] for c in db.historial_registro('ciclos', ciclo_id)] == ['INSERT', 'UPDATE']
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_columnar.py
+# DESCRIPCION: Instantanea columnar con dias editados despues de exportados
+# ==========================================================
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+from benchmark import generar_historial
+from database import ArbitrajeDB
+
+
+def test_actualizar_reescribe_dias_editados(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'columnar')
+    generar_historial(db_path, 1, 2, 30, 2)
+    columnar.actualizar_columnar(db_path, directorio)
+
+    db = ArbitrajeDB(db_path)
+    try:
+        version = db.conn.execute("SELECT version FROM dias WHERE id = 7").fetchone()[0]
+        db.actualizar_dia(7, version, {'metodo_pago_id': 3, 'notas': 'EDITADO'})
+    finally:
+        db.cerrar()
+
+    r = columnar.actualizar_columnar(db_path, directorio)
+    assert not r['reconstruida'] and r['reescritas'] == 1 and r['dias'] == 0
+    assert columnar.actualizar_columnar(db_path, directorio)['reescritas'] == 0
+
+    dias = columnar.abrir_columnar(directorio)['dias']
+    assert dias['metodo_pago_id'][np.searchsorted(dias['id'], 7)] == 3
+
+    completa = str(tmp_path / 'completa')
+    columnar.actualizar_columnar(db_path, completa, reconstruir=True)
+    esperado = columnar.abrir_columnar(completa)['dias']
+    for columna in esperado:
+        assert np.array_equal(dias[columna], esperado[columna], equal_nan=dias[columna].dtype.kind == 'f')
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_conciliacion.py
+# DESCRIPCION: Conciliacion contra Binance con ciclos archivados y reimportacion
+# ==========================================================
+
+import os
+import sys
+import csv
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archivador import archivar_ciclos
+from benchmark import generar_historial
+from conciliacion import IndiceConciliacion, conciliar
+from dinero import a_micro
+
+DESDE, HASTA = '2024-01-01', '2024-01-30'
+
+
+def _export_binance(db_path, ruta):
+    """Export P2P con una orden SELL completada por cada venta (de la base y de los archivos)."""
+    filas = []
+    directorio = os.path.join(os.path.dirname(db_path), 'archivo')
+    bases = [db_path] + [os.path.join(directorio, n) for n in sorted(os.listdir(directorio))]
+    for base in bases:
+        conn = sqlite3.connect(base)
+        filas += conn.execute("""
+            SELECT v.id, v.ingreso_bruto, d.fecha FROM ventas v JOIN dias d ON v.dia_id = d.id
+            WHERE d.fecha BETWEEN ? AND ?
+        """, (DESDE, HASTA)).fetchall()
+        conn.close()
+    with open(ruta, 'w', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['Order Number', 'Order Type', 'Total Price', 'Status', 'Created Time'])
+        for venta_id, monto, fecha in filas:
+            escritor.writerow([f"P2P-{venta_id}", 'SELL', f"{monto:.2f}", 'Completed', f"{fecha} 12:00:00"])
+    return len(filas)
+
+
+def _importadas(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM conciliaciones WHERE origen = 'IMPORTACION'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_conciliar_ciclos_archivados_y_reimportar(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    generar_historial(db_path, 1, 3, 10, 2)
+    assert archivar_ciclos(db_path, dias_retencion=0)['ciclos'] == 2
+
+    ruta = str(tmp_path / 'ordenes.csv')
+    ordenes = _export_binance(db_path, ruta)
+
+    resumen = conciliar(1, DESDE, HASTA, archivo_binance=ruta, db_path=db_path)
+    assert resumen['ventas'] == ordenes == 60
+    assert resumen['ordenes_conciliadas'] == ordenes
+    assert 'ORDEN_SIN_VENTA' not in resumen['excepciones']
+    assert 'VENTA_SIN_ORDEN' not in resumen['excepciones']
+    assert resumen['conciliaciones'] == 30
+    assert _importadas(db_path) == 30
+
+    # Reimportar el periodo reemplaza tambien lo de los ciclos archivados
+    conciliar(1, DESDE, HASTA, archivo_binance=ruta, db_path=db_path)
+    assert _importadas(db_path) == 30
+
+
+def test_indice_por_orden_y_por_monto():
+    movimientos = [
+        {'monto': a_micro(100.0), 'dia': 10, 'orden': None},
+        {'monto': a_micro(100.0), 'dia': 10, 'orden': None},
+        {'monto': a_micro(250.0), 'dia': 11, 'orden': 'A1'},
+        {'monto': a_micro(80.0), 'dia': 12, 'orden': None},
+    ]
+    indice = IndiceConciliacion(movimientos, a_micro(0.05), 1)
+
+    # Con id de orden solo concilia por el id, aunque el monto difiera
+    assert indice.buscar(a_micro(249.0), 11, 'A1') == 2
+    assert indice.buscar(a_micro(250.0), 11, 'A1') is None
+    # Importes iguales del mismo dia: primero el mas antiguo, luego el otro
+    assert indice.buscar(a_micro(100.02), 10) == 0
+    assert indice.buscar(a_micro(100.0), 11) == 1
+    assert indice.buscar(a_micro(100.0), 10) is None
+    # Fuera de la tolerancia o de la ventana de dias no hay pareja
+    assert indice.buscar(a_micro(80.10), 12) is None
+    assert indice.buscar(a_micro(80.0), 14) is None
+    assert indice.buscar(a_micro(80.0), 13) == 3
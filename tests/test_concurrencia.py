@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_concurrencia.py
+# DESCRIPCION: Concurrencia optimista y espera de bloqueo con dos conexiones
+# ==========================================================
+
+import os
+import sys
+import time
+import sqlite3
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arbitraje_core import iterar_ventas
+from database import ArbitrajeDB, ConflictoConcurrencia
+
+COMISION = 0.0035
+
+
+def _dia(dia_numero):
+    return {
+        'dia_numero': dia_numero, 'fecha': date.today(), 'capital_disponible_inicio': 100.0,
+        'capital_operado': 100.0, 'capital_no_operado': 0.0, 'capital_fresco_inyectado': 0.0,
+        'saldo_boveda_final': 100.0, 'ganancia_bruta_dia': 0.0, 'ganancia_retenida': 0.0,
+        'ganancia_retirada': 0.0, 'roi_dia': 0.0, 'tipo_operacion': 'REINVERSION_TOTAL',
+        'tasa_costo_final': 1.04
+    }
+
+
+def _registrar(db, ciclo_id, dia_numero, version_ciclo):
+    return db.registrar_dia_completo(
+        ciclo_id, 1, _dia(dia_numero), iterar_ventas([100.0], 1.12, 1.04, COMISION),
+        1.12, 1.04, COMISION, version_ciclo=version_ciclo
+    )
+
+
+@pytest.fixture
+def operadores(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    a, b = ArbitrajeDB(db_path), ArbitrajeDB(db_path)
+    yield a, b
+    a.cerrar()
+    b.cerrar()
+
+
+def test_reclamar_ciclo_rechaza_version_vieja(operadores):
+    a, b = operadores
+    ciclo_id = a.iniciar_ciclo(1, 30, 100.0)
+    version_a = a.obtener_ciclo_activo(1)['version']
+    version_b = b.obtener_ciclo_activo(1)['version']
+
+    _registrar(a, ciclo_id, 1, version_a)
+    with pytest.raises(ConflictoConcurrencia):
+        _registrar(b, ciclo_id, 1, version_b)
+
+    # La escritura rechazada no dejo nada (ni el dia ni sus ventas)
+    assert b.conn.execute("SELECT COUNT(*) FROM dias WHERE ciclo_id = ?", (ciclo_id,)).fetchone()[0] == 1
+    assert b.conn.execute("SELECT COUNT(*) FROM ventas").fetchone()[0] == 1
+    _registrar(b, ciclo_id, 2, b.obtener_ciclo_activo(1)['version'])
+
+
+def test_actualizar_dia_rechaza_version_vieja(operadores):
+    a, b = operadores
+    ciclo_id = a.iniciar_ciclo(1, 30, 100.0)
+    dia_id = _registrar(a, ciclo_id, 1, None)
+    version = b.conn.execute("SELECT version FROM dias WHERE id = ?", (dia_id,)).fetchone()[0]
+
+    assert a.actualizar_dia(dia_id, version, {'notas': 'A'}) == version + 1
+    with pytest.raises(ConflictoConcurrencia):
+        b.actualizar_dia(dia_id, version, {'notas': 'B'})
+    assert tuple(b.conn.execute("SELECT notas, version FROM dias WHERE id = ?", (dia_id,)).fetchone()) == ('A', version + 1)
+
+
+def test_iniciar_ciclo_unico_activo(operadores):
+    a, b = operadores
+    # Los dos vieron que no habia ciclo activo
+    assert a.obtener_ciclo_activo(1) is None and b.obtener_ciclo_activo(1) is None
+
+    a.iniciar_ciclo(1, 30, 100.0, unico_activo=True)
+    with pytest.raises(ConflictoConcurrencia):
+        b.iniciar_ciclo(1, 30, 200.0, unico_activo=True)
+    assert b.conn.execute("SELECT COUNT(*) FROM ciclos WHERE estado = 'ACTIVO'").fetchone()[0] == 1
+
+
+def test_espera_de_bloqueo_no_supera_busy_timeout(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    a = ArbitrajeDB(db_path)
+    b = ArbitrajeDB(db_path, pragmas={'busy_timeout': 400})
+    try:
+        with a.transaccion():
+            t0 = time.monotonic()
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                with b.transaccion():
+                    pass
+            espera = time.monotonic() - t0
+        assert 0.4 <= espera < 0.9
+        # Restaurado el busy_timeout, el escritor vuelve a entrar sin problemas
+        assert b.conn.execute("PRAGMA busy_timeout").fetchone()[0] == 400
+        with b.transaccion():
+            pass
+    finally:
+        a.cerrar()
+        b.cerrar()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_libro_contable.py
+# DESCRIPCION: Reconstruccion del libro contable con ciclos archivados
+# ==========================================================
+
+import os
+import sys
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archivador import archivar_ciclos
+from benchmark import generar_historial
+from database import ArbitrajeDB
+
+COLUMNAS_LIBRO = """asiento_id, ciclo_id, dia_id, venta_id, usuario_id, cuenta, tipo_movimiento,
+                    concepto, debe, haber, saldo_acumulado, fecha, referencia"""
+
+
+def _libro(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT {COLUMNAS_LIBRO} FROM movimientos_contables ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def test_reconstruir_libro_incluye_ciclos_archivados(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'archivo')
+    generar_historial(db_path, 1, 3, 20, 2)
+    libro = _libro(db_path)
+
+    assert archivar_ciclos(db_path, directorio, dias_retencion=0)['ciclos'] > 0
+
+    db = ArbitrajeDB(db_path)
+    try:
+        assert db.reconstruir_libro_contable(directorio) == len(libro)
+    finally:
+        db.cerrar()
+    assert _libro(db_path) == libro
+
+
+def test_reconstruir_libro_en_transaccion_sin_archivos_adjuntos(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'archivo')
+    generar_historial(db_path, 1, 3, 20, 2)
+    archivar_ciclos(db_path, directorio, dias_retencion=0)
+    libro = _libro(db_path)
+
+    db = ArbitrajeDB(db_path)
+    try:
+        with db.transaccion(), pytest.raises(RuntimeError):
+            db.reconstruir_libro_contable(directorio)
+    finally:
+        db.cerrar()
+    assert _libro(db_path) == libro
+
+
+def test_historial_sintetico_cuenta_el_capital_inicial_una_vez(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    generar_historial(db_path, 1, 3, 20, 2)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        capital = conn.execute("SELECT ROUND(SUM(capital_inicial), 6) FROM ciclos").fetchone()[0]
+        aportes = conn.execute(
+            "SELECT ROUND(SUM(haber - debe), 6) FROM movimientos_contables WHERE cuenta = 'APORTES_CAPITAL'"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    assert aportes == capital
+
+    db = ArbitrajeDB(db_path)
+    try:
+        compras = db.obtener_compras_conciliacion(1, '2000-01-01', '2100-12-31')
+    finally:
+        db.cerrar()
+    assert sorted(fila[0] for fila in compras) == ['CICLO'] * 3
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_metodos_pago.py
+# DESCRIPCION: Limites por metodo de pago con compras repartidas
+# ==========================================================
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arbitraje_core import iterar_ventas
+from database import ArbitrajeDB
+from metodos_pago import MotorMetodosPago
+
+COMISION = 0.0035
+
+
+def _base(tmp_path):
+    db = ArbitrajeDB(str(tmp_path / 'arbitraje.db'))
+    barato = db.registrar_metodo_pago(1, {'nombre_tarjeta': 'Barata', 'costo_fijo_usdt': 1.03,
+                                          'limite_diario': 300.0})
+    caro = db.registrar_metodo_pago(1, {'nombre_tarjeta': 'Cara', 'costo_fijo_usdt': 1.06})
+    return db, barato, caro
+
+
+def test_compra_repartida_descuenta_cada_metodo(tmp_path):
+    db, barato, caro = _base(tmp_path)
+    motor = MotorMetodosPago(db, 1, COMISION)
+    try:
+        ruta = motor.mejor_ruta(500.0)
+        compras = [(a['metodo_id'], a['monto_usd']) for a in ruta['asignaciones']]
+        assert compras == [(barato, 300.0), (caro, 200.0)]
+
+        ciclo_id = db.iniciar_ciclo(1, 30, 500.0, tasa_compra_inicial=1.042, tipo_capital='USD_FRESCO',
+                                    compras=compras)
+        consumo = db.consumo_metodos_pago(1, date.today())
+        assert consumo[barato] == (300.0, 300.0)
+        assert consumo[caro] == (200.0, 200.0)
+
+        # El limite diario del metodo barato ya se agoto con la compra inicial
+        ruta = motor.mejor_ruta(100.0)
+        assert [a['metodo_id'] for a in ruta['asignaciones']] == [caro]
+
+        db.registrar_dia_completo(
+            ciclo_id, 1, {
+                'dia_numero': 1, 'fecha': date.today(), 'capital_disponible_inicio': 0.0,
+                'capital_operado': 100.0, 'capital_no_operado': 0.0, 'capital_fresco_inyectado': 100.0,
+                'saldo_boveda_final': 100.0, 'ganancia_bruta_dia': 0.0, 'ganancia_retenida': 0.0,
+                'ganancia_retirada': 0.0, 'roi_dia': 0.0, 'tipo_operacion': 'CAPITAL_FRESCO_PURO',
+                'tasa_costo_final': 1.06, 'metodo_pago_id': caro
+            },
+            iterar_ventas([100.0], 1.12, 1.06, COMISION), 1.12, 1.06, COMISION,
+            compras=[(caro, 100.0)]
+        )
+        assert db.consumo_metodos_pago(1, date.today())[caro] == (300.0, 300.0)
+        assert db.ultima_tasa_venta(1) == 1.12
+    finally:
+        db.cerrar()
+
+
+def test_tasa_de_venta_descarta_metodos_no_rentables(tmp_path):
+    db, barato, caro = _base(tmp_path)
+    motor = MotorMetodosPago(db, 1, COMISION)
+    try:
+        # A 1.05 neto de comision solo el metodo de 1.03 deja margen
+        ruta = motor.mejor_ruta(500.0, tasa_venta_p2p=1.05)
+        assert [a['metodo_id'] for a in ruta['asignaciones']] == [barato]
+        assert ruta['faltante'] == 200.0
+    finally:
+        db.cerrar()
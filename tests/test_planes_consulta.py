@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_planes_consulta.py
+# DESCRIPCION: Verificacion de planes de consulta (EXPLAIN QUERY PLAN)
+# ==========================================================
+#
+# Recorre las rutas de lectura y escritura de database.py y main.py sobre un
+# historial sintetico, captura cada sentencia ejecutada con
+# set_trace_callback y revisa su EXPLAIN QUERY PLAN. Falla si alguna recorre
+# una tabla completa o ordena en un B-tree temporal, salvo las excepciones
+# documentadas en CONSULTAS_PERMITIDAS. Las sentencias de los triggers salen
+# de los triggers instalados en la base (sqlite_master).
+
+import io
+import os
+import re
+import sys
+import contextlib
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reportes
+import exportador
+from database import ArbitrajeDB
+from arbitraje_core import iterar_ventas
+from benchmark import generar_historial
+
+# Sentencias que recorren una tabla completa a proposito: (patron, motivo)
+CONSULTAS_PERMITIDAS = (
+    (r'FROM parametros_sistema$', 'Se cargan todos los parametros'),
+    (r'FROM ventas v ORDER BY v\.id$', 'Recalculo de todas las ventas (dinero.recalcular_ventas)'),
+    (r'FROM backups ', 'Tabla pequena: un registro por respaldo'),
+    (r"json_group_object\(columna, valor\) FROM \(SELECT '",
+     'Diferencias de auditoria: recorre las columnas de la fila (filas constantes), no una tabla'),
+)
+
+# Consultas de reportes.py (usan su propia conexion de lectura)
+CONSULTAS_REPORTES = (
+    reportes.SQL_DIAS_CICLO.format(esquema='main').replace('?', '1'),
+    "SELECT * FROM ciclos WHERE usuario_id = 1 AND estado = 'ACTIVO' ORDER BY fecha_inicio DESC LIMIT 1",
+    "SELECT * FROM ciclos WHERE estado = 'FINALIZADO' ORDER BY fecha_inicio DESC LIMIT 1",
+)
+
+# Consultas de exportador.py por ciclo y por usuario (el exporte completo recorre dias a proposito)
+CONSULTAS_EXPORTADOR = tuple(
+    exportador.consulta_exporte(tabla, filtro).replace('?', '1')
+    for tabla in exportador.COLUMNAS for filtro in ('ciclo', 'usuario')
+)
+
+_PLAN_INVALIDO = re.compile(r'^SCAN (?!CONSTANT ROW)|USE TEMP B-TREE')
+
+
+class _Deshacer(Exception):
+    """Aborta la transaccion de prueba para no dejar escrituras."""
+
+
+def _normalizar(sql: str) -> str:
+    return ' '.join(sql.split())
+
+
+def _permitida(sql: str):
+    for patron, motivo in CONSULTAS_PERMITIDAS:
+        if re.search(patron, sql):
+            return motivo
+    return None
+
+
+def consultas_triggers(conn) -> list:
+    """
+    (trigger, sentencia) por cada sentencia del cuerpo y la condicion WHEN
+    de los triggers instalados (el trace no reporta lo que ejecutan), con
+    las columnas NEW./OLD. reemplazadas por 1.
+    """
+    consultas = []
+    for nombre, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"):
+        sql = re.sub(r'--[^\n]*', '', sql)
+        cabecera, cuerpo = re.split(r'\bBEGIN\b', sql, maxsplit=1)
+        sentencias = [s for s in re.sub(r'\bEND\s*$', '', cuerpo.strip()).split(';') if s.strip()]
+        cuando = re.search(r'\bWHEN\b(.*)$', cabecera, re.DOTALL)
+        if cuando:
+            sentencias.append(f"SELECT {cuando.group(1)}")
+        consultas.extend((nombre, re.sub(r'\b(?:NEW|OLD)\.\w+', '1', s)) for s in sentencias)
+    return consultas
+
+
+def _ejercitar(db: ArbitrajeDB):
+    """Ejecuta todas las consultas de database.py y main.py."""
+    import main
+
+    silencio = contextlib.redirect_stdout(io.StringIO())
+    ciclo = db.obtener_ciclo_activo(usuario_id=1)
+    ciclo_id = ciclo['id']
+    ultimo = db.obtener_ultimo_dia(ciclo_id)
+
+    with silencio:
+        main.cargar_parametros_desde_bd(db)
+        db.version_esquema()
+        db.obtener_ciclo_activo()
+        db.obtener_ventas_dia(ultimo['id'])
+        pagina = db.pagina_historial_ventas(ciclo_id=ciclo_id, tamano=5)
+        db.pagina_historial_ventas(ciclo_id=ciclo_id, tamano=5, despues_de=pagina['ultima'])
+        db.pagina_historial_ventas(ciclo_id=ciclo_id, tamano=5, antes_de=pagina['primera'])
+        pagina = db.pagina_historial_ventas(usuario_id=1, recientes_primero=False, tamano=5)
+        db.pagina_historial_ventas(usuario_id=1, recientes_primero=False, tamano=5, despues_de=pagina['ultima'])
+        pagina = db.pagina_historial_ventas(desde=ultimo['fecha'], hasta=ultimo['fecha'], tamano=5)
+        db.pagina_historial_ventas(desde=ultimo['fecha'], hasta=ultimo['fecha'], tamano=5, despues_de=pagina['ultima'])
+        db.get_estadisticas_ciclo(ciclo_id)
+        db.obtener_ventas_micro(ciclo_id)
+        db.obtener_ventas_micro()
+        db.obtener_metodos_pago(1)
+        db.obtener_metodos_pago(1, solo_activos=False)
+        db.consumo_metodos_pago(1, date.today())
+        db.ultima_tasa_venta(1)
+        main.resumen_final_ciclo(db, ciclo_id)
+        db.obtener_backups()
+        db.balance_comprobacion(1)
+        db.balance_comprobacion(1, ultimo['fecha'])
+        db.historial_registro('ciclos', ciclo_id)
+        db.estado_registro('dias', ultimo['id'])
+        db.obtener_backup_por_archivo('data/backups/arbitraje.db')
+        db.obtener_ventas_conciliacion(1, ultimo['fecha'], ultimo['fecha'])
+        db.obtener_compras_conciliacion(1, ultimo['fecha'], ultimo['fecha'])
+        db.obtener_excepciones_conciliacion(1, ultimo['fecha'], ultimo['fecha'])
+
+        # Escrituras dentro de una transaccion que se deshace
+        try:
+            with db.transaccion():
+                metodo_id = db.registrar_metodo_pago(1, {'costo_fijo_usdt': 1.04})
+                db.actualizar_metodo_pago(metodo_id, {'activo': 0})
+                nuevo_ciclo = db.iniciar_ciclo(1, 30, 500.0, compras=[(metodo_id, 500.0)])
+                db.registrar_dia_completo(
+                    nuevo_ciclo, 1, dict(ultimo, dia_numero=1, metodo_pago_id=metodo_id),
+                    iterar_ventas([100.0, 100.0], 1.12, 1.04, 0.0035), 1.12, 1.04, 0.0035,
+                    compras=[(metodo_id, 150.0), (metodo_id, 50.0)]
+                )
+                db.finalizar_ciclo(nuevo_ciclo, 510.0, 10.0, 2.0)
+                db.registrar_backup('MANUAL', 'data/backups/arbitraje.db', 1024, '0' * 32)
+                db.registrar_conciliacion(1, ultimo['fecha'], ultimo['fecha'], [{
+                    'ciclo_id': ciclo_id, 'fecha': ultimo['fecha'], 'saldo_sistema': 1.0, 'saldo_binance': 1.0,
+                    'saldo_banco': 1.0, 'diferencia': 0.0, 'estado': 'CONCILIADO', 'observaciones': None
+                }], [{
+                    'ciclo_id': ciclo_id, 'fecha': ultimo['fecha'], 'origen': 'SISTEMA', 'tipo': 'VENTA_SIN_ORDEN',
+                    'referencia': 'venta 1', 'monto': 1.0, 'diferencia': None, 'detalle': None
+                }])
+                raise _Deshacer()
+        except _Deshacer:
+            pass
+
+
+def verificar_planes(db_path: str) -> list:
+    """
+    Retorna una lista de dicts (sql, plan, problema, permitida) con una
+    entrada por sentencia distinta ejecutada.
+    """
+    db = ArbitrajeDB(db_path)
+    sentencias = []
+    db.conn.set_trace_callback(sentencias.append)
+    try:
+        _ejercitar(db)
+    finally:
+        db.conn.set_trace_callback(None)
+
+    # Las consultas de los triggers, reportes.py y exportador.py se validan aparte con valores fijos
+    sentencias.extend(sql for _, sql in consultas_triggers(db.conn))
+    sentencias.extend(CONSULTAS_REPORTES)
+    sentencias.extend(CONSULTAS_EXPORTADOR)
+
+    resultados = []
+    vistas = set()
+    for sql in map(_normalizar, sentencias):
+        if sql in vistas or not re.match(r'(SELECT|INSERT|UPDATE|DELETE|WITH)\b', sql, re.IGNORECASE):
+            continue
+        vistas.add(sql)
+
+        plan = [fila[3] for fila in db.conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        problemas = [paso for paso in plan if _PLAN_INVALIDO.search(paso)]
+        resultados.append({
+            'sql': sql,
+            'plan': plan,
+            'problema': problemas,
+            'permitida': _permitida(sql) if problemas else None
+        })
+
+    db.cerrar()
+    return resultados
+
+
+def test_triggers_instalados_generan_consultas(tmp_path):
+    db = ArbitrajeDB(str(tmp_path / 'arbitraje.db'))
+    try:
+        triggers = {fila[0] for fila in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        consultas = consultas_triggers(db.conn)
+        assert {nombre for nombre, _ in consultas} == triggers
+        # Todas son sentencias validas una vez reemplazadas las columnas NEW./OLD.
+        for _, sql in consultas:
+            db.conn.execute(f"EXPLAIN QUERY PLAN {sql}")
+    finally:
+        db.cerrar()
+
+
+def test_planes_de_consulta(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = str(tmp_path / 'planes.db')
+    generar_historial(db_path, 3, 20, 30, 3)
+
+    fallos = [r for r in verificar_planes(db_path) if r['problema'] and not r['permitida']]
+    assert not fallos, '\n'.join(f"{r['sql']}\n    {r['plan']}" for r in fallos)
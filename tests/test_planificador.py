@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_planificador.py
+# DESCRIPCION: Planificador sin saldo y con limite de capital fresco menor a un tramo
+# ==========================================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from planificador import ACCION_NO_OPERAR, paso_malla, planificar_ciclo
+
+
+def test_sin_saldo_ni_capital_fresco_no_opera():
+    resultado = planificar_ciclo(0.0, 0.01, 3, 5, 1000.0, 5)
+    assert all(dia['accion'] == ACCION_NO_OPERAR and dia['capital_operado'] == 0.0
+               for dia in resultado['plan'])
+    assert resultado['ganancia_retirada_total'] == 0.0
+
+
+def test_limite_fresco_menor_a_un_tramo():
+    paso = paso_malla(1000.0)
+    resultado = planificar_ciclo(0.0, 0.01, 3, 5, 1000.0, 5, capital_fresco_max_diario=paso / 2)
+    assert resultado['paso_usd'] == paso
+    assert resultado['capital_fresco_max_efectivo'] == 0.0
+    assert resultado['capital_fresco_total'] == 0.0
+
+    resultado = planificar_ciclo(0.0, 0.01, 3, 5, 1000.0, 5, capital_fresco_max_diario=2.5 * paso)
+    assert resultado['capital_fresco_max_efectivo'] == 2 * paso
+    assert resultado['plan'][0]['capital_fresco'] > 0
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_registro.py
+# DESCRIPCION: log_sistema con el escritor de registros en segundo plano
+# ==========================================================
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import registro
+from database import ArbitrajeDB
+
+
+def _mensajes(db):
+    return [fila[0] for fila in db.conn.execute("SELECT mensaje FROM logs_sistema ORDER BY id")]
+
+
+@pytest.fixture
+def escritor(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    ArbitrajeDB(db_path).cerrar()
+    escritor = registro.instalar(db_path, intervalo=60)
+    yield escritor
+    registro.detener()
+
+
+def test_log_de_la_misma_base_se_encola(escritor):
+    db = ArbitrajeDB(escritor.db_path)
+    try:
+        db.log_sistema('INFO', 'test', 'encolar', 'en cola')
+        assert _mensajes(db) == []
+        assert escritor.vaciar()
+        assert _mensajes(db) == ['en cola']
+    finally:
+        db.cerrar()
+
+
+def test_log_de_otra_base_se_escribe_en_ella(escritor, tmp_path):
+    otra = ArbitrajeDB(str(tmp_path / 'otra' / 'arbitraje.db'))
+    propia = ArbitrajeDB(escritor.db_path)
+    try:
+        otra.log_sistema('INFO', 'test', 'otra', 'en la otra base')
+        assert _mensajes(otra) == ['en la otra base']
+        assert escritor.vaciar()
+        assert _mensajes(propia) == []
+    finally:
+        otra.cerrar()
+        propia.cerrar()
+
+
+def test_log_dentro_de_transaccion_sigue_su_resultado(escritor):
+    db = ArbitrajeDB(escritor.db_path)
+    try:
+        with pytest.raises(RuntimeError):
+            with db.transaccion():
+                db.log_sistema('INFO', 'test', 'rollback', 'deshecho')
+                raise RuntimeError()
+        with db.transaccion():
+            db.log_sistema('INFO', 'test', 'commit', 'confirmado')
+        assert escritor.vaciar()
+        assert _mensajes(db) == ['confirmado']
+    finally:
+        db.cerrar()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_respaldos.py
+# DESCRIPCION: Respaldo incremental con filas editadas en bloques ya respaldados
+# ==========================================================
+
+import os
+import sys
+import json
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import respaldos
+from benchmark import generar_historial
+from database import ArbitrajeDB
+
+
+def _filas(db_path, tabla):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT * FROM {tabla} ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+
+
+def test_restaurar_incremental_con_dia_editado(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'incremental')
+    generar_historial(db_path, 1, 2, 600, 2)
+    assert len(_filas(db_path, 'dias')) > respaldos.FILAS_POR_BLOQUE
+
+    respaldos.crear_respaldo_incremental(db_path, directorio)
+
+    # El dia 1 esta en el primer bloque, que la marca de agua daria por respaldado
+    db = ArbitrajeDB(db_path)
+    version = db.conn.execute("SELECT version FROM dias WHERE id = 1").fetchone()[0]
+    db.actualizar_dia(1, version, {'notas': 'EDITADO'})
+    db.cerrar()
+
+    resultado = respaldos.crear_respaldo_incremental(db_path, directorio)
+    assert resultado['bloques_nuevos'] >= 1
+
+    destino = str(tmp_path / 'restaurada.db')
+    respaldos.restaurar_incremental(resultado['manifiesto'], destino)
+
+    for tabla in ('dias', 'ventas', 'ciclos', 'saldos_contables', 'movimientos_contables'):
+        assert _filas(destino, tabla) == _filas(db_path, tabla), tabla
+    conn = sqlite3.connect(destino)
+    assert conn.execute("SELECT version, notas FROM dias WHERE id = 1").fetchone() == (version + 1, 'EDITADO')
+    conn.close()
+
+
+def test_respaldo_exporta_solo_lo_modificado(tmp_path):
+    db_path = str(tmp_path / 'arbitraje.db')
+    directorio = str(tmp_path / 'incremental')
+    generar_historial(db_path, 1, 2, 600, 2)
+    assert len(_filas(db_path, 'ventas')) > 2 * respaldos.FILAS_POR_BLOQUE
+
+    primero = respaldos.crear_respaldo_incremental(db_path, directorio, registrar=False)
+    with open(primero['manifiesto'], encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    finales = sum(t['bloques'][-1]['filas'] for t in manifiesto['tablas'].values() if t['bloques'])
+
+    # Sin cambios solo se vuelve a leer el ultimo bloque de cada tabla
+    sin_cambios = respaldos.crear_respaldo_incremental(db_path, directorio, registrar=False)
+    assert sin_cambios['filas_exportadas'] == finales
+    assert sin_cambios['bytes_nuevos'] == 0
+
+    # Una venta borrada en el primer bloque (sin auditoria: igual queda anotada)
+    anotados = len(_filas(db_path, 'cambios_bloques'))
+    db = ArbitrajeDB(db_path)
+    with db.sin_auditoria():
+        db.conn.execute("DELETE FROM ventas WHERE id = 5")
+    db.cerrar()
+    anotados = len(_filas(db_path, 'cambios_bloques')) - anotados
+
+    # Se exporta el bloque de ventas (ids 1..999 menos el borrado) y nada mas
+    borrado = respaldos.crear_respaldo_incremental(db_path, directorio, registrar=False)
+    assert borrado['filas_exportadas'] == finales + respaldos.FILAS_POR_BLOQUE - 2 + anotados
+
+    destino = str(tmp_path / 'restaurada.db')
+    respaldos.restaurar_incremental(borrado['manifiesto'], destino)
+    for tabla in ('ventas', 'ciclo_stats', 'dias'):
+        assert _filas(destino, tabla) == _filas(db_path, tabla), tabla
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# ==========================================================
+# ARCHIVO: tests/test_simulador.py
+# DESCRIPCION: Resumen de simulaciones sin ciclos
+# ==========================================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulador import COLUMNAS_RESULTADO, simular_ciclos
+
+
+def test_simular_cero_ciclos(tmp_path):
+    resumen = simular_ciclos(500, 30, n_ciclos=0, procesos=1, archivo_salida=str(tmp_path / 'vacio.bin'))
+    assert resumen['n_ciclos'] == 0
+    assert resumen['prob_limite'] == 0.0
+    assert all(resumen['media'][columna] == 0.0 and resumen['cuantiles'][columna] == {}
+               for columna in COLUMNAS_RESULTADO)
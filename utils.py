@@ -28,8 +28,8 @@ def crear_backup(archivo: str) -> bool:
         print(f"?? Error al crear backup: {e}")
         return False
 
-def validar_numero_positivo(prompt: str, default=None, maximo=None) -> float:
-    """Valida entrada numerica positiva con valor por defecto opcional"""
+def validar_numero_positivo(prompt: str, default=None, maximo=None, permitir_cero=False) -> float:
+    """Valida entrada numerica positiva (o cero, si se permite) con valor por defecto opcional"""
     while True:
         try:
             entrada = input(prompt)
@@ -39,8 +39,8 @@ def validar_numero_positivo(prompt: str, default=None, maximo=None) -> float:
             
             valor = float(entrada)
             
-            if valor <= 0:
-                print("? El valor debe ser positivo.")
+            if valor < 0 or (valor == 0 and not permitir_cero):
+                print("? El valor no puede ser negativo." if permitir_cero else "? El valor debe ser positivo.")
                 continue
             
             if maximo and valor > maximo: